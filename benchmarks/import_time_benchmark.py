@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+启动导入耗时基准测试：用 `python -X importtime` 统计各个命令行模式加载的模块和导入耗时，
+并检查是否超出预算、是否加载了该模式不应加载的模块（如命令行保存/恢复加载了界面）。
+
+每个模式在新的解释器中导入 get_windows 以及该模式在 main() 中延迟导入的模块，
+解释器自身启动时加载的模块不计入。取多次运行的中位数。
+
+用法:
+    python benchmarks/import_time_benchmark.py [--repeat 5] [--mode save] [--scale 1.0] [--top 8]
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 不属于界面模式的命令都不应加载的模块
+GUI_MODULES = ("tkinter", "PIL", "ttkthemes", "keyboard", "winshell", "session_manager.gui")
+# 只有采集会话时才需要的模块
+COLLECT_MODULES = ("session_manager.browser_tabs", "requests", "session_manager.browser_collectors")
+
+# 命令行模式: (导入的模块, 预算(ms), 不应加载的模块)；version 对应 --version，依此类推
+MODES = {
+    "version": (["get_windows"], 60,
+                GUI_MODULES + COLLECT_MODULES + ("session_manager.core", "session_manager.storage", "psutil")),
+    # 后台服务运行时 --save/--restore 只需连接服务并转发命令
+    "forward": (["get_windows", "session_manager.service"], 100,
+                GUI_MODULES + COLLECT_MODULES + ("session_manager.core", "session_manager.storage", "psutil")),
+    "history": (["get_windows", "session_manager.core"], 200,
+                GUI_MODULES + COLLECT_MODULES + ("session_manager.launcher", "pygetwindow")),
+    # --diff A B 只比较两个已保存的会话
+    "diff-sessions": (["get_windows", "session_manager.core", "session_manager.session_diff"], 250,
+                      GUI_MODULES + COLLECT_MODULES),
+    # --diff A 与当前窗口比较，需要采集会话（同 save）
+    "diff-live": (["get_windows", "session_manager.core", "session_manager.session_diff",
+                   "session_manager.browser_tabs"], 450,
+                  GUI_MODULES),
+    "save": (["get_windows", "session_manager.core", "session_manager.browser_tabs"], 450,
+             GUI_MODULES),
+    "restore": (["get_windows", "session_manager.core", "session_manager.launcher",
+                 "session_manager.restore_scheduler"], 350,
+                GUI_MODULES + COLLECT_MODULES),
+    "gui": (["get_windows", "tkinter", "session_manager.gui", "session_manager.auto_save"], 1500, ()),
+}
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出。
+
+    返回:
+        [(模块名, 层级, 自身耗时us, 累计耗时us)]
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_part, cumulative_us, name = line.split("|", 2)
+            self_us = int(self_part.split(":", 1)[1])
+            cumulative_us = int(cumulative_us)
+        except ValueError:
+            continue
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), level, self_us, cumulative_us))
+    return entries
+
+
+def run_imports(modules):
+    code = f"import sys; sys.path.insert(0, {ROOT!r})\n" + "".join(f"import {m}\n" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"退出码 {proc.returncode}"
+        raise RuntimeError(error)
+    return parse_importtime(proc.stderr)
+
+
+def measure_mode(modules, baseline, repeat):
+    """返回 (中位数总耗时ms, 加载的模块集合, 最慢的顶层导入 [(模块名, ms)])"""
+    totals = []
+    loaded = set()
+    top_level = {}
+    for _ in range(repeat):
+        entries = run_imports(modules)
+        loaded = {name for name, _, _, _ in entries} - baseline
+        top = [(name, cumulative) for name, level, _, cumulative in entries if level == 0 and name not in baseline]
+        totals.append(sum(cumulative for _, cumulative in top) / 1000)
+        for name, cumulative in top:
+            top_level.setdefault(name, []).append(cumulative / 1000)
+    slowest = sorted(((name, statistics.median(values)) for name, values in top_level.items()),
+                     key=lambda item: item[1], reverse=True)
+    return statistics.median(totals), loaded, slowest
+
+
+def forbidden_loaded(loaded, forbidden):
+    return sorted(name for name in loaded
+                  if any(name == f or name.startswith(f + ".") for f in forbidden))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动导入耗时基准测试")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mode", choices=list(MODES), action="append", help="只测试指定模式，可重复")
+    parser.add_argument("--scale", type=float, default=1.0, help="预算倍数（在较慢的机器上放宽预算）")
+    parser.add_argument("--top", type=int, default=8, help="每个模式显示最慢的顶层导入数")
+    args = parser.parse_args()
+
+    # 解释器启动时加载的模块（site、encodings 等）不计入
+    baseline = {name for name, _, _, _ in run_imports([])}
+
+    failures = 0
+    print(f"{'模式':<12}{'导入(ms)':>10}{'预算(ms)':>10}{'模块数':>8}  结果")
+    for mode in args.mode or MODES:
+        modules, budget, forbidden = MODES[mode]
+        budget *= args.scale
+        try:
+            total_ms, loaded, slowest = measure_mode(modules, baseline, max(1, args.repeat))
+        except RuntimeError as e:
+            print(f"{mode:<12}导入失败: {e}")
+            failures += 1
+            continue
+        unexpected = forbidden_loaded(loaded, forbidden)
+        ok = total_ms <= budget and not unexpected
+        failures += not ok
+        print(f"{mode:<12}{total_ms:>10.1f}{budget:>10.0f}{len(loaded):>8}  {'通过' if ok else '超出预算' if not unexpected else '加载了多余的模块'}")
+        for name, ms in slowest[:args.top]:
+            print(f"    {ms:>8.1f} ms  {name}")
+        if unexpected:
+            print(f"    不应加载: {', '.join(unexpected[:10])}{' ...' if len(unexpected) > 10 else ''}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+会话存储格式基准测试：比较 json.dump(indent=4)、紧凑 JSON 和紧凑二进制格式的
+保存耗时、加载耗时和文件大小，并校验二进制格式能无损还原。
+
+用法:
+    python benchmarks/session_format_benchmark.py [--apps 60] [--windows 8] [--tabs 40] [--repeat 20]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_manager.storage import compact_format
+from session_manager.storage.file_store import serialize_session
+
+PROGRAMS = [
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files\Microsoft VS Code\Code.exe",
+    r"C:\Program Files\Microsoft Office\root\Office16\WINWORD.EXE",
+    r"C:\Program Files\Microsoft Office\root\Office16\EXCEL.EXE",
+    r"C:\Users\user\AppData\Local\Programs\Notion\Notion.exe",
+    r"C:\Program Files\Everything\Everything.exe",
+    r"C:\Windows\System32\notepad.exe",
+]
+DOMAINS = ["github.com", "docs.python.org", "stackoverflow.com", "www.bing.com", "mail.google.com"]
+
+
+def make_session(apps, windows, tabs, seed=0):
+    """生成一个接近真实数据的会话"""
+    rng = random.Random(seed)
+    session = {"applications": [], "browser_windows": []}
+    for i in range(apps):
+        path = rng.choice(PROGRAMS)
+        session["applications"].append({
+            "title": f"文档 {i} - {os.path.splitext(os.path.basename(path))[0]}",
+            "process_path": path,
+            "pid": rng.randint(1000, 60000)
+        })
+    for w in range(windows):
+        window_tabs = []
+        for t in range(tabs):
+            domain = rng.choice(DOMAINS)
+            window_tabs.append({
+                "title": f"{domain} 页面 {t}",
+                "url": f"https://{domain}/path/{rng.randint(1, 500)}?q={t}"
+            })
+        window_tabs.append({"title": "新标签页", "url": "about:newtab"})
+        session["browser_windows"].append({"title": f"窗口 {w} - Google Chrome", "browser": "chrome.exe", "tabs": window_tabs})
+    return session
+
+
+def measure(repeat, func):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话存储格式基准测试")
+    parser.add_argument("--apps", type=int, default=60)
+    parser.add_argument("--windows", type=int, default=8)
+    parser.add_argument("--tabs", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    session = make_session(args.apps, args.windows, args.tabs)
+    formats = {
+        "json(indent=4)": (
+            lambda: json.dumps(session, ensure_ascii=False, indent=4).encode('utf-8'),
+            lambda data: json.loads(data.decode('utf-8'))
+        ),
+        "json(compact)": (
+            lambda: serialize_session(session),
+            lambda data: json.loads(data.decode('utf-8'))
+        ),
+        "compact+lz4": (
+            lambda: compact_format.dumps(session),
+            compact_format.loads
+        ),
+    }
+
+    print(f"会话: {args.apps} 个应用, {args.windows} 个浏览器窗口 x {args.tabs + 1} 个标签页")
+    print(f"{'格式':<16}{'大小(字节)':>12}{'保存(ms)':>12}{'加载(ms)':>12}")
+    baseline = None
+    for name, (save, load) in formats.items():
+        save_ms, data = measure(args.repeat, save)
+        load_ms, loaded = measure(args.repeat, lambda: load(data))
+        if loaded != session:
+            print(f"{name}: 还原结果与原始数据不一致！")
+            return 1
+        baseline = baseline or len(data)
+        print(f"{name:<16}{len(data):>12}{save_ms:>12.2f}{load_ms:>12.2f}  ({len(data) / baseline:.1%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,33 +5,48 @@ Windows会话管理器 - 一个用于保存和恢复Windows工作环境的工具
 """
 
 import os
+import time
 import sys
+import queue
+import atexit
 import argparse
 import logging
-import tkinter as tk
-from tkinter import messagebox
-import winshell
-from pathlib import Path
 import traceback
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+# 只在模块顶层导入各个命令都要用到的轻量模块；tkinter、界面（PIL、ttkthemes）、
+# 会话采集和恢复所需的模块在对应的分支中导入，命令行保存/恢复不加载界面
 from session_manager.config import load_config, update_config, USER_DATA_DIR
-from session_manager.core import SessionManager
-from session_manager.gui import SessionManagerApp, GuiLogHandler
-import session_manager.utils as utils
 
 VERSION = "1.0.0"
 APP_NAME = "Windows会话管理器"
+# 后台服务的日志文件（与 log_file 同目录）；两个进程轮转同一个日志文件会互相干扰
+SERVICE_LOG_FILE_NAME = "service.log"
 
-def setup_logging(config):
-    """设置日志记录"""
+def _log_level(value, default=logging.INFO):
+    """配置中的日志级别（名称或数字）"""
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(str(value).upper())
+    return level if isinstance(level, int) else default
+
+def setup_logging(config, log_file=None):
+    """
+    设置日志记录。
+    根日志记录器只挂一个 QueueHandler，记录由 QueueListener 的后台线程写入按大小轮转的日志文件和控制台。
+    log_file 默认为 config['log_file']。
+    """
+    log_config = config.get("logging", {})
     log_handlers = []
     
     # 文件日志处理器
     try:
-        file_handler = logging.FileHandler(
-            config['log_file'], 
+        file_handler = RotatingFileHandler(
+            log_file or config['log_file'], 
+            maxBytes=log_config.get("max_bytes", 5 * 1024 * 1024),
+            backupCount=log_config.get("backup_count", 3),
             encoding='utf-8', 
-            mode='a'
+            delay=True
         )
         file_formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -47,22 +62,30 @@ def setup_logging(config):
     console.setFormatter(console_formatter)
     log_handlers.append(console)
     
-    # 配置根日志记录器
+    # 配置根日志记录器和各模块的级别
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG)
+    root_logger.setLevel(_log_level(log_config.get("level", "INFO")))
+    for name, level in log_config.get("levels", {}).items():
+        logging.getLogger(name).setLevel(_log_level(level))
     
-    # 清除现有处理器并添加新处理器
+    # 清除现有处理器，记录经队列交给后台线程写入
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
     
-    for handler in log_handlers:
-        root_logger.addHandler(handler)
+    log_queue = queue.Queue(-1)
+    root_logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+    listener.start()
+    # 退出时写完队列中剩余的记录
+    atexit.register(listener.stop)
     
     return root_logger
 
 def create_shortcut():
     """创建桌面快捷方式"""
     try:
+        import winshell
+
         desktop = winshell.desktop()
         shortcut_path = os.path.join(desktop, f"{APP_NAME}.lnk")
         
@@ -98,6 +121,8 @@ def create_shortcut():
 def create_startup_shortcut(enable=True):
     """创建/删除开机启动快捷方式"""
     try:
+        import winshell
+
         startup_folder = winshell.startup()
         shortcut_path = os.path.join(startup_folder, f"{APP_NAME}.lnk")
         
@@ -142,6 +167,18 @@ def parse_arguments():
     parser.add_argument('--restore', type=str, help='恢复指定的会话')
     parser.add_argument('--restore-last', action='store_true', help='恢复上次使用的会话')
     parser.add_argument('--save', type=str, help='保存当前窗口状态到指定会话')
+    parser.add_argument('--history', type=str, help='列出指定会话的快照历史')
+    parser.add_argument('--snapshot', type=int, help='与 --restore 一起使用，恢复会话的指定快照')
+    parser.add_argument('--diff', type=str, nargs='+', metavar='SESSION',
+                        help='比较两个会话；只指定一个会话时与当前桌面比较')
+    parser.add_argument('--export-all', type=str, metavar='PATH',
+                        help='将所有会话导出为归档文件（.jsonl 或 .jsonl.gz）')
+    parser.add_argument('--import-all', type=str, metavar='PATH', help='从归档文件导入会话')
+    parser.add_argument('--overwrite', action='store_true', help='与 --import-all 一起使用，覆盖同名会话')
+    parser.add_argument('--service', action='store_true', help='以常驻后台服务方式运行（无界面，注册热键）')
+    parser.add_argument('--service-status', action='store_true', help='显示后台服务状态')
+    parser.add_argument('--stop-service', action='store_true', help='停止后台服务')
+    parser.add_argument('--no-service', action='store_true', help='不把保存/恢复命令转发给后台服务')
     parser.add_argument('--create-desktop-shortcut', action='store_true', help='创建桌面快捷方式')
     parser.add_argument('--enable-autostart', action='store_true', help='启用开机自启动')
     parser.add_argument('--disable-autostart', action='store_true', help='禁用开机自启动')
@@ -158,9 +195,10 @@ def handle_exception(exc_type, exc_value, exc_traceback):
     if sys.stderr.isatty():
         sys.__excepthook__(exc_type, exc_value, exc_traceback)
     else:
+        from tkinter import messagebox
         error_msg = ''.join(traceback.format_exception(exc_type, exc_value, exc_traceback))
-        tk.messagebox.showerror(f"{APP_NAME} 错误", 
-                               f"程序遇到了未处理的错误，请将以下信息报告给开发者：\n\n{error_msg}")
+        messagebox.showerror(f"{APP_NAME} 错误", 
+                             f"程序遇到了未处理的错误，请将以下信息报告给开发者：\n\n{error_msg}")
 
 def main():
     """主函数"""
@@ -179,7 +217,8 @@ def main():
     config = load_config()
     
     # 设置日志
-    logger = setup_logging(config)
+    log_file = os.path.join(os.path.dirname(config['log_file']), SERVICE_LOG_FILE_NAME) if args.service else None
+    logger = setup_logging(config, log_file)
     logger.info(f"启动 {APP_NAME} v{VERSION}")
     logger.info(f"用户数据目录: {USER_DATA_DIR}")
     
@@ -205,9 +244,61 @@ def main():
         if not args.minimized and not args.restore and not args.restore_last and not args.save:
             sys.exit(0)
     
-    # 实例化会话管理器
-    session_manager = SessionManager(config["session_data_file"])
-    
+    # 后台服务命令
+    if args.service_status or args.stop_service:
+        from session_manager.service import send_command, ServiceUnavailable
+        try:
+            reply = send_command("shutdown" if args.stop_service else "status", timeout=5)
+            print(reply["message"])
+        except ServiceUnavailable as e:
+            print(e)
+            sys.exit(1)
+        sys.exit(0)
+
+    # 后台服务运行时把保存/恢复命令转发给服务，不在本进程中加载会话和采集窗口
+    service_config = config.get("service", {})
+    if (args.save or args.restore or args.restore_last) and service_config.get("forward_cli", True) and not args.no_service:
+        from session_manager.service import send_command, ServiceUnavailable
+        if args.save:
+            command, command_args = "save", {"name": args.save}
+        elif args.restore:
+            command, command_args = "restore", {"name": args.restore, "snapshot": args.snapshot}
+        else:
+            command, command_args = "restore_last", {}
+        try:
+            reply = send_command(command, timeout=service_config.get("request_timeout", 300), **command_args)
+        except ServiceUnavailable as e:
+            logger.debug(f"{e}，在当前进程中执行")
+        else:
+            print(reply["message"])
+            sys.exit(0 if reply.get("ok") else 1)
+
+    # 常驻后台服务：独占会话存储，已被界面或其他进程打开时不启动
+    if args.service:
+        from session_manager.core import create_session_manager, SessionStoreBusy
+        from session_manager.service import run_service, is_service_running
+        if is_service_running():
+            print("后台服务已在运行")
+            sys.exit(0)
+        try:
+            session_manager = create_session_manager(config, exclusive=True)
+        except SessionStoreBusy as e:
+            print(f"{e}，请先关闭界面再启动后台服务")
+            sys.exit(1)
+        if not run_service(config, session_manager):
+            print("后台服务已在运行")
+            session_manager.close()
+        sys.exit(0)
+
+    # 实例化会话管理器：后台服务运行时使用服务中的会话，不在本进程中再打开一份会话存储
+    from session_manager.service import RemoteSessionManager, ServiceUnavailable
+    try:
+        session_manager = RemoteSessionManager.connect(service_config.get("request_timeout", 300))
+        logger.info("后台服务正在运行，通过服务读写会话")
+    except ServiceUnavailable:
+        from session_manager.core import create_session_manager
+        session_manager = create_session_manager(config)
+
     # 处理命令行操作
     if args.save:
         # 保存会话
@@ -218,15 +309,60 @@ def main():
         print(f"已保存会话: {args.save}")
         sys.exit(0)
     
+    if args.history:
+        # 列出快照历史
+        snapshots = session_manager.get_session_history(args.history)
+        if not snapshots:
+            print(f"会话 {args.history} 没有快照历史")
+        for snapshot in reversed(snapshots):
+            saved_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["saved_at"]))
+            print(f"#{snapshot['id']}  {saved_at}  {snapshot['apps']} 个应用, {snapshot['tabs']} 个标签页")
+        sys.exit(0)
+    
+    if args.diff:
+        # 比较会话
+        from session_manager.session_diff import diff_sessions, diff_with_live, format_diff_report
+        old_name = args.diff[0]
+        if len(args.diff) > 1:
+            new_name = args.diff[1]
+            diff = diff_sessions(session_manager.get_session(old_name), session_manager.get_session(new_name))
+        else:
+            new_name = "当前桌面"
+            diff = diff_with_live(session_manager.get_session(old_name), config)
+        print(format_diff_report(diff, old_name, new_name))
+        sys.exit(0)
+    
+    if args.export_all or args.import_all:
+        # 批量导出/导入会话归档
+        from session_manager.storage import export_archive, import_archive, format_archive_report, ArchiveError
+        try:
+            if args.export_all:
+                stats = export_archive(session_manager, args.export_all)
+                print(f"已导出到 {args.export_all}: {format_archive_report(stats)}")
+            else:
+                stats = import_archive(session_manager, args.import_all, overwrite=args.overwrite,
+                                       workers=config["advanced"].get("restore_concurrency", 4))
+                print(f"已从 {args.import_all} 导入: {format_archive_report(stats)}")
+        except (OSError, ArchiveError) as e:
+            print(f"归档操作失败: {e}")
+            sys.exit(1)
+        session_manager.close()
+        sys.exit(0)
+    
     if args.restore:
         # 恢复会话
         session_name = args.restore
-        session_data = session_manager.get_session(session_name)
+        if args.snapshot is not None:
+            session_data = session_manager.get_session_snapshot(session_name, args.snapshot)
+        else:
+            session_data = session_manager.get_session(session_name)
         if session_data:
             from session_manager.core import restore_session
-            restore_session(session_data, config)
+            from session_manager.launcher import format_restore_report
+            result = restore_session(session_data, config)
             update_config({"startup": {"last_session": session_name}})
             print(f"已恢复会话: {session_name}")
+            print(format_restore_report(result))
         else:
             print(f"找不到会话: {session_name}")
         sys.exit(0)
@@ -238,8 +374,10 @@ def main():
             session_data = session_manager.get_session(session_name)
             if session_data:
                 from session_manager.core import restore_session
-                restore_session(session_data, config)
+                from session_manager.launcher import format_restore_report
+                result = restore_session(session_data, config)
                 print(f"已恢复上次会话: {session_name}")
+                print(format_restore_report(result))
             else:
                 print(f"找不到上次会话: {session_name}")
         else:
@@ -247,6 +385,8 @@ def main():
         sys.exit(0)
     
     # 启动GUI
+    import tkinter as tk
+    from session_manager.gui import SessionManagerApp, GuiLogHandler
     root = tk.Tk()
     root.title(f"{APP_NAME} v{VERSION}")
     
@@ -258,10 +398,22 @@ def main():
     # 创建应用实例
     app = SessionManagerApp(root, config, session_manager)
 
+    # 启动自动保存：后台服务运行时由服务自动保存；会话存储被其他进程打开时不再启动第二个
+    auto_saver = None
+    if getattr(session_manager, "remote", False):
+        logger.info("自动保存由后台服务执行")
+    elif not getattr(session_manager, "exclusive", True):
+        logger.warning("会话存储正被其他进程使用，本进程不启动自动保存")
+    else:
+        from session_manager.auto_save import AutoSaveWorker
+        auto_saver = AutoSaveWorker(config, session_manager)
+        auto_saver.start()
+
     # 添加 GUI 日志 handler
     gui_handler = GuiLogHandler(app)
     gui_handler.setLevel(logging.INFO)
     logging.getLogger().addHandler(gui_handler)
+    gui_handler.start()
 
     # 如果配置了自动恢复上次会话
     if config["startup"]["restore_last_session"] and config["startup"]["last_session"]:
@@ -278,6 +430,14 @@ def main():
     
     # 启动主循环
     root.mainloop()
+    gui_handler.stop()
+    logging.getLogger().removeHandler(gui_handler)
+
+    # 退出前取消后台操作、停止自动保存并写入会话检查点
+    app.executor.shutdown()
+    if auto_saver is not None:
+        auto_saver.stop()
+    session_manager.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,196 @@
+"""
+auto_save.py
+按 advanced.auto_save_interval 定期自动保存会话的后台线程。
+
+每次检查先做一次低开销的指纹计算（可见窗口集合的哈希 + 浏览器会话文件的 stat 签名），
+只有指纹变化时才执行完整的 collect_session_data 并写入；系统繁忙时推迟检查。
+"""
+
+import os
+import glob
+import hashlib
+import logging
+import threading
+
+import win32gui
+import win32process
+
+from session_manager.browser_tabs import BROWSER_PROFILES
+from session_manager.core import collect_session_data
+from session_manager.restore_scheduler import ResourceMonitor, DEFAULT_SCHEDULER_CONFIG
+from session_manager.storage import serialize_session
+
+logger = logging.getLogger(__name__)
+
+AUTO_SAVE_SESSION_NAME = "自动保存"
+# 系统繁忙时检查间隔最多放大到的倍数
+MAX_BACKOFF = 8
+
+
+def window_set_fingerprint():
+    """返回所有可见顶层窗口 (标题, 进程ID) 集合的哈希，不访问进程信息"""
+    windows = []
+
+    def callback(hwnd, _):
+        if win32gui.IsWindowVisible(hwnd):
+            title = win32gui.GetWindowText(hwnd)
+            if title.strip():
+                _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                windows.append(f"{pid}\t{title}")
+        return True
+
+    win32gui.EnumWindows(callback, None)
+    windows.sort()
+    return hashlib.sha1("\n".join(windows).encode('utf-8')).hexdigest()
+
+
+def browser_session_files():
+    """返回各浏览器会话文件的路径模式列表（文件不存在时 glob 结果为空）"""
+    patterns = []
+    for browser_exe, info in BROWSER_PROFILES.items():
+        for data_path in info.get("data_paths", []):
+            if not os.path.isdir(data_path):
+                continue
+            if browser_exe == "firefox.exe":
+                patterns.append(os.path.join(data_path, "*", "sessionstore-backups", "recovery.jsonlz4"))
+                patterns.append(os.path.join(data_path, "*", "sessionstore.jsonlz4"))
+            else:
+                profile_dirs = [data_path] if info.get("default_profile") is None else [
+                    os.path.join(data_path, "Default"), os.path.join(data_path, "Profile *")
+                ]
+                for profile_dir in profile_dirs:
+                    patterns.append(os.path.join(profile_dir, "Sessions", "*"))
+                    patterns.append(os.path.join(profile_dir, info.get("current_session_file", "Current Session")))
+                    patterns.append(os.path.join(profile_dir, info.get("current_tabs_file", "Current Tabs")))
+            # 同一浏览器只取第一个存在的数据目录
+            break
+    return patterns
+
+
+def browser_session_signature(patterns):
+    """返回浏览器会话文件 (路径, 修改时间, 大小) 的哈希"""
+    signature = []
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature.append(f"{path}\t{stat.st_mtime_ns}\t{stat.st_size}")
+    signature.sort()
+    return hashlib.sha1("\n".join(signature).encode('utf-8')).hexdigest()
+
+
+def _content_key(session_data):
+    """会话内容的比较键，忽略每次采集都会变化的进程ID"""
+    applications = [{k: v for k, v in app.items() if k != "pid"} for app in session_data.get("applications", [])]
+    return hashlib.sha1(serialize_session(dict(session_data, applications=applications))).hexdigest()
+
+
+class AutoSaveWorker:
+    """
+    自动保存后台线程。
+
+    - 每隔 advanced.auto_save_interval 秒检查一次，间隔为 0 时不启动
+    - CPU、内存或磁盘压力超过 restore_scheduler 中的阈值时跳过本次检查，并将间隔加倍（最多 MAX_BACKOFF 倍）
+    - 窗口集合与浏览器会话文件都没有变化时不采集
+    - 采集结果与已保存内容相同（忽略进程ID）时不写入
+    """
+
+    def __init__(self, config, session_manager, session_name=AUTO_SAVE_SESSION_NAME, monitor=None):
+        self.config = config
+        self.session_manager = session_manager
+        self.session_name = session_name
+        self.interval = config.get("advanced", {}).get("auto_save_interval", 0)
+        thresholds = dict(DEFAULT_SCHEDULER_CONFIG)
+        thresholds.update(config.get("restore_scheduler", {}))
+        self.thresholds = thresholds
+        self.monitor = monitor
+        self.backoff = 1
+        self.stats = {"checks": 0, "busy": 0, "unchanged": 0, "collected": 0, "saved": 0}
+        self._fingerprint = None
+        self._saved_key = None
+        self._patterns = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.interval and self.interval > 0)
+
+    def start(self):
+        if not self.enabled:
+            logger.info("自动保存已禁用（advanced.auto_save_interval 为 0）")
+            return False
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="auto-save", daemon=True)
+        self._thread.start()
+        logger.info(f"自动保存已启动，间隔 {self.interval} 秒，保存到会话 '{self.session_name}'")
+        return True
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval * self.backoff):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"自动保存失败: {e}", exc_info=True)
+
+    def _busy(self):
+        if self.monitor is None:
+            self.monitor = ResourceMonitor()
+            return False
+        sample = self.monitor.sample()
+        return (sample["cpu"] >= self.thresholds["cpu_threshold"]
+                or sample["memory"] >= self.thresholds["memory_threshold"]
+                or sample["disk"] >= self.thresholds["disk_threshold"])
+
+    def fingerprint(self):
+        if self._patterns is None:
+            self._patterns = browser_session_files()
+        return window_set_fingerprint() + browser_session_signature(self._patterns)
+
+    def check(self):
+        """
+        执行一次检查。
+
+        返回:
+            是否写入了会话
+        """
+        self.stats["checks"] += 1
+        if self._busy():
+            self.stats["busy"] += 1
+            self.backoff = min(MAX_BACKOFF, self.backoff * 2)
+            logger.debug("系统繁忙，推迟自动保存（间隔 x%s）", self.backoff)
+            return False
+        self.backoff = 1
+
+        fingerprint = self.fingerprint()
+        if fingerprint == self._fingerprint:
+            self.stats["unchanged"] += 1
+            return False
+
+        session_data = collect_session_data(self.config)
+        self.stats["collected"] += 1
+        self._fingerprint = fingerprint
+        key = _content_key(session_data)
+        if self._saved_key is None and self.session_name in self.session_manager.get_session_names():
+            self._saved_key = _content_key(self.session_manager.get_session(self.session_name))
+        if key == self._saved_key:
+            self.stats["unchanged"] += 1
+            return False
+
+        if not self.session_manager.set_session(self.session_name, session_data):
+            return False
+        self.session_manager.save_sessions()
+        self._saved_key = key
+        self.stats["saved"] += 1
+        logger.info(f"已自动保存会话 '{self.session_name}'（{len(session_data.get('applications', []))} 个应用）")
+        return True
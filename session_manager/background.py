@@ -0,0 +1,144 @@
+"""
+background.py
+界面操作的后台执行器：耗时操作在工作线程中运行，进度和结果通过队列交回界面线程处理。
+
+执行器本身不依赖 Tk，界面线程定期调用 poll() 分发事件即可；同一时间只运行一个操作。
+"""
+
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+EVENT_PROGRESS = "progress"
+EVENT_DONE = "done"
+EVENT_ERROR = "error"
+EVENT_CANCELLED = "cancelled"
+
+
+class TaskCancelled(Exception):
+    """操作已被用户取消"""
+
+
+class BackgroundTask:
+    """
+    在后台运行的一个操作。
+
+    工作函数以 func(task) 的形式调用，可以通过 task.report() 报告进度，
+    通过 task.cancel_event 或 task.check_cancelled() 响应取消。
+    """
+
+    def __init__(self, name, func, events):
+        self.name = name
+        self.func = func
+        self.cancel_event = threading.Event()
+        self._events = events
+        self.thread = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise TaskCancelled(self.name)
+
+    def report(self, message, done=None, total=None):
+        """报告进度，可在工作线程中调用"""
+        self._events.put((self, EVENT_PROGRESS, {"message": message, "done": done, "total": total}))
+
+    def _run(self):
+        try:
+            result = self.func(self)
+        except TaskCancelled:
+            self._events.put((self, EVENT_CANCELLED, None))
+        except Exception as e:
+            logger.error(f"后台操作 '{self.name}' 失败: {e}", exc_info=True)
+            self._events.put((self, EVENT_ERROR, e))
+        else:
+            # 工作函数自行处理了取消（如恢复时返回部分结果）时仍视为完成
+            self._events.put((self, EVENT_DONE, result))
+
+
+class BackgroundExecutor:
+    """
+    单任务后台执行器。
+
+    用法:
+        task = executor.submit("保存会话", func, on_done=..., on_progress=..., on_error=..., on_cancelled=...)
+        # 界面线程中定期调用
+        executor.poll()
+
+    回调都在调用 poll() 的线程中执行。已有操作在运行时 submit 返回 None。
+    """
+
+    def __init__(self):
+        self._events = queue.Queue()
+        self._callbacks = {}
+        self.current = None
+
+    @property
+    def busy(self):
+        return self.current is not None
+
+    def submit(self, name, func, on_done=None, on_progress=None, on_error=None, on_cancelled=None):
+        if self.current is not None:
+            logger.warning(f"'{self.current.name}' 正在进行，无法同时执行 '{name}'")
+            return None
+        task = BackgroundTask(name, func, self._events)
+        self._callbacks[task] = {
+            EVENT_DONE: on_done,
+            EVENT_PROGRESS: on_progress,
+            EVENT_ERROR: on_error,
+            EVENT_CANCELLED: on_cancelled
+        }
+        self.current = task
+        task.thread = threading.Thread(target=task._run, name=f"background-{name}", daemon=True)
+        task.thread.start()
+        return task
+
+    def cancel(self):
+        """请求取消当前操作；操作在下一个检查点结束"""
+        if self.current is not None:
+            logger.info(f"正在取消 '{self.current.name}'...")
+            self.current.cancel()
+
+    def poll(self):
+        """
+        分发已到达的事件。
+
+        返回:
+            是否还有操作在运行（调用方据此决定是否继续轮询）
+        """
+        while True:
+            try:
+                task, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self._callbacks.get(task, {})
+            if kind != EVENT_PROGRESS:
+                self._callbacks.pop(task, None)
+                if self.current is task:
+                    self.current = None
+            callback = callbacks.get(kind)
+            if callback is not None:
+                try:
+                    if kind == EVENT_CANCELLED:
+                        callback()
+                    else:
+                        callback(payload)
+                except Exception as e:
+                    logger.error(f"处理后台操作 '{task.name}' 的{kind}事件时出错: {e}", exc_info=True)
+        return self.current is not None
+
+    def shutdown(self, timeout=5):
+        """取消并等待当前操作结束（退出程序时调用）"""
+        task = self.current
+        if task is not None:
+            task.cancel()
+            task.thread.join(timeout)
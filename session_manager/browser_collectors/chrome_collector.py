@@ -17,7 +17,7 @@ PORT_MAPPING = {
 
 def get_chromium_tabs_by_devtools(window_title, browser_exe):
     """使用DevTools协议获取Chromium浏览器标签页"""
-    logger.info(f"尝试使用DevTools协议采集: {window_title} ({browser_exe})")
+    logger.info("尝试使用DevTools协议采集: %s (%s)", window_title, browser_exe)
     ports = [PORT_MAPPING.get(browser_exe, 9222)]
     if not is_devtools_available(ports[0]):
         ports.extend([9222, 9223, 9224, 9225, 9226])
@@ -53,7 +53,7 @@ def get_chromium_tabs_by_devtools(window_title, browser_exe):
                                 "source": "devtools"
                             })
                 if tabs:
-                    logger.info(f"DevTools端口{port}成功采集到{len(tabs)}个标签页")
+                    logger.info("DevTools端口%s成功采集到%s个标签页", port, len(tabs))
                     return tabs
         except Exception as e:
             logger.error(f"DevTools端口{port}处理异常: {e}")
@@ -64,7 +64,7 @@ def get_chromium_tabs_by_devtools(window_title, browser_exe):
 
 def get_chromium_tabs_by_session(browser_exe, window_title, browser_profiles):
     """使用Session文件获取Chromium浏览器标签页（兜底方案）"""
-    logger.info(f"尝试使用Session文件采集: {window_title} ({browser_exe})")
+    logger.info("尝试使用Session文件采集: %s (%s)", window_title, browser_exe)
     data_path = get_valid_data_path(browser_exe, browser_profiles)
     if not data_path:
         logger.error(f"未找到{browser_exe}的数据路径")
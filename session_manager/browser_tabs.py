@@ -22,7 +22,7 @@ import socket
 import time
 import threading
 from session_manager.browser_collectors import chrome_collector, firefox_collector, opera_collector
-from session_manager.utils import get_valid_data_path
+from session_manager.utils import get_valid_data_path, get_process_exe
 
 logger = logging.getLogger(__name__)
 
@@ -106,7 +106,7 @@ def get_valid_data_path(browser_exe):
     info = BROWSER_PROFILES[browser_exe]
     for path in info.get("data_paths", []):
         if os.path.exists(path):
-            logger.info(f"找到{browser_exe}数据路径: {path}")
+            logger.info("找到%s数据路径: %s", browser_exe, path)
             return path
     
     logger.warning(f"未找到{browser_exe}的有效数据路径")
@@ -122,7 +122,7 @@ def is_devtools_available(port):
 
 def get_chromium_tabs_by_devtools(window_title, browser_exe):
     """使用DevTools协议获取Chromium浏览器标签页"""
-    logger.info(f"尝试使用DevTools协议采集: {window_title} ({browser_exe})")
+    logger.info("尝试使用DevTools协议采集: %s (%s)", window_title, browser_exe)
     
     # 根据浏览器类型确定端口
     port_mapping = {
@@ -138,7 +138,7 @@ def get_chromium_tabs_by_devtools(window_title, browser_exe):
     
     for port in ports:
         try:
-            logger.debug(f"尝试连接DevTools端口: {port}")
+            logger.debug("尝试连接DevTools端口: %s", port)
             response = requests.get(f"http://127.0.0.1:{port}/json", timeout=2)
             if response.status_code != 200:
                 continue
@@ -180,11 +180,11 @@ def get_chromium_tabs_by_devtools(window_title, browser_exe):
                             })
                 
                 if tabs:
-                    logger.info(f"DevTools端口{port}成功采集到{len(tabs)}个标签页")
+                    logger.info("DevTools端口%s成功采集到%s个标签页", port, len(tabs))
                     return tabs
                     
         except requests.exceptions.RequestException as e:
-            logger.debug(f"DevTools端口{port}连接失败: {e}")
+            logger.debug("DevTools端口%s连接失败: %s", port, e)
             continue
         except Exception as e:
             logger.error(f"DevTools端口{port}处理异常: {e}")
@@ -195,7 +195,7 @@ def get_chromium_tabs_by_devtools(window_title, browser_exe):
 
 def get_chromium_tabs_by_session(browser_exe, window_title):
     """使用Session文件获取Chromium浏览器标签页（兜底方案）"""
-    logger.info(f"尝试使用Session文件采集: {window_title} ({browser_exe})")
+    logger.info("尝试使用Session文件采集: %s (%s)", window_title, browser_exe)
     
     data_path = get_valid_data_path(browser_exe)
     if not data_path:
@@ -236,7 +236,7 @@ def get_chromium_tabs_by_session(browser_exe, window_title):
                     tabs = extract_tabs_from_session_files(info, session_file)
                     if tabs:
                         all_tabs.extend(tabs)
-                        logger.info(f"从{session_file}采集到{len(tabs)}个标签页")
+                        logger.info("从%s采集到%s个标签页", session_file, len(tabs))
                 except Exception as e:
                     logger.error(f"读取Session文件失败 {session_file}: {e}")
         
@@ -246,7 +246,7 @@ def get_chromium_tabs_by_session(browser_exe, window_title):
                 tabs = extract_tabs_from_history(info, profile_path)
                 if tabs:
                     all_tabs.extend(tabs)
-                    logger.info(f"从{profile}历史记录采集到{len(tabs)}个标签页")
+                    logger.info("从%s历史记录采集到%s个标签页", profile, len(tabs))
             except Exception as e:
                 logger.error(f"读取历史记录失败 {profile}: {e}")
     
@@ -261,7 +261,7 @@ def get_chromium_tabs_by_session(browser_exe, window_title):
                 break
     
     if unique_tabs:
-        logger.info(f"Session/历史采集成功，共{len(unique_tabs)}个标签页")
+        logger.info("Session/历史采集成功，共%s个标签页", len(unique_tabs))
         return unique_tabs
     
     logger.warning("Session/历史采集失败，返回默认标签页")
@@ -269,7 +269,7 @@ def get_chromium_tabs_by_session(browser_exe, window_title):
 
 def get_firefox_tabs(window_title):
     """获取Firefox浏览器标签页"""
-    logger.info(f"尝试采集Firefox标签页: {window_title}")
+    logger.info("尝试采集Firefox标签页: %s", window_title)
     
     # 获取有效的Firefox数据路径
     data_paths = BROWSER_PROFILES["firefox.exe"]["data_paths"]
@@ -278,7 +278,7 @@ def get_firefox_tabs(window_title):
     for path in data_paths:
         if os.path.exists(path):
             profiles_path = path
-            logger.info(f"找到Firefox profiles路径: {path}")
+            logger.info("找到Firefox profiles路径: %s", path)
             break
     
     if not profiles_path:
@@ -303,7 +303,7 @@ def get_firefox_tabs(window_title):
         
         if profile_candidates:
             profile_dir = profile_candidates[0][0]
-            logger.info(f"选择Firefox profile: {os.path.basename(profile_dir)}")
+            logger.info("选择Firefox profile: %s", os.path.basename(profile_dir))
         
     except Exception as e:
         logger.error(f"查找Firefox profile失败: {e}")
@@ -356,7 +356,7 @@ def get_firefox_tabs(window_title):
                             best_tabs = tabs
                 
                 if best_tabs:
-                    logger.info(f"从sessionstore.jsonlz4采集到{len(best_tabs)}个标签页")
+                    logger.info("从sessionstore.jsonlz4采集到%s个标签页", len(best_tabs))
                     return best_tabs
                     
         except Exception as e:
@@ -396,7 +396,7 @@ def get_firefox_tabs(window_title):
                         })
                 
                 conn.close()
-                logger.info(f"从places.sqlite采集到{len(tabs)}个标签页")
+                logger.info("从places.sqlite采集到%s个标签页", len(tabs))
                 
                 if tabs:
                     return tabs
@@ -416,8 +416,152 @@ def get_firefox_tabs(window_title):
     logger.warning("Firefox采集失败，返回默认标签页")
     return [{"title": "新标签页", "url": "about:newtab", "source": "fallback"}]
 
+# 按文件状态缓存的解析结果: 键 -> (文件状态, 结果)
+_file_results = {}
+_file_results_lock = threading.Lock()
+
+
+def _files_stamp(paths):
+    """文件的 (路径, 修改时间, 大小)，不存在的文件记为 None"""
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+def _cached_file_result(key, paths, compute):
+    """
+    paths 中的文件都没有变化时返回上次 compute() 的结果，否则重新计算。
+    常驻进程（界面、后台服务、自动保存）重复采集时不必再读取未变化的会话文件和历史数据库。
+    """
+    stamp = _files_stamp(paths)
+    with _file_results_lock:
+        cached = _file_results.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    result = compute()
+    with _file_results_lock:
+        _file_results[key] = (stamp, result)
+    return result
+
+
+def _chromium_profiles(user_data_dir):
+    """Chromium 内核浏览器的配置文件目录名，Default 在最前"""
+    local_state_path = os.path.join(user_data_dir, "Local State")
+
+    def compute():
+        profiles = ["Default"]
+        if os.path.exists(local_state_path):
+            with open(local_state_path, 'r', encoding='utf-8') as f:
+                try:
+                    local_state = json.load(f)
+                    profile_info = local_state.get("profile", {}).get("info_cache", {})
+                    for profile_name in profile_info.keys():
+                        if profile_name != "Default" and os.path.exists(os.path.join(user_data_dir, profile_name)):
+                            profiles.append(profile_name)
+                except:
+                    pass
+        return profiles
+
+    return _cached_file_result(("profiles", user_data_dir), [local_state_path], compute)
+
+
+CHROMIUM_SESSION_FILES = ["Current Session", "Current Tabs", "Last Session", "Last Tabs"]
+
+
+def _chromium_profile_tabs(user_data_dir, profile):
+    """从一个配置文件的 Session 文件和历史数据库读取标签页"""
+    session_files = [os.path.join(user_data_dir, profile, fname) for fname in CHROMIUM_SESSION_FILES]
+    history_db = os.path.join(user_data_dir, profile, "History")
+
+    def compute():
+        tabs = []
+        # 1. Session文件
+        for fpath in session_files:
+            if os.path.exists(fpath):
+                try:
+                    with open(fpath, "rb") as f:
+                        data = f.read()
+                        import re
+                        urls = re.findall(b'https?://[^"]+', data)
+                        for u in urls:
+                            try:
+                                url = u.decode("utf-8", errors="ignore")
+                                if url.startswith("http"):
+                                    tabs.append({"title": url, "url": url})
+                            except:
+                                continue
+                except:
+                    continue
+        # 2. 历史数据库
+        if os.path.exists(history_db):
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as temp_file:
+                temp_db_path = temp_file.name
+            try:
+                shutil.copy2(history_db, temp_db_path)
+                conn = sqlite3.connect(temp_db_path)
+                cursor = conn.cursor()
+                cursor.execute("SELECT url, title FROM urls ORDER BY last_visit_time DESC LIMIT 30")
+                for url, title in cursor.fetchall():
+                    tabs.append({"title": title or url, "url": url})
+                conn.close()
+            except:
+                pass
+            finally:
+                try: os.unlink(temp_db_path)
+                except: pass
+        return tabs
+
+    return _cached_file_result(("chromium", user_data_dir, profile), session_files + [history_db], compute)
+
+
+def _firefox_session_windows(session_file):
+    """解析 Firefox 的 sessionstore.jsonlz4，返回 [{"title", "browser", "tabs"}]"""
+    def compute():
+        windows = []
+        with open(session_file, "rb") as f:
+            f.read(8)
+            data = lz4.block.decompress(f.read())
+            session_data = json.loads(data.decode("utf-8"))
+            for win in session_data.get("windows", []):
+                tabs = []
+                seen = set()
+                for tab in win.get("tabs", []):
+                    idx = tab.get("index", 1) - 1
+                    entries = tab.get("entries", [])
+                    if entries and 0 <= idx < len(entries):
+                        entry = entries[idx]
+                        url = entry.get("url", "")
+                        title = entry.get("title", url)
+                        if url and url not in seen:
+                            seen.add(url)
+                            tabs.append({"title": title, "url": url})
+                win_title = ""
+                if win.get("tabs") and win["tabs"]:
+                    entries = win["tabs"][0].get("entries", [])
+                    if entries:
+                        win_title = entries[-1].get("title", "")
+                if not tabs:
+                    tabs = [{"title": "新标签页", "url": "about:newtab"}]
+                windows.append({
+                    "title": win_title,
+                    "browser": "firefox.exe",
+                    "tabs": tabs
+                })
+        return windows
+
+    return _cached_file_result(("firefox", session_file), [session_file], compute)
+
+
 def collect_all_browser_tabs():
-    """仅通过session文件和历史数据库采集标签页，并按窗口标题与tab标题相似度分配"""
+    """
+    仅通过session文件和历史数据库采集标签页，并按窗口标题与tab标题相似度分配。
+    会话文件和历史数据库的解析结果按文件修改时间缓存，文件未变化时不再重复读取。
+    """
     browser_windows = []
     local_windows = []
     for w in gw.getAllWindows():
@@ -425,8 +569,7 @@ def collect_all_browser_tabs():
             continue
         try:
             _, pid = win32process.GetWindowThreadProcessId(w._hWnd)
-            proc = psutil.Process(pid)
-            exe = os.path.basename(proc.exe()).lower()
+            exe = os.path.basename(get_process_exe(pid)).lower()
             if exe in BROWSER_PROFILES:
                 local_windows.append({
                     "title": w.title,
@@ -442,63 +585,15 @@ def collect_all_browser_tabs():
         user_data_dir = info["data_paths"][0]
         tabs = []
         # 遍历所有profile
-        profiles = ["Default"]
-        local_state_path = os.path.join(user_data_dir, "Local State")
-        if os.path.exists(local_state_path):
-            with open(local_state_path, 'r', encoding='utf-8') as f:
-                try:
-                    local_state = json.load(f)
-                    profile_info = local_state.get("profile", {}).get("info_cache", {})
-                    for profile_name in profile_info.keys():
-                        if profile_name != "Default" and os.path.exists(os.path.join(user_data_dir, profile_name)):
-                            profiles.append(profile_name)
-                except:
-                    pass
-        for profile in profiles:
-            # 1. Session文件
-            for fname in ["Current Session", "Current Tabs", "Last Session", "Last Tabs"]:
-                fpath = os.path.join(user_data_dir, profile, fname)
-                if os.path.exists(fpath):
-                    try:
-                        with open(fpath, "rb") as f:
-                            data = f.read()
-                            import re
-                            urls = re.findall(b'https?://[^"]+', data)
-                            for u in urls:
-                                try:
-                                    url = u.decode("utf-8", errors="ignore")
-                                    if url.startswith("http"):
-                                        tabs.append({"title": url, "url": url})
-                                except:
-                                    continue
-                    except:
-                        continue
-            # 2. 历史数据库
-            history_db = os.path.join(user_data_dir, profile, "History")
-            if os.path.exists(history_db):
-                import tempfile, shutil, sqlite3
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.db') as temp_file:
-                    temp_db_path = temp_file.name
-                try:
-                    shutil.copy2(history_db, temp_db_path)
-                    conn = sqlite3.connect(temp_db_path)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT url, title FROM urls ORDER BY last_visit_time DESC LIMIT 30")
-                    for url, title in cursor.fetchall():
-                        tabs.append({"title": title or url, "url": url})
-                    conn.close()
-                except:
-                    pass
-                finally:
-                    try: os.unlink(temp_db_path)
-                    except: pass
-        # 去重
+        for profile in _chromium_profiles(user_data_dir):
+            tabs.extend(_chromium_profile_tabs(user_data_dir, profile))
+        # 去重（复制条目，缓存中的结果不会被会话数据的后续修改影响）
         seen = set()
         unique_tabs = []
         for tab in tabs:
             if tab["url"] and tab["url"] not in seen:
                 seen.add(tab["url"])
-                unique_tabs.append(tab)
+                unique_tabs.append(dict(tab))
         return unique_tabs
     # 分配tabs到窗口
     for browser_exe in ["chrome.exe", "msedge.exe", "brave.exe", "opera.exe"]:
@@ -526,35 +621,12 @@ def collect_all_browser_tabs():
                 session_file = os.path.join(profile_dir, "sessionstore.jsonlz4")
                 if os.path.exists(session_file):
                     try:
-                        with open(session_file, "rb") as f:
-                            f.read(8)
-                            data = lz4.block.decompress(f.read())
-                            session_data = json.loads(data.decode("utf-8"))
-                            for win in session_data.get("windows", []):
-                                tabs = []
-                                seen = set()
-                                for tab in win.get("tabs", []):
-                                    idx = tab.get("index", 1) - 1
-                                    entries = tab.get("entries", [])
-                                    if entries and 0 <= idx < len(entries):
-                                        entry = entries[idx]
-                                        url = entry.get("url", "")
-                                        title = entry.get("title", url)
-                                        if url and url not in seen:
-                                            seen.add(url)
-                                            tabs.append({"title": title, "url": url})
-                                win_title = ""
-                                if win.get("tabs") and win["tabs"]:
-                                    entries = win["tabs"][0].get("entries", [])
-                                    if entries:
-                                        win_title = entries[-1].get("title", "")
-                                if not tabs:
-                                    tabs = [{"title": "新标签页", "url": "about:newtab"}]
-                                browser_windows.append({
-                                    "title": win_title,
-                                    "browser": "firefox.exe",
-                                    "tabs": tabs
-                                })
+                        for win in _firefox_session_windows(session_file):
+                            browser_windows.append({
+                                "title": win["title"],
+                                "browser": win["browser"],
+                                "tabs": [dict(tab) for tab in win["tabs"]]
+                            })
                     except Exception:
                         continue
     return browser_windows
@@ -570,7 +642,7 @@ def get_browser_tabs(browser_process_path, window_title, config):
         标签页URL列表
     """
     browser_exe = os.path.basename(browser_process_path).lower()
-    logger.info(f"开始获取浏览器标签页: {browser_exe}, 窗口标题: {window_title}")
+    logger.info("开始获取浏览器标签页: %s, 窗口标题: %s", browser_exe, window_title)
     if browser_exe not in BROWSER_PROFILES:
         logger.warning(f"不支持的浏览器: {browser_exe}")
         return []
@@ -598,7 +670,7 @@ def get_browser_pid(browser_process_path, window_title):
                 _, window_pid = win32process.GetWindowThreadProcessId(window._hWnd)
                 proc = psutil.Process(window_pid)
                 if os.path.basename(proc.exe()).lower() == browser_exe:
-                    logger.debug(f"精确匹配到浏览器窗口: {window.title} (PID: {window_pid}, HWND: {window._hWnd})")
+                    logger.debug("精确匹配到浏览器窗口: %s (PID: %s, HWND: %s)", window.title, window_pid, window._hWnd)
                     # 返回窗口PID和窗口句柄
                     return window_pid, window._hWnd
             except:
@@ -616,7 +688,7 @@ def get_browser_pid(browser_process_path, window_title):
                     # 计算窗口标题与目标标题的相似度
                     similarity = calculate_similarity(window.title, window_title)
                     if similarity > 0.6:  # 60%以上的相似度
-                        logger.debug(f"模糊匹配到浏览器窗口: {window.title} (PID: {window_pid}, 相似度: {similarity:.2f}, HWND: {window._hWnd})")
+                        logger.debug("模糊匹配到浏览器窗口: %s (PID: %s, 相似度: %.2f, HWND: %s)", window.title, window_pid, similarity, window._hWnd)
                         # 返回窗口PID和窗口句柄
                         return window_pid, window._hWnd
                     else:
@@ -628,13 +700,13 @@ def get_browser_pid(browser_process_path, window_title):
         # 如果仍未找到匹配，使用第一个浏览器窗口
         if matching_windows:
             pid, hwnd, title = matching_windows[0]
-            logger.debug(f"未找到精确匹配，使用第一个浏览器窗口: {title} (PID: {pid}, HWND: {hwnd})")
+            logger.debug("未找到精确匹配，使用第一个浏览器窗口: %s (PID: %s, HWND: %s)", title, pid, hwnd)
             return pid, hwnd
             
         # 如果没有找到任何窗口，尝试查找浏览器进程
         for proc in psutil.process_iter(['pid', 'name', 'exe']):
             if proc.info['exe'] and os.path.basename(proc.info['exe']).lower() == browser_exe:
-                logger.debug(f"未找到匹配窗口，使用浏览器进程: {proc.info['pid']}")
+                logger.debug("未找到匹配窗口，使用浏览器进程: %s", proc.info['pid'])
                 return proc.info['pid'], None
     except Exception as e:
         logger.error(f"获取浏览器PID时出错: {e}")
@@ -658,7 +730,7 @@ def get_chromium_tabs(browser_exe, browser_pid):
             profile_tabs = get_tabs_from_profile(browser_info, user_data_dir, profile_name)
             if profile_tabs:
                 tabs.extend(profile_tabs)
-                logger.debug(f"从配置文件 {profile_name} 获取到 {len(profile_tabs)} 个标签页")
+                logger.debug("从配置文件 %s 获取到 %s 个标签页", profile_name, len(profile_tabs))
     
     except Exception as e:
         logger.error(f"获取{browser_info['name']}标签页时出错: {e}")
@@ -751,13 +823,13 @@ def extract_tabs_from_session_files(browser_info, profile_path):
                 # 创建临时副本
                 with tempfile.NamedTemporaryFile(delete=False, suffix='.bin') as temp_file:
                     temp_path = temp_file.name
-                    logger.debug(f"正在处理会话文件: {file_type}，创建临时副本: {temp_path}")
+                    logger.debug("正在处理会话文件: %s，创建临时副本: %s", file_type, temp_path)
                 
                 # 复制文件可能会失败，如果文件被锁定
                 try:
                     shutil.copy2(file_path, temp_path)
                 except Exception as e:
-                    logger.debug(f"复制文件 {file_type} 失败: {e}")
+                    logger.debug("复制文件 %s 失败: %s", file_type, e)
                     try:
                         os.unlink(temp_path)  # 删除可能创建的空临时文件
                     except:
@@ -768,11 +840,11 @@ def extract_tabs_from_session_files(browser_info, profile_path):
                 with open(temp_path, 'rb') as f:
                     data = f.read()
                     file_size = len(data)
-                    logger.debug(f"读取文件 {file_type} 成功，大小: {file_size} 字节")
+                    logger.debug("读取文件 %s 成功，大小: %s 字节", file_type, file_size)
                     
                     # 检查文件大小，如果太小可能不包含有用信息
                     if file_size < 100:
-                        logger.debug(f"文件 {file_type} 太小 ({file_size} 字节)，可能不包含有效数据")
+                        logger.debug("文件 %s 太小 (%s 字节)，可能不包含有效数据", file_type, file_size)
                         continue
                     
                     # 尝试提取URL和标题
@@ -789,25 +861,25 @@ def extract_tabs_from_session_files(browser_info, profile_path):
                         if new_tabs:
                             tabs.extend(new_tabs)
                             new_count = len(tabs) - old_count
-                            logger.debug(f"从 {file_type} 提取到 {len(extracted_tabs)} 个标签页，其中 {new_count} 个是新的")
+                            logger.debug("从 %s 提取到 %s 个标签页，其中 %s 个是新的", file_type, len(extracted_tabs), new_count)
                             file_tab_counts[file_type] = new_count
                         else:
-                            logger.debug(f"从 {file_type} 提取到 {len(extracted_tabs)} 个标签页，但都是重复的")
+                            logger.debug("从 %s 提取到 %s 个标签页，但都是重复的", file_type, len(extracted_tabs))
                     else:
-                        logger.debug(f"从 {file_type} 未提取到有效标签页")
+                        logger.debug("从 %s 未提取到有效标签页", file_type)
                 
                 # 删除临时文件
                 try:
                     os.unlink(temp_path)
-                    logger.debug(f"删除临时文件: {temp_path}")
+                    logger.debug("删除临时文件: %s", temp_path)
                 except Exception as e:
-                    logger.debug(f"删除临时文件失败: {e}")
+                    logger.debug("删除临时文件失败: %s", e)
             except Exception as e:
-                logger.debug(f"读取 {file_type} 文件时出错: {e}")
+                logger.debug("读取 %s 文件时出错: %s", file_type, e)
     
     # 总结日志
     if file_tab_counts:
-        logger.info(f"从会话文件中成功提取标签页: {sum(file_tab_counts.values())} 个，详情: {file_tab_counts}")
+        logger.info("从会话文件中成功提取标签页: %s 个，详情: %s", sum(file_tab_counts.values()), file_tab_counts)
     else:
         logger.warning(f"未能从任何会话文件中提取到标签页")
     
@@ -1182,13 +1254,13 @@ def restore_chromium_window(browser_path, urls):
                     seen_urls.add(url)
                     unique_urls.append(url)
                 except:
-                    logger.debug(f"跳过无效URL: {url[:50]}...")
+                    logger.debug("跳过无效URL: %s...", url[:50])
         
         if not unique_urls:
             logger.warning("没有有效的URL可以恢复")
             return False
             
-        logger.info(f"准备恢复 {len(unique_urls)} 个唯一的URL到新浏览器窗口")
+        logger.info("准备恢复 %s 个唯一的URL到新浏览器窗口", len(unique_urls))
         
         # 尝试两种方法恢复标签页
         
@@ -1217,7 +1289,7 @@ def restore_using_html_method(browser_path, urls):
         # 创建临时HTML文件，用于一次性打开所有标签页到同一个窗口中
         with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8') as f:
             temp_html_path = f.name
-            logger.debug(f"创建临时HTML文件: {temp_html_path}")
+            logger.debug("创建临时HTML文件: %s", temp_html_path)
             
             # 创建自动打开多个标签页的HTML
             f.write("""
@@ -1430,7 +1502,7 @@ def restore_using_html_method(browser_path, urls):
             """)
         
         # 创建新窗口并打开临时HTML文件
-        logger.info(f"使用HTML方法启动浏览器恢复 {len(urls)} 个标签页")
+        logger.info("使用HTML方法启动浏览器恢复 %s 个标签页", len(urls))
         subprocess.Popen([browser_path, "--new-window", temp_html_path])
         
         # 延迟删除临时文件
@@ -1439,9 +1511,9 @@ def restore_using_html_method(browser_path, urls):
             try:
                 if os.path.exists(temp_html_path):
                     os.unlink(temp_html_path)
-                    logger.debug(f"临时HTML文件已删除: {temp_html_path}")
+                    logger.debug("临时HTML文件已删除: %s", temp_html_path)
             except Exception as e:
-                logger.debug(f"删除临时文件失败: {e}")
+                logger.debug("删除临时文件失败: %s", e)
         
         # 在后台线程中删除临时文件
         threading.Thread(target=delete_temp_file, daemon=True).start()
@@ -1468,7 +1540,7 @@ def restore_using_command_line(browser_path, urls):
             cmd.append(url)
         
         # 启动浏览器
-        logger.info(f"使用命令行方法启动浏览器恢复标签页")
+        logger.info("使用命令行方法启动浏览器恢复标签页")
         process = subprocess.Popen(cmd)
         
         # 如果有超过10个URL，分批次添加剩余的URL
@@ -1478,7 +1550,7 @@ def restore_using_command_line(browser_path, urls):
             
             # 添加剩余URL
             remaining_urls = urls[10:]
-            logger.info(f"添加剩余的 {len(remaining_urls)} 个URL")
+            logger.info("添加剩余的 %s 个URL", len(remaining_urls))
             
             # 每10个URL一批次
             for i in range(0, len(remaining_urls), 10):
@@ -1574,7 +1646,7 @@ def restore_using_javascript(browser_path, urls):
             """)
         
         # 打开浏览器
-        logger.info(f"使用JavaScript方法启动浏览器恢复标签页")
+        logger.info("使用JavaScript方法启动浏览器恢复标签页")
         subprocess.Popen([browser_path, "--new-window", temp_html_path])
         
         # 延迟删除临时文件
@@ -1628,7 +1700,7 @@ def restore_firefox_window(browser_path, urls):
             # 打开其余标签页
             subprocess.Popen(cmd)
         
-        logger.info(f"已创建新Firefox窗口并恢复 {len(urls)} 个标签页")
+        logger.info("已创建新Firefox窗口并恢复 %s 个标签页", len(urls))
         return True
     except Exception as e:
         logger.error(f"恢复Firefox窗口时出错: {e}")
@@ -1653,18 +1725,18 @@ def get_chromium_tabs_for_window(browser_exe, browser_pid, window_title, window_
     获取Chromium浏览器特定窗口的标签页
     优化版本：优先使用DevTools协议，兜底使用Session/历史记录
     """
-    logger.info(f"开始获取Chromium标签页: {browser_exe}, 窗口: {window_title}")
+    logger.info("开始获取Chromium标签页: %s, 窗口: %s", browser_exe, window_title)
     
     # 方法1: 优先使用DevTools协议
     tabs = get_chromium_tabs_by_devtools(window_title, browser_exe)
     if tabs:
-        logger.info(f"DevTools协议成功获取{len(tabs)}个标签页")
+        logger.info("DevTools协议成功获取%s个标签页", len(tabs))
         return tabs
     
     # 方法2: 使用Session文件和历史记录（兜底方案）
     tabs = get_chromium_tabs_by_session(browser_exe, window_title)
     if tabs:
-        logger.info(f"Session/历史记录成功获取{len(tabs)}个标签页")
+        logger.info("Session/历史记录成功获取%s个标签页", len(tabs))
         return tabs
     
     # 方法3: 如果都失败了，返回默认标签页
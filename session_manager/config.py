@@ -6,7 +6,9 @@ config.py
 import os
 import sys
 import json
+import atexit
 import logging
+import threading
 import appdirs
 
 # SCRIPT_DIR 用于定位配置和数据文件
@@ -70,56 +72,113 @@ def get_default_config():
             "confirm_session_delete": True,
             "confirm_window_delete": True,
             "font_size": 10,
-            "max_recent_sessions": 5
+            "max_recent_sessions": 5,
+            "log_max_lines": 2000,
+            "session_preview": True,
+            "preview_cache_entries": 256,
+            "window_thumbnails": True
         },
         "hotkeys": {
             "save_session": "ctrl+alt+s",
             "restore_session": "ctrl+alt+r",
             "quick_restore": "ctrl+alt+q"
         },
+        "restore_scheduler": {
+            "enabled": True,
+            "min_concurrency": 1,
+            "max_concurrency": 8,
+            "cpu_threshold": 85,
+            "memory_threshold": 90,
+            "disk_threshold": 80,
+            "sample_interval": 0.25,
+            "calm_samples": 4,
+            "heavy_app_ms": 3000
+        },
+        "storage": {
+            "backend": "files",
+            "sqlite_file_name": "sessions.db",
+            "session_format": "compact",
+            "session_cache_size": 16,
+            "journal_compact_bytes": 4194304,
+            "journal_sync_interval": 0.2
+        },
         "startup": {
             "autostart": False,
             "minimized": False,
             "restore_last_session": False,
             "last_session": ""
         },
+        "service": {
+            "forward_cli": True,
+            "hotkeys": True,
+            "request_timeout": 300
+        },
+        "logging": {
+            "level": "INFO",
+            "levels": {},
+            "max_bytes": 5242880,
+            "backup_count": 3
+        },
+        "websocket": {
+            "enabled": True,
+            "host": "127.0.0.1",
+            "port": 8765,
+            "auto_start": True,
+            "compression": True,
+            "binary_encoding": True,
+            "measure": False,
+            "measure_interval": 60,
+            "coalesce_window": 0.1,
+            "inbound_queue_size": 64,
+            "max_message_bytes": 1048576,
+            "ack_mode": "each"
+        },
         "advanced": {
             "window_detection_timeout": 5,
             "virtual_desktop_support": True,
             "collect_window_icons": True,
             "max_restore_retries": 3,
+            "restore_concurrency": 4,
             "keep_session_history": True,
             "max_session_history": 10,
             "auto_save_interval": 300  # 5分钟
         }
     }
 
-def load_config(filename=None):
-    """
-    从 JSON 文件加载配置，不存在则创建默认配置。
-    解析 session_data_file 和 log_file 的完整路径。
-    """
-    if filename is None:
-        filename = CONFIG_FILE
+# 由 load_config 根据用户数据目录生成、不写入配置文件的路径
+DERIVED_KEYS = ["session_data_file", "log_file", "sessions_dir", "backup_dir", "cache_dir"]
+# update_config 的修改在内存中生效后，延迟这么多秒合并写入配置文件
+CONFIG_FLUSH_DELAY = 0.5
+
+# 键名由用户决定的字典（如 logging.levels 的模块名），合并时不按默认配置过滤
+FREE_FORM_KEYS = {"levels"}
+
+# 本进程中已经创建过的目录
+_ensured_dirs = set()
 
+
+def _merge_config(target, source, unknown_message):
+    """递归合并配置，忽略 target 中没有的键"""
+    for key, value in source.items():
+        if key in target and key in FREE_FORM_KEYS and isinstance(value, dict):
+            target[key] = {**target[key], **value}
+        elif key in target and isinstance(target[key], dict) and isinstance(value, dict):
+            _merge_config(target[key], value, unknown_message)
+        elif key in target:
+            target[key] = value
+        else:
+            logger.warning(unknown_message.format(key=key))
+
+
+def _read_config_file(filename):
+    """读取配置文件并与默认配置合并，文件不存在时写入默认配置"""
     current_config = get_default_config()
 
     if os.path.exists(filename):
         try:
             with open(filename, 'r', encoding='utf-8') as f:
                 loaded_user_config = json.load(f)
-            
-            # 递归合并配置
-            def merge_config(target, source):
-                for key, value in source.items():
-                    if key in target and isinstance(target[key], dict) and isinstance(value, dict):
-                        merge_config(target[key], value)
-                    elif key in target:
-                        target[key] = value
-                    else:
-                        logger.warning(f"配置文件 '{filename}' 包含未知键: '{key}'，将忽略。")
-            
-            merge_config(current_config, loaded_user_config)
+            _merge_config(current_config, loaded_user_config, f"配置文件 '{filename}' 包含未知键: '{{key}}'，将忽略。")
             logger.info(f"配置已从 {filename} 加载。")
         except Exception as e:
             logger.error(f"加载配置时发生错误 {filename}: {e}. 使用默认配置。", exc_info=True)
@@ -132,54 +191,213 @@ def load_config(filename=None):
     current_config["log_file"] = os.path.join(USER_DATA_DIR, current_config["log_file_name"])
     current_config["sessions_dir"] = os.path.join(USER_DATA_DIR, "sessions")
     current_config["backup_dir"] = os.path.join(USER_DATA_DIR, "backups")
-    
-    # 确保所需目录存在
-    os.makedirs(current_config["sessions_dir"], exist_ok=True)
-    os.makedirs(current_config["backup_dir"], exist_ok=True)
+    current_config["cache_dir"] = os.path.join(USER_DATA_DIR, "cache")
+
+    # 确保所需目录存在（每个进程只创建一次）
+    for key in ("sessions_dir", "backup_dir"):
+        if current_config[key] not in _ensured_dirs:
+            os.makedirs(current_config[key], exist_ok=True)
+            _ensured_dirs.add(current_config[key])
 
     return current_config
 
+
+def _file_stamp(filename):
+    try:
+        st = os.stat(filename)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+class ConfigService:
+    """
+    进程内共享的配置。
+
+    - get() 返回合并了默认值的配置字典；只有配置文件的修改时间或大小变化时才重新读取，
+      重新读取时原地更新同一个字典，持有它的模块能看到外部修改
+    - update() 立即修改内存中的配置，磁盘写入延迟 CONFIG_FLUSH_DELAY 秒合并为一次原子写入；
+      写入前如果文件已被外部修改，先读取文件再叠加未写入的修改。进程退出时写入剩余的修改。
+      update() 返回 True 只表示修改已生效并排队等待写入；延迟写入失败时记录错误并在
+      CONFIG_FLUSH_DELAY 秒后重试，需要确认已写入磁盘时调用 flush()
+    """
+
+    def __init__(self, filename, flush_delay=CONFIG_FLUSH_DELAY):
+        self.filename = filename
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._config = None
+        self._stamp = None
+        self._pending = {}
+        self._timer = None
+
+    def get(self):
+        with self._lock:
+            stamp = _file_stamp(self.filename)
+            if self._config is None or stamp != self._stamp:
+                self._reload()
+            return self._config
+
+    def invalidate(self):
+        """下次 get() 时重新读取配置文件"""
+        with self._lock:
+            self._stamp = None
+
+    def _reload(self):
+        loaded = _read_config_file(self.filename)
+        # 未写入的修改叠加在文件内容之上
+        _merge_config(loaded, self._pending, "更新配置时包含未知键: '{key}'，将忽略。")
+        if self._config is None:
+            self._config = loaded
+        else:
+            # 其他模块可能持有 config["ui"] 等子字典，嵌套字典也要原地更新
+            _replace_in_place(self._config, loaded)
+        self._stamp = _file_stamp(self.filename)
+
+    def update(self, updates):
+        """修改配置（内存中立即生效），返回是否有修改排队等待写入（不表示已写入磁盘）"""
+        with self._lock:
+            config = self.get()
+            _merge_config(config, updates, "更新配置时包含未知键: '{key}'，将忽略。")
+            # 只记录已知键，未知键不会写入文件
+            filtered = {}
+            _merge_known(filtered, updates, config)
+            if not filtered:
+                return False
+            _deep_update(self._pending, filtered)
+            self._schedule_flush()
+            return True
+
+    def _schedule_flush(self):
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self._flush_later)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_later(self):
+        with self._lock:
+            self._timer = None
+            if not self.flush():
+                logger.error(f"配置写入 {self.filename} 失败，{self.flush_delay} 秒后重试")
+                self._schedule_flush()
+
+    def flush(self):
+        """立即写入未保存的修改，返回是否成功"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return True
+            if _file_stamp(self.filename) != self._stamp:
+                # 文件已被外部修改（或尚未读取），以文件内容为基础
+                self._reload()
+            if not save_config(self._config, self.filename):
+                return False
+            self._pending = {}
+            self._stamp = _file_stamp(self.filename)
+            return True
+
+
+def _merge_known(target, source, reference):
+    """把 source 中 reference 里存在的键复制到 target"""
+    for key, value in source.items():
+        if key not in reference:
+            continue
+        if key not in FREE_FORM_KEYS and isinstance(reference[key], dict) and isinstance(value, dict):
+            nested = {}
+            _merge_known(nested, value, reference[key])
+            if nested:
+                target[key] = nested
+        else:
+            target[key] = value
+
+
+def _replace_in_place(target, source):
+    """用 source 的内容原地替换 target，两边都是字典的键递归替换，保留嵌套字典的对象身份"""
+    for key in [key for key in target if key not in source]:
+        del target[key]
+    for key, value in source.items():
+        if isinstance(target.get(key), dict) and isinstance(value, dict):
+            _replace_in_place(target[key], value)
+        else:
+            target[key] = value
+
+
+def _deep_update(target, source):
+    for key, value in source.items():
+        if isinstance(target.get(key), dict) and isinstance(value, dict):
+            _deep_update(target[key], value)
+        else:
+            target[key] = value
+
+
+_config_services = {}
+_config_services_lock = threading.Lock()
+
+
+def _flush_all_config_services():
+    for service in list(_config_services.values()):
+        service.flush()
+
+
+atexit.register(_flush_all_config_services)
+
+
+def get_config_service(filename=None):
+    """按配置文件路径返回共享的 ConfigService"""
+    filename = os.path.abspath(filename or CONFIG_FILE)
+    with _config_services_lock:
+        service = _config_services.get(filename)
+        if service is None:
+            service = _config_services[filename] = ConfigService(filename)
+        return service
+
+
+def load_config(filename=None):
+    """
+    返回配置（合并了默认配置，包含 session_data_file、log_file 等完整路径），不存在则创建默认配置。
+    同一进程中返回同一个字典，配置文件未变化时不读取磁盘（见 ConfigService）。
+    """
+    return get_config_service(filename).get()
+
 def save_config(config_data_to_save, filename=None):
-    """保存配置到 JSON 文件。"""
+    """以原子方式保存配置到 JSON 文件。"""
     if filename is None:
         filename = CONFIG_FILE
         
     try:
-        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
         save_data = config_data_to_save.copy()
         
         # 移除动态生成的路径
-        for key in ["session_data_file", "log_file", "sessions_dir", "backup_dir"]:
+        for key in DERIVED_KEYS:
             if key in save_data:
                 del save_data[key]
                 
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=4)
+        from session_manager.utils import atomic_write_json
+        atomic_write_json(filename, save_data, indent=4)
         logger.debug(f"配置已保存到 {filename}")
+        service = _config_services.get(os.path.abspath(filename))
+        if service is not None and config_data_to_save is not service._config:
+            # 整体保存了其他配置字典，共享配置下次使用时重新读取
+            service.invalidate()
         return True
     except Exception as e:
         logger.error(f"保存配置时发生错误 {filename}: {e}", exc_info=True)
         return False
 
 def update_config(updates, filename=None):
-    """更新并保存配置的特定部分"""
-    if filename is None:
-        filename = CONFIG_FILE
-        
-    config = load_config(filename)
-    
-    # 递归更新配置
-    def update_dict(target, source):
-        for key, value in source.items():
-            if key in target and isinstance(target[key], dict) and isinstance(value, dict):
-                update_dict(target[key], value)
-            elif key in target:
-                target[key] = value
-            else:
-                logger.warning(f"更新配置时包含未知键: '{key}'，将忽略。")
-    
-    update_dict(config, updates)
-    return save_config(config, filename)
+    """
+    更新配置的特定部分。修改立即在共享配置中生效，
+    短时间内的多次更新合并为一次原子写入（进程退出前尝试写入）。
+
+    返回 True 表示修改已排队等待写入，不表示已写入磁盘；需要确认写入结果时调用 flush_config()。
+    """
+    return get_config_service(filename).update(updates)
+
+def flush_config(filename=None):
+    """立即写入 update_config 尚未写入的修改"""
+    return get_config_service(filename).flush()
 
 def get_config_value(path, config=None):
     """
@@ -195,4 +413,4 @@ def get_config_value(path, config=None):
             result = result[key]
         return result
     except (KeyError, TypeError):
-        return None 
\ No newline at end of file
+        return None 
@@ -5,20 +5,29 @@ core.py
 
 import os
 import json
-import shutil
-import difflib
-import subprocess
 import time
 import logging
-import pygetwindow as gw
+import threading
+from collections import OrderedDict
 from session_manager.config import get_default_config
-from PIL import Image, ImageDraw, ImageGrab
-import win32gui
-import win32con
-import win32process
-import win32api
-import psutil
-from session_manager.browser_tabs import collect_all_browser_tabs
+from session_manager.background import TaskCancelled
+# 窗口枚举、浏览器标签页、启动器和预览图依赖的模块（pywin32、psutil、requests、PIL 等）
+# 在用到它们的函数中导入，只列出或管理会话时不加载
+from session_manager.storage import (
+    SessionFileStore,
+    SessionJournal,
+    SQLiteSessionStore,
+    SessionHistory,
+    normalize_session_data,
+    session_counts,
+    export_session_file,
+    read_session_file,
+    DEFAULT_JOURNAL_COMPACT_BYTES,
+    DEFAULT_SYNC_INTERVAL,
+    DEFAULT_MAX_SNAPSHOTS,
+    FORMAT_COMPACT
+)
+from session_manager.utils import lock_file
 
 # 禁用浏览器标签页支持
 BROWSER_TABS_SUPPORT = False
@@ -26,9 +35,42 @@ HYBRID_TABS_SUPPORT = False
 
 logger = logging.getLogger(__name__)
 
+# 旧代日志文件超过此数量时，启动后在后台写一次检查点
+MAX_JOURNAL_GENERATIONS = 8
+# 默认缓存的会话内容数量
+DEFAULT_SESSION_CACHE_SIZE = 16
+# 打开会话存储的进程持有此文件的独占锁（位于会话目录中）
+STORE_LOCK_FILE = ".lock"
+
 # --- 会话采集 ---
-def collect_session_data(config):
-    """收集当前会话数据"""
+def _window_rect(window):
+    """窗口位置 {"left", "top", "width", "height"}，最小化的窗口返回 None"""
+    try:
+        if window.isMinimized:
+            return None
+        return {"left": window.left, "top": window.top, "width": window.width, "height": window.height}
+    except Exception:
+        return None
+
+def collect_session_data(config, progress=None, cancel_event=None):
+    """
+    收集当前会话数据
+
+    参数:
+        progress: 可选回调 progress(说明, 已完成数, 总数)
+        cancel_event: 可选的 threading.Event，置位后在下一个检查点抛出 TaskCancelled
+    """
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            logger.info("会话数据收集已取消")
+            raise TaskCancelled("collect_session_data")
+
+    import pygetwindow as gw
+    import psutil
+    import win32process
+    from session_manager.browser_tabs import collect_all_browser_tabs
+    from session_manager.utils import get_process_exe
+
     logger.info("开始收集当前会话数据...")
     session_data = {"applications": [], "browser_windows": []}
     
@@ -53,6 +95,8 @@ def collect_session_data(config):
     special_app_instances = {}
     
     # 获取所有窗口
+    if progress:
+        progress("正在枚举窗口和进程...", None, None)
     all_windows = gw.getAllWindows()
     processed_windows = set()
     
@@ -68,12 +112,16 @@ def collect_session_data(config):
                     "path": proc_exe,
                     "found": False
                 }
-                logger.info(f"发现特殊应用进程: {proc_name} (PID: {proc.info['pid']}, 路径: {proc_exe})")
+                logger.info("发现特殊应用进程: %s (PID: %s, 路径: %s)", proc_name, proc.info['pid'], proc_exe)
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, Exception):
             continue
     
     # 遍历所有窗口
-    for window in all_windows:
+    check_cancelled()
+    for index, window in enumerate(all_windows):
+        if progress and index % 10 == 0:
+            check_cancelled()
+            progress("正在采集窗口...", index, len(all_windows))
         # 跳过无效窗口
         if not window.visible or not window.title or window.title.strip() == "":
             continue
@@ -81,8 +129,7 @@ def collect_session_data(config):
         # 尝试获取进程ID和路径
         try:
             _, pid = win32process.GetWindowThreadProcessId(window._hWnd)
-            proc = psutil.Process(pid)
-            process_path = proc.exe()
+            process_path = get_process_exe(pid)
             process_name = os.path.basename(process_path).lower()
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, Exception):
             continue
@@ -109,6 +156,9 @@ def collect_session_data(config):
                 "is_browser": True,
                 "browser_name": browser_name
             }
+            rect = _window_rect(window)
+            if rect:
+                app_data["rect"] = rect
             session_data["applications"].append(app_data)
             continue
         
@@ -124,8 +174,11 @@ def collect_session_data(config):
                 "special_app": True,
                 "app_name": special_apps[process_name]
             }
+            rect = _window_rect(window)
+            if rect:
+                app_data["rect"] = rect
             session_data["applications"].append(app_data)
-            logger.info(f"保存特殊应用窗口: {app_data['title']} (PID: {pid}, 路径: {process_path})")
+            logger.info("保存特殊应用窗口: %s (PID: %s, 路径: %s)", app_data['title'], pid, process_path)
             continue
         
         # 处理普通应用
@@ -134,6 +187,9 @@ def collect_session_data(config):
             "process_path": process_path,
             "pid": pid
         }
+        rect = _window_rect(window)
+        if rect:
+            app_data["rect"] = rect
         session_data["applications"].append(app_data)
     
     # 处理没有找到窗口的特殊应用（如后台运行的应用）
@@ -148,9 +204,12 @@ def collect_session_data(config):
                 "background": True
             }
             session_data["applications"].append(app_data)
-            logger.info(f"保存后台特殊应用: {app_data['title']} (PID: {info['pid']}, 路径: {info['path']})")
+            logger.info("保存后台特殊应用: %s (PID: %s, 路径: %s)", app_data['title'], info['pid'], info['path'])
     
     # 集成浏览器窗口及标签页采集
+    check_cancelled()
+    if progress:
+        progress("正在采集浏览器标签页...", len(all_windows), len(all_windows))
     try:
         browser_windows = collect_all_browser_tabs()
         session_data["browser_windows"] = browser_windows
@@ -162,8 +221,8 @@ def collect_session_data(config):
     return session_data
 
 # --- 会话数据文件管理 ---
-def load_all_sessions(config):
-    filename = config["session_data_file"]
+def _load_legacy_sessions_file(filename, backup):
+    """读取旧版单文件 sessions.json"""
     try:
         if os.path.exists(filename):
             with open(filename, 'r', encoding='utf-8') as f:
@@ -175,7 +234,7 @@ def load_all_sessions(config):
             return {}
     except Exception as e:
         logger.error(f"加载所有会话数据时发生错误: {e}", exc_info=True)
-        if config.get("backup_session_data", False):
+        if backup:
             backup_filename = f"{filename}.bak"
             if os.path.exists(backup_filename):
                 logger.warning(f"尝试从备份文件 {backup_filename} 加载所有会话数据...")
@@ -189,65 +248,92 @@ def load_all_sessions(config):
                     return {}
         return {}
 
+def load_all_sessions(config):
+    """从按会话分文件的存储加载所有会话；存储尚未建立时读取旧版 sessions.json"""
+    store = SessionFileStore(config["sessions_dir"])
+    if store.load_manifest():
+        all_sessions = store.load_all()
+        logger.info(f"已从 {config['sessions_dir']} 加载所有会话数据。共 {len(all_sessions)} 个会话。")
+        return all_sessions
+    return _load_legacy_sessions_file(config["session_data_file"], config.get("backup_session_data", False))
+
 def save_all_sessions(all_sessions_data, config):
-    filename = config["session_data_file"]
-    if config.get("backup_session_data", False) and os.path.exists(filename):
-        backup_filename = f"{filename}.bak"
-        try:
-            shutil.copyfile(filename, backup_filename)
-            logger.info(f"已备份现有会话数据文件到 {backup_filename}")
-        except Exception as e:
-            logger.warning(f"备份会话数据文件时发生警告: {e}", exc_info=True)
+    """保存所有会话，只重写内容发生变化的会话文件"""
+    store = SessionFileStore(config["sessions_dir"], backup=config.get("backup_session_data", False))
+    store.load_manifest()
     try:
-        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(all_sessions_data, f, ensure_ascii=False, indent=4)
-        logger.info(f"所有会话数据已成功保存到 {filename}")
+        written = store.save_all(all_sessions_data)
+        logger.info(f"所有会话数据已成功保存到 {config['sessions_dir']}，写入 {written} 个有变化的会话")
     except Exception as e:
         logger.error(f"保存所有会话数据时发生错误: {e}", exc_info=True)
 
 # --- 会话恢复 ---
-def restore_session(session_data, config):
-    """恢复保存的会话"""
+def _make_progress_callback(progress, total):
+    """把每个应用的启动结果转换为 progress(已完成数, 总数, 启动结果)"""
+    finished = []
+
+    def on_result(app_result):
+        finished.append(app_result)
+        progress(len(finished), total, app_result)
+    return on_result
+
+def restore_session(session_data, config, cancel_event=None, progress=None):
+    """
+    恢复保存的会话
+
+    参数:
+        cancel_event: 可选的 threading.Event，置位后不再启动新的应用，已取消的应用状态为 cancelled
+        progress: 可选回调 progress(已完成数, 总数, 启动结果)
+
+    返回:
+        恢复结果字典 {"success", "failed", "elapsed_ms", "apps"}，
+        其中 apps 为每个应用的启动状态与耗时明细
+    """
+    from session_manager.launcher import AppLauncher, make_restore_result, dedupe_applications
+    from session_manager.restore_scheduler import RestoreScheduler
+
     logger.info("开始恢复会话...")
-    success_count = 0
-    fail_count = 0
+    started_at = time.perf_counter()
     
     # 检查会话数据结构
     if not session_data:
         logger.warning("会话数据为空，无内容可恢复")
-        return 0, 0
+        return make_restore_result([], 0.0)
     
-    # 恢复所有应用程序
-    applications = session_data.get("applications", [])
-    for app_data in applications:
-        is_browser = app_data.get("is_browser", False)
-        
-        if is_browser:
-            # 将浏览器作为普通应用程序恢复
-            logger.info(f"恢复浏览器应用: {app_data.get('title', 'Unknown')}")
-            success = restore_application(app_data, config)
-        else:
-            # 恢复普通应用程序
-            logger.info(f"恢复应用程序: {app_data.get('title', 'Unknown')}")
-            success = restore_application(app_data, config)
-            
-        if success:
-            success_count += 1
-        else:
-            fail_count += 1
+    # 并发恢复所有应用程序（浏览器作为普通应用程序恢复）
+    applications = [app for app in session_data.get("applications", []) if isinstance(app, dict)]
+    launcher = AppLauncher(config)
+    scheduler_stats = None
+    on_result = _make_progress_callback(progress, len(dedupe_applications(applications)[0])) if progress else None
+
+    if config.get("restore_scheduler", {}).get("enabled", True):
+        # 根据系统资源压力动态调整并发启动数
+        scheduler = RestoreScheduler(config, launcher=launcher)
+        logger.info(f"共 {len(applications)} 个应用待恢复，初始并发数: {scheduler.concurrency}")
+        app_results, scheduler_stats = scheduler.run(applications, cancel_event=cancel_event, progress=on_result)
+    else:
+        logger.info(f"共 {len(applications)} 个应用待恢复，并发数: {launcher.max_workers}")
+        app_results = launcher.launch_all(applications, cancel_event=cancel_event, progress=on_result)
     
     # 跳过浏览器窗口恢复
     
-    logger.info(f"会话恢复完成。成功: {success_count}, 失败: {fail_count}")
-    return success_count, fail_count
+    result = make_restore_result(app_results, (time.perf_counter() - started_at) * 1000)
+    if scheduler_stats:
+        result["scheduler"] = scheduler_stats
+    logger.info(f"会话恢复完成。成功: {result['success']}, 失败: {result['failed']}, 耗时: {result['elapsed_ms']:.0f} ms")
+    return result
 
 def restore_browser(browser_data, config):
     """恢复浏览器窗口"""
     if not BROWSER_TABS_SUPPORT:
         logger.warning("浏览器标签页支持模块未加载，无法恢复浏览器窗口")
         return False
-        
+
+    import difflib
+    import pygetwindow as gw
+    import psutil
+    import win32process
+
     try:
         process_path = browser_data.get("process_path")
         window_title = browser_data.get("title", "")
@@ -322,233 +408,460 @@ def is_browser_window(process_path, window_title):
     return None
 
 def restore_application(app_data, config):
-    """恢复普通应用程序"""
-    app_title = app_data.get("title", "")
-    app_path = app_data.get("process_path", "")
-    app_pid = app_data.get("pid", 0)
-    is_special_app = app_data.get("special_app", False)
-    is_background = app_data.get("background", False)
-    app_name = app_data.get("app_name", "")
-    
-    if not app_path or not os.path.isfile(app_path):
-        logger.warning(f"应用路径无效: {app_path}")
-        return False
-    
-    # 检查应用是否已在运行
-    app_exists = False
-    
-    # 1. 首先尝试通过标题匹配
-    windows = gw.getAllWindows()
-    for window in windows:
-        if not window.title:
-            continue
-        
-        # 使用相似度比较窗口标题
-        similarity = difflib.SequenceMatcher(None, window.title.lower(), app_title.lower()).ratio()
-        if similarity >= 0.7:  # 70%相似度阈值
-            logger.info(f"应用已在运行: '{window.title}' (相似度: {similarity:.2f})")
-            app_exists = True
-            break
-    
-    # 2. 如果标题匹配未找到，尝试通过进程路径匹配
-    if not app_exists:
-        for proc in psutil.process_iter(['pid', 'exe']):
-            try:
-                if proc.info['exe'] and proc.info['exe'] == app_path:
-                    if is_special_app:
-                        logger.info(f"特殊应用进程已在运行: {app_path}")
-                    else:
-                        logger.info(f"应用进程已在运行: {app_path}")
-                    app_exists = True
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
-    
-    # 3. 对于特殊应用，检查进程名
-    if not app_exists and is_special_app:
-        app_basename = os.path.basename(app_path).lower()
-        for proc in psutil.process_iter(['pid', 'name']):
-            try:
-                proc_name = proc.info['name'].lower() if 'name' in proc.info else ""
-                if proc_name == app_basename:
-                    logger.info(f"特殊应用进程已在运行: {proc_name}")
-                    app_exists = True
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
-    
-    # 如果应用已存在，则跳过恢复
-    if app_exists:
-        if is_special_app:
-            logger.info(f"跳过恢复已存在的特殊应用: {app_title}")
-        else:
-            logger.info(f"跳过恢复已存在的应用程序: {app_title}")
-        return True
-    
-    # 应用未运行，尝试启动
-    try:
-        if is_special_app:
-            logger.info(f"特殊应用不存在，开始启动: {app_path}")
-        else:
-            logger.info(f"应用程序不存在，开始启动: {app_path}")
-            
-        subprocess.Popen([app_path])
-        # 等待短暂时间，给应用启动留出时间
-        time.sleep(1)
-        return True
-    except Exception as e:
-        logger.error(f"启动应用失败: {e}")
-        return False
+    """恢复普通应用程序，等待其窗口出现后返回是否成功"""
+    from session_manager.launcher import AppLauncher
+    return AppLauncher(config, max_workers=1).launch(app_data)["success"]
 
 # --- SessionManager 类 ---
+class SessionStoreBusy(Exception):
+    """会话存储已被其他进程打开"""
+
+
 class SessionManager:
-    def __init__(self, session_file, backup=True, default_session_name="默认会话"):
+    """
+    会话管理器。
+
+    启动时只读取清单中的会话索引（名称、应用数、标签页数、保存时间、大小、校验和），
+    会话内容在第一次 get_session 时才从文件读取，并保存在容量有限的 LRU 缓存中。
+
+    每次修改（设置、删除、重命名、清空）先追加到变更日志，再应用到内存；
+    未写入检查点的会话内容常驻内存，日志超过 journal_compact_bytes 后由后台线程
+    写入检查点（按会话分文件存储 + 清单），并删除已被检查点覆盖的旧日志。
+    加载时在检查点之上重放日志。
+
+    会话存储同一时间只应由一个进程打开：打开时获取会话目录中 .lock 文件的独占锁，
+    锁已被其他进程持有时 exclusive 为 False（exclusive=True 创建时抛出 SessionStoreBusy）。
+    后台服务运行时，界面和命令行通过 service.RemoteSessionManager 使用服务中的会话管理器。
+    """
+
+    def __init__(self, session_file, backup=True, default_session_name="默认会话", sessions_dir=None,
+                 journal_compact_bytes=DEFAULT_JOURNAL_COMPACT_BYTES, journal_sync_interval=DEFAULT_SYNC_INTERVAL,
+                 session_format=FORMAT_COMPACT, cache_size=DEFAULT_SESSION_CACHE_SIZE, history=None,
+                 exclusive=False):
         self.session_file = session_file
         self.backup = backup
         self.default_session_name = default_session_name
-        self.sessions = self.load_sessions()
+        if sessions_dir is None:
+            sessions_dir = os.path.join(os.path.dirname(session_file) or '.', "sessions")
+        self.sessions_dir = sessions_dir
+        self._store_lock = lock_file(os.path.join(sessions_dir, STORE_LOCK_FILE))
+        self.exclusive = self._store_lock is not None
+        if not self.exclusive:
+            if exclusive:
+                raise SessionStoreBusy(f"会话存储 {sessions_dir} 正被其他进程使用")
+            logger.warning(f"会话存储 {sessions_dir} 正被其他进程使用，两个进程的修改可能互相覆盖")
+        self.store = SessionFileStore(sessions_dir, backup=backup, session_format=session_format)
+        self.journal = SessionJournal(sessions_dir, sync_interval=journal_sync_interval)
+        self.journal_compact_bytes = journal_compact_bytes
+        self.cache_size = max(1, cache_size)
+        self.history = history
+        self._lock = threading.RLock()
+        self._checkpoint_lock = threading.Lock()
+        # 会话索引: {会话名: {"apps", "tabs", "saved_at", "size", "checksum"}}，顺序即会话列表顺序
+        self._index = {}
+        # 已加载且与文件一致的会话内容（LRU）
+        self._cache = OrderedDict()
+        # 尚未写入检查点的会话内容，以及按顺序记录的删除/重命名操作
+        self._pending = {}
+        self._structural_ops = []
+        # 已重命名但尚未写入检查点的会话: {新名称: 清单中的名称}
+        self._renamed = {}
+        self._migrated = False
+        self._index_stale = False
+        self.load_sessions()
+        self.journal.open()
 
-    def load_sessions(self):
-        """加载会话数据，确保格式正确"""
-        if not os.path.exists(self.session_file):
-            logger.info(f"会话文件不存在，创建默认会话: {self.default_session_name}")
-            return {self.default_session_name: {"applications": []}}
-        
+        self._closed = False
+        self._compact_event = threading.Event()
+        self._compactor = threading.Thread(target=self._compact_loop, name="session-compactor", daemon=True)
+        self._compactor.start()
+        if self._migrated:
+            self.checkpoint()
+        elif self._index_stale or len(self.journal.generations()) > MAX_JOURNAL_GENERATIONS:
+            self._compact_event.set()
+
+    def _retire_legacy_file(self):
+        """迁移后的第一次检查点成功后，将旧版会话文件改名，以后不会再次迁移"""
+        retired = f"{self.session_file}.migrated"
         try:
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # 修复会话数据格式
-            fixed_data = {}
+            os.replace(self.session_file, retired)
+            logger.info(f"旧版会话文件已改名为 {retired}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"旧版会话文件改名失败: {e}")
+            return
+        self._migrated = False
+
+    def load_sessions(self):
+        """加载会话索引并重放变更日志，不读取会话内容"""
+        checkpoint_seq = 0
+        if self.store.load_manifest():
+            checkpoint_seq = self.store.manifest_extra.get("journal_seq", 0)
+            for name, entry in self.store.entries.items():
+                if "apps" not in entry:
+                    # 旧版清单没有应用数和标签页数，读取一次内容补齐；读取失败时仍保留会话，数量未知
+                    data = normalize_session_data(self.store.read_session(name))
+                    if data is not None:
+                        entry["apps"], entry["tabs"] = session_counts(data)
+                        self._index_stale = True
+                self._index[name] = self._info_from_entry(entry)
+        elif self.store.session_files():
+            # 清单缺失或损坏，但会话文件还在：根据会话文件重建索引，不能再从旧版文件迁移覆盖
+            recovered = self.store.recover_entries()
+            logger.warning(f"会话清单缺失或损坏，已根据会话文件恢复 {recovered} 个会话")
+            for name, entry in self.store.entries.items():
+                self._index[name] = self._info_from_entry(entry)
+            self._index_stale = True
+        elif os.path.exists(self.session_file):
+            # 旧版单文件存储，且还没有按会话分文件的存储：迁移
+            try:
+                with open(self.session_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                logger.info(f"将会话文件 {self.session_file} 迁移到 {self.sessions_dir}")
+                self._migrated = True
+            except Exception as e:
+                logger.error(f"加载会话数据失败: {e}")
+                data = {}
             for session_name, session_value in data.items():
-                # 检查会话数据格式
-                if isinstance(session_value, list):
-                    # 旧格式：直接是应用列表
-                    logger.info(f"转换旧格式会话数据: {session_name}")
-                    fixed_data[session_name] = {"applications": session_value}
-                elif isinstance(session_value, dict) and "applications" in session_value:
-                    # 新格式：包含applications键
-                    fixed_data[session_name] = session_value
-                else:
+                fixed = normalize_session_data(session_value)
+                if fixed is None:
                     logger.warning(f"会话 '{session_name}' 的数据格式无效，已跳过")
-            
-            # 如果没有有效会话，创建默认会话
-            if not fixed_data:
-                logger.warning("没有找到有效会话，创建默认会话")
-                fixed_data[self.default_session_name] = {"applications": []}
-            
-            return fixed_data
+                    continue
+                self._put_pending(session_name, fixed)
+        
+        # 在检查点之上重放变更日志
+        replayed = 0
+        for record in self.journal.replay(checkpoint_seq):
+            self._apply(record)
+            replayed += 1
+        if replayed:
+            logger.info(f"已重放 {replayed} 条会话变更记录")
+        
+        # 如果没有有效会话，创建默认会话
+        if not self._index:
+            logger.info(f"没有找到有效会话，创建默认会话: {self.default_session_name}")
+            self._put_pending(self.default_session_name, {"applications": []})
+        
+        return self.get_session_names()
+
+    @staticmethod
+    def _info_from_entry(entry):
+        return {key: entry.get(key) for key in ("apps", "tabs", "saved_at", "size", "checksum")}
+
+    def _put_pending(self, name, data):
+        apps, tabs = session_counts(data)
+        self._pending[name] = data
+        self._cache.pop(name, None)
+        self._index[name] = {"apps": apps, "tabs": tabs, "saved_at": time.time(), "size": None, "checksum": None}
+
+    def _cache_put(self, name, data):
+        self._cache[name] = data
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load_body(self, name):
+        """返回会话内容：优先未写入的修改，其次缓存，最后从文件读取"""
+        data = self._pending.get(name)
+        if data is not None:
+            return data
+        data = self._cache.get(name)
+        if data is not None:
+            self._cache.move_to_end(name)
+            return data
+        data = normalize_session_data(self.store.read_session(self._renamed.get(name, name)))
+        if data is None:
+            logger.warning(f"会话 '{name}' 的数据格式无效，返回空会话")
+            return {"applications": []}
+        self._cache_put(name, data)
+        return data
+
+    def _apply(self, record):
+        """将一条变更记录应用到内存中的会话索引和内容"""
+        op = record.get("op")
+        name = record.get("name")
+        if op == "set":
+            self._put_pending(name, record["data"])
+        elif op == "clear":
+            if name in self._index:
+                self._put_pending(name, {"applications": []})
+        elif op == "delete":
+            if self._index.pop(name, None) is not None:
+                self._pending.pop(name, None)
+                self._cache.pop(name, None)
+                self._renamed.pop(name, None)
+                self._structural_ops.append(("remove", name))
+        elif op == "rename":
+            new_name = record["new_name"]
+            if name in self._index and new_name not in self._index:
+                # 只重命名索引，不读取会话内容；写入检查点前按清单中的原名称读取文件，
+                # 检查点在清单中重命名，不重写会话文件
+                self._index = {
+                    (new_name if n == name else n): info
+                    for n, info in self._index.items()
+                }
+                if name in self._pending:
+                    self._pending[new_name] = self._pending.pop(name)
+                if name in self._cache:
+                    self._cache_put(new_name, self._cache.pop(name))
+                self._renamed[new_name] = self._renamed.pop(name, name)
+                self._structural_ops.append(("rename", name, new_name))
+        else:
+            logger.warning(f"未知的会话变更记录: {op}")
+
+    def _commit(self, record):
+        """追加变更记录到日志并应用到内存"""
+        try:
+            with self._lock:
+                self.journal.append(record)
+                self._apply(record)
         except Exception as e:
-            logger.error(f"加载会话数据失败: {e}")
-            return {self.default_session_name: {"applications": []}}
+            logger.error(f"记录会话变更失败: {e}")
+            return False
+        if self.journal.size() >= self.journal_compact_bytes:
+            self._compact_event.set()
+        return True
 
-    def save_sessions(self):
-        """保存会话数据"""
-        # 创建备份
-        if self.backup and os.path.exists(self.session_file):
-            backup_file = f"{self.session_file}.bak"
+    def checkpoint(self):
+        """将自上次检查点以来的变更写入会话文件和清单，然后删除已被覆盖的旧日志"""
+        with self._checkpoint_lock:
+            with self._lock:
+                checkpoint_seq, old_journals = self.journal.rotate()
+                pending = dict(self._pending)
+                ops = self._structural_ops
+                order = list(self._index.keys())
+                self._structural_ops = []
             try:
-                shutil.copyfile(self.session_file, backup_file)
-                logger.info(f"已创建会话数据备份: {backup_file}")
+                with self._lock:
+                    touched = set()
+                    for op in ops:
+                        if op[0] == "remove":
+                            self.store.remove_session(op[1])
+                            touched.add(op[1])
+                        else:
+                            _, old_name, new_name = op
+                            self.store.rename_session(old_name, new_name)
+                            touched.update((old_name, new_name))
+                    for name in touched.difference(order):
+                        self.store.remove_session(name)
+                    # 清单中的名称已改变；之后的重命名不在 ops 中，映射到清单中的新名称
+                    for op in ops:
+                        if op[0] == "rename":
+                            for name, stored in list(self._renamed.items()):
+                                if stored == op[1]:
+                                    self._renamed[name] = op[2]
+                    self._renamed = {name: stored for name, stored in self._renamed.items() if name != stored}
+                
+                written = 0
+                for name, data in pending.items():
+                    if self.store.write_session(name, data):
+                        written += 1
+                self.store.reorder(order)
+                self.store.write_manifest(journal_seq=checkpoint_seq)
             except Exception as e:
-                logger.warning(f"创建会话数据备份失败: {e}")
-        
-        # 确保会话数据格式正确
-        fixed_sessions = {}
-        for name, data in self.sessions.items():
-            if isinstance(data, dict) and "applications" in data:
-                fixed_sessions[name] = data
-            elif isinstance(data, list):
-                # 转换旧格式
-                fixed_sessions[name] = {"applications": data}
-            else:
-                logger.warning(f"跳过保存格式无效的会话: {name}")
-        
-        # 保存会话数据
+                logger.error(f"写入会话检查点失败: {e}", exc_info=True)
+                with self._lock:
+                    # 保留旧日志和未写入的内容，下次检查点重试
+                    self._structural_ops = ops + self._structural_ops
+                return False
+            with self._lock:
+                # 已写入且之后没有再修改的会话转入 LRU 缓存
+                for name, data in pending.items():
+                    if self._pending.get(name) is data:
+                        del self._pending[name]
+                        self._index[name] = self._info_from_entry(self.store.entries[name])
+                        self._cache_put(name, data)
+                self._index_stale = False
+            self.journal.discard(old_journals)
+            if self._migrated:
+                self._retire_legacy_file()
+            if self.history is not None and self.history.needs_gc:
+                self.history.prune()
+            logger.info(f"会话检查点已写入 {self.sessions_dir}（写入 {written} 个会话文件）")
+            return True
+
+    def _compact_loop(self):
+        while True:
+            self._compact_event.wait()
+            self._compact_event.clear()
+            if self._closed:
+                return
+            self.checkpoint()
+
+    def save_sessions(self):
+        """将变更日志立即落盘"""
         try:
-            os.makedirs(os.path.dirname(self.session_file) or '.', exist_ok=True)
-            with open(self.session_file, 'w', encoding='utf-8') as f:
-                json.dump(fixed_sessions, f, ensure_ascii=False, indent=4)
-            logger.info(f"会话数据已保存到: {self.session_file}")
+            self.journal.sync()
             return True
         except Exception as e:
             logger.error(f"保存会话数据失败: {e}")
             return False
 
+    def close(self):
+        """写入检查点、等待快照历史写完并关闭变更日志"""
+        if self._closed:
+            return
+        self.checkpoint()
+        if self.history is not None:
+            self.history.flush()
+        self._closed = True
+        self._compact_event.set()
+        self.journal.close()
+        if self._store_lock is not None:
+            self._store_lock.close()
+            self._store_lock = None
+
     def get_session_names(self):
-        return list(self.sessions.keys())
+        with self._lock:
+            return list(self._index.keys())
+
+    def get_session_info(self, name):
+        """返回会话索引信息 {"apps", "tabs", "saved_at", "size", "checksum"}，不读取会话内容"""
+        with self._lock:
+            info = self._index.get(name)
+            return dict(info) if info is not None else None
 
     def get_session(self, name):
-        """获取会话数据，确保返回正确格式"""
-        if name not in self.sessions:
-            return {"applications": []}
-        
-        session_data = self.sessions[name]
-        if isinstance(session_data, dict) and "applications" in session_data:
-            return session_data
-        elif isinstance(session_data, list):
-            # 转换旧格式
-            return {"applications": session_data}
-        else:
-            logger.warning(f"会话 '{name}' 的数据格式无效，返回空会话")
-            return {"applications": []}
+        """获取会话数据，首次访问时才从文件读取"""
+        with self._lock:
+            if name not in self._index:
+                return {"applications": []}
+            return self._load_body(name)
+
+    def iter_sessions(self):
+        """按顺序产出 (会话名, 会话数据)，逐个读取，不占用缓存"""
+        for name in self.get_session_names():
+            with self._lock:
+                data = self._pending.get(name) or self._cache.get(name)
+                if data is None and name in self._index:
+                    data = normalize_session_data(self.store.read_session(self._renamed.get(name, name)))
+            if data is not None:
+                yield name, data
 
     def set_session(self, name, items):
         """设置会话数据，确保格式正确"""
-        if isinstance(items, dict) and "applications" in items:
-            self.sessions[name] = items
-        elif isinstance(items, list):
-            # 转换为新格式
-            self.sessions[name] = {"applications": items}
-        else:
+        fixed = normalize_session_data(items)
+        if fixed is None:
             logger.warning(f"尝试设置无效格式的会话数据: {name}")
-            self.sessions[name] = {"applications": []}
-        
-        return self.save_sessions()
+            fixed = {"applications": []}
+        if not self._commit({"op": "set", "name": name, "data": fixed}):
+            return False
+        if self.history is not None:
+            # 快照在后台写入，保存只需追加一条日志
+            self.history.record_later(name, fixed)
+        return True
 
     def delete_session(self, name):
-        if name in self.sessions:
-            del self.sessions[name]
-            return self.save_sessions()
+        if name in self._index:
+            if not self._commit({"op": "delete", "name": name}):
+                return False
+            if self.history is not None:
+                self.history.remove(name)
+            return True
         return False
 
     def clear_session(self, name):
-        if name in self.sessions:
-            self.sessions[name] = {"applications": []}
-            return self.save_sessions()
+        if name in self._index:
+            return self._commit({"op": "clear", "name": name})
         return False
 
+    def rename_session(self, old_name, new_name):
+        """重命名会话：只记录一条重命名变更，不重写会话内容"""
+        if old_name not in self._index or new_name in self._index:
+            return False
+        if not self._commit({"op": "rename", "name": old_name, "new_name": new_name}):
+            return False
+        if self.history is not None:
+            self.history.rename(old_name, new_name)
+        return True
+
+    def get_session_history(self, name):
+        """返回会话的快照列表 [{"id", "saved_at", "apps", "tabs"}]，未启用历史时返回空列表"""
+        if self.history is None:
+            return []
+        return self.history.list_snapshots(name)
+
+    def get_session_snapshot(self, name, snapshot_id=None, as_of=None):
+        """返回会话在指定快照（或指定时间点）时的数据，找不到时返回 None"""
+        if self.history is None:
+            return None
+        return self.history.get_snapshot(name, snapshot_id=snapshot_id, as_of=as_of)
+
+    def revert_session(self, name, snapshot_id):
+        """将会话内容恢复为指定快照"""
+        session_data = self.get_session_snapshot(name, snapshot_id)
+        if session_data is None:
+            return False
+        return self.set_session(name, session_data)
+
     def export_session(self, name, export_path):
-        if name in self.sessions:
-            try:
-                with open(export_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.sessions[name], f, ensure_ascii=False, indent=4)
-                return True
-            except Exception as e:
-                logging.error(f"导出会话失败: {e}")
-        return False
+        if name not in self._index:
+            return False
+        return export_session_file(self.get_session(name), export_path)
 
     def import_session(self, import_path, new_name):
-        try:
-            with open(import_path, 'r', encoding='utf-8') as f:
-                items = json.load(f)
-            # 校验导入内容必须为列表，且元素为 dict
-            if not isinstance(items, list):
-                logging.error(f"导入会话失败：文件内容不是列表。")
-                return False
-            filtered = [item for item in items if isinstance(item, dict)]
-            if len(filtered) < len(items):
-                logging.warning(f"导入会话 '{new_name}' 时发现非法项，已自动跳过。")
-            self.sessions[new_name] = filtered
-            return self.save_sessions()
-        except Exception as e:
-            logging.error(f"导入会话失败: {e}")
-            return False 
+        session_data = read_session_file(import_path, new_name)
+        return session_data is not None and self.set_session(new_name, session_data)
+
+def create_session_history(config):
+    """根据 advanced.keep_session_history 创建会话快照历史，未启用时返回 None"""
+    advanced = config.get("advanced", {})
+    if not advanced.get("keep_session_history", True):
+        return None
+    backup_dir = config.get("backup_dir") or os.path.join(os.path.dirname(config["session_data_file"]), "backups")
+    return SessionHistory(os.path.join(backup_dir, "history"),
+                          max_snapshots=advanced.get("max_session_history", DEFAULT_MAX_SNAPSHOTS))
+
+def create_session_manager(config, exclusive=False):
+    """
+    根据配置创建会话管理器（storage.backend: files 或 sqlite）。
+
+    exclusive 为 True 时，文件存储已被其他进程打开则抛出 SessionStoreBusy（SQLite 自身处理并发访问）。
+    """
+    storage = config.get("storage", {})
+    history = create_session_history(config)
+    if storage.get("backend", "files") == "sqlite":
+        db_file = os.path.join(os.path.dirname(config["session_data_file"]),
+                               storage.get("sqlite_file_name", "sessions.db"))
+        manager = SQLiteSessionStore(db_file, history=history)
+        if manager.is_empty():
+            _import_file_sessions(manager, config)
+            manager.ensure_default_session()
+        return manager
+    return SessionManager(
+        config["session_data_file"],
+        backup=config.get("backup_session_data", True),
+        sessions_dir=config.get("sessions_dir"),
+        journal_compact_bytes=storage.get("journal_compact_bytes", DEFAULT_JOURNAL_COMPACT_BYTES),
+        journal_sync_interval=storage.get("journal_sync_interval", DEFAULT_SYNC_INTERVAL),
+        session_format=storage.get("session_format", FORMAT_COMPACT),
+        cache_size=storage.get("session_cache_size", DEFAULT_SESSION_CACHE_SIZE),
+        history=history,
+        exclusive=exclusive
+    )
+
+def _import_file_sessions(manager, config):
+    """首次使用 SQLite 后端时导入文件存储（或旧版 sessions.json）中的会话"""
+    sessions_dir = config.get("sessions_dir")
+    has_file_store = sessions_dir and SessionFileStore(sessions_dir).exists()
+    if not has_file_store and not os.path.exists(config["session_data_file"]):
+        return
+    file_manager = SessionManager(
+        config["session_data_file"],
+        backup=config.get("backup_session_data", True),
+        sessions_dir=sessions_dir
+    )
+    try:
+        manager.import_sessions(dict(file_manager.iter_sessions()))
+    finally:
+        file_manager.close()
 
 # 添加以下函数来支持窗口预览功能
 def create_session_preview(session_data, config, preview_size=(800, 600)):
     """
-    创建会话窗口布局的预览图像
+    创建会话窗口布局的预览图像。
+    结果按会话布局、显示器布局和尺寸缓存，两者都没有变化时不重新绘制（见 preview.PreviewCache）。
     
     参数:
         session_data: 会话数据字典
@@ -556,132 +869,32 @@ def create_session_preview(session_data, config, preview_size=(800, 600)):
         preview_size: 预览图像的大小 (宽, 高)
         
     返回:
-        PIL.Image 对象
+        PIL.Image 对象，会话中没有窗口位置信息时返回 None
     """
+    from session_manager.preview import get_preview_cache
+
     try:
-        if not session_data or "windows" not in session_data:
-            return None
-            
-        # 获取屏幕尺寸信息
-        monitor_info = []
-        def callback(monitor, dc, rect, data):
-            monitor_info.append({
-                'left': rect[0],
-                'top': rect[1],
-                'width': rect[2] - rect[0],
-                'height': rect[3] - rect[1]
-            })
-            return True
-            
-        win32api.EnumDisplayMonitors(None, None, callback, None)
-        
-        if not monitor_info:
-            return None
-            
-        # 计算所有显示器的总边界
-        min_x = min(m['left'] for m in monitor_info)
-        min_y = min(m['top'] for m in monitor_info)
-        max_x = max(m['left'] + m['width'] for m in monitor_info)
-        max_y = max(m['top'] + m['height'] for m in monitor_info)
-        
-        total_width = max_x - min_x
-        total_height = max_y - min_y
-        
-        # 创建预览图像
-        scale_factor = min(preview_size[0] / total_width, preview_size[1] / total_height)
-        preview_width = int(total_width * scale_factor)
-        preview_height = int(total_height * scale_factor)
-        
-        preview = Image.new('RGB', (preview_width, preview_height), color=(240, 240, 240))
-        draw = ImageDraw.Draw(preview)
-        
-        # 绘制显示器边框
-        for m in monitor_info:
-            x1 = int((m['left'] - min_x) * scale_factor)
-            y1 = int((m['top'] - min_y) * scale_factor)
-            x2 = int(x1 + m['width'] * scale_factor)
-            y2 = int(y1 + m['height'] * scale_factor)
-            
-            # 绘制显示器外框
-            draw.rectangle([x1, y1, x2, y2], outline=(0, 0, 0), width=2)
-            
-            # 绘制显示器内部
-            draw.rectangle([x1+2, y1+2, x2-2, y2-2], fill=(255, 255, 255))
-        
-        # 绘制窗口
-        colors = [
-            (52, 152, 219),  # 蓝色
-            (46, 204, 113),  # 绿色
-            (155, 89, 182),  # 紫色
-            (230, 126, 34),  # 橙色
-            (231, 76, 60),   # 红色
-            (241, 196, 15)   # 黄色
-        ]
-        
-        for i, window in enumerate(session_data["windows"]):
-            if "rect" in window:
-                rect = window["rect"]
-                
-                # 计算窗口在预览中的位置
-                x1 = int((rect["left"] - min_x) * scale_factor)
-                y1 = int((rect["top"] - min_y) * scale_factor)
-                x2 = int(x1 + rect["width"] * scale_factor)
-                y2 = int(y1 + rect["height"] * scale_factor)
-                
-                # 确保窗口在预览区域内
-                x1 = max(0, min(x1, preview_width-1))
-                y1 = max(0, min(y1, preview_height-1))
-                x2 = max(0, min(x2, preview_width-1))
-                y2 = max(0, min(y2, preview_height-1))
-                
-                # 如果窗口太小，至少确保它是可见的
-                if x2 - x1 < 5:
-                    x2 = x1 + 5
-                if y2 - y1 < 5:
-                    y2 = y1 + 5
-                
-                # 绘制窗口
-                color = colors[i % len(colors)]
-                draw.rectangle([x1, y1, x2, y2], fill=color, outline=(0, 0, 0), width=1)
-                
-                # 如果窗口足够大，添加标题文本
-                if y2 - y1 > 20 and x2 - x1 > 50:
-                    title = window.get("title", "")
-                    if len(title) > 20:
-                        title = title[:17] + "..."
-                    draw.text((x1+5, y1+5), title, fill=(255, 255, 255))
-        
-        return preview
+        return get_preview_cache(config).get(session_data, tuple(preview_size))
     except Exception as e:
         logging.error(f"创建会话预览失败: {e}", exc_info=True)
         return None
 
 def capture_window_thumbnail(hwnd, size=(200, 150)):
     """
-    捕获指定窗口的缩略图
+    捕获指定窗口的缩略图（用 PrintWindow 截取窗口自身的内容，见 thumbnails.capture_window_image）。
     
     参数:
         hwnd: 窗口句柄
-        size: 缩略图大小
+        size: 缩略图最大尺寸（按比例缩小）
         
     返回:
         PIL.Image 对象或 None（如果捕获失败）
     """
+    from session_manager.thumbnails import capture_window_image, make_thumbnail
+
     try:
-        # 获取窗口位置
-        left, top, right, bottom = win32gui.GetWindowRect(hwnd)
-        width = right - left
-        height = bottom - top
-        
-        if width <= 0 or height <= 0:
-            return None
-            
-        # 截取窗口图像
-        screenshot = ImageGrab.grab((left, top, right, bottom))
-        
-        # 调整大小
-        thumbnail = screenshot.resize(size, Image.LANCZOS)
-        return thumbnail
+        image = capture_window_image(hwnd)
+        return make_thumbnail(image, size) if image is not None else None
     except Exception as e:
         logging.error(f"捕获窗口缩略图失败 (hwnd={hwnd}): {e}", exc_info=True)
-        return None 
\ No newline at end of file
+        return None
@@ -0,0 +1,288 @@
+"""
+diagnostics.py
+窗口与进程诊断信息（“调试”菜单）。
+
+一次 EnumWindows 遍历采集所有顶层窗口（可选子窗口），按进程ID分组，每个进程只查询一次
+进程信息。报告函数不访问 Tk，返回完整文本，由界面在后台线程中生成后一次性显示。
+"""
+
+import logging
+
+import psutil
+import win32con
+import win32gui
+import win32process
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "未知"
+SEPARATOR = "=" * 50
+# “查找特殊应用窗口”匹配的进程名、类名或标题关键字
+SPECIAL_APP_KEYWORDS = ("PixPin", "FastOrange")
+
+# 判断窗口是否值得关注时忽略的类名和进程名
+IGNORED_CLASSES = {
+    'Shell_TrayWnd',  # 任务栏
+    'DV2ControlHost',  # 系统控件
+    'Windows.UI.Core.CoreWindow',  # UWP核心窗口
+    # 保留ApplicationFrameWindow，因为一些UWP应用使用这个类名
+}
+IGNORED_PROCESSES = {
+    'SearchApp.exe',
+    'TextInputHost.exe',
+    # 只有在标题为空时才忽略explorer.exe
+}
+
+
+def _process_info(pid, cache):
+    info = cache.get(pid)
+    if info is None:
+        try:
+            proc = psutil.Process(pid)
+            info = {'pid': pid, 'exe': proc.exe(), 'name': proc.name()}
+        except Exception:
+            info = {'pid': None, 'exe': UNKNOWN, 'name': UNKNOWN}
+        cache[pid] = info
+    return info
+
+
+def get_window_info(hwnd, process_cache=None, depth=0):
+    """
+    获取窗口详细信息。
+
+    参数:
+        process_cache: 进程ID -> 进程信息的字典，同一进程的多个窗口只查询一次
+        depth: 子窗口的层级，顶层窗口为 0
+    """
+    info = {
+        'hwnd': hwnd,
+        'title': win32gui.GetWindowText(hwnd),
+        'class_name': win32gui.GetClassName(hwnd),
+        'visible': win32gui.IsWindowVisible(hwnd),
+        'style': win32gui.GetWindowLong(hwnd, win32con.GWL_STYLE),
+        'rect': win32gui.GetWindowRect(hwnd),
+        'depth': depth
+    }
+    try:
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+    except Exception:
+        pid = None
+    if pid is None:
+        info.update({'pid': None, 'exe': UNKNOWN, 'name': UNKNOWN})
+    else:
+        info.update(_process_info(pid, {} if process_cache is None else process_cache))
+    return info
+
+
+def snapshot_windows(include_children=False):
+    """
+    一次遍历采集所有顶层窗口。
+
+    返回:
+        {进程ID: [窗口信息]}，按枚举顺序；include_children 时每个顶层窗口后紧跟它的所有子窗口
+    """
+    process_cache = {}
+    groups = {}
+
+    def on_window(hwnd, _):
+        try:
+            info = get_window_info(hwnd, process_cache)
+        except Exception:
+            # 窗口在枚举过程中被关闭
+            return True
+        windows = groups.setdefault(info['pid'], [])
+        windows.append(info)
+        if include_children:
+            # EnumChildWindows 已经包含所有后代窗口，按父窗口推算层级，不再递归
+            depths = {hwnd: 0}
+
+            def on_child(child, _):
+                try:
+                    depth = depths.get(win32gui.GetParent(child), 0) + 1
+                    depths[child] = depth
+                    windows.append(get_window_info(child, process_cache, depth))
+                except Exception:
+                    pass
+                return True
+
+            try:
+                win32gui.EnumChildWindows(hwnd, on_child, None)
+            except Exception:
+                pass
+        return True
+
+    win32gui.EnumWindows(on_window, None)
+    return groups
+
+
+def format_window_info(info, depth=None):
+    """格式化窗口信息输出"""
+    indent = "  " * (info.get('depth', 0) if depth is None else depth)
+    style_flags = []
+    if info['style'] & win32con.WS_VISIBLE:
+        style_flags.append("可见")
+    if info['style'] & win32con.WS_CHILD:
+        style_flags.append("子窗口")
+    if info['style'] & win32con.WS_POPUP:
+        style_flags.append("弹出窗口")
+
+    rect = info['rect']
+    size = f"{rect[2]-rect[0]}x{rect[3]-rect[1]}"
+
+    return (
+        f"{indent}窗口信息:\n"
+        f"{indent}  HWND: {info['hwnd']}\n"
+        f"{indent}  标题: {info['title'] or '(无标题)'}\n"
+        f"{indent}  类名: {info['class_name']}\n"
+        f"{indent}  PID: {info['pid']}\n"
+        f"{indent}  进程: {info['name']}\n"
+        f"{indent}  路径: {info['exe']}\n"
+        f"{indent}  位置: ({rect[0]},{rect[1]}) 大小: {size}\n"
+        f"{indent}  样式: {', '.join(style_flags)}\n"
+    )
+
+
+def is_interesting_window(info):
+    """判断窗口是否值得关注"""
+    # 忽略不可见窗口
+    if not (info['style'] & win32con.WS_VISIBLE):
+        return False
+
+    # 特殊处理：即使是子窗口，如果有标题且尺寸合理，也可能是值得关注的窗口
+    is_child = info['style'] & win32con.WS_CHILD
+    rect = info['rect']
+    has_reasonable_size = rect[2] - rect[0] > 100 and rect[3] - rect[1] > 100
+
+    # 如果是子窗口但有标题且尺寸合理，仍然考虑
+    if is_child and (not info['title'] or not has_reasonable_size):
+        return False
+    if info['class_name'] in IGNORED_CLASSES:
+        return False
+    if info['name'] in IGNORED_PROCESSES and not info['title']:
+        return False
+    return True
+
+
+def get_window_type(info):
+    """获取窗口类型"""
+    exe_lower = info['exe'].lower() if info['exe'] != UNKNOWN else ""
+
+    # 浏览器检测
+    if 'chrome.exe' in exe_lower or 'msedge.exe' in exe_lower or 'firefox.exe' in exe_lower:
+        return 'browser'
+    # 特殊应用检测
+    if 'pixpin' in exe_lower or 'fastorange' in exe_lower:
+        return 'application'
+    # 文件资源管理器
+    if 'explorer.exe' in exe_lower and info['title']:
+        return 'explorer'
+    # 其他应用程序
+    if info['style'] & win32con.WS_POPUP:
+        return 'popup'
+    return 'application'
+
+
+def _process_header(windows):
+    first = windows[0]
+    return f"== {first['name']} (PID: {first['pid']}, 路径: {first['exe']}, {len(windows)} 个窗口) ==\n"
+
+
+def all_windows_report():
+    """所有窗口及子窗口，按进程分组"""
+    groups = snapshot_windows(include_children=True)
+    parts = [f"\n[枚举所有窗口和子窗口]\n{SEPARATOR}\n\n"]
+    count = 0
+    for windows in groups.values():
+        parts.append(_process_header(windows))
+        parts.extend(format_window_info(info) + "\n" for info in windows)
+        count += len(windows)
+    parts.append(f"\n共 {len(groups)} 个进程，{count} 个窗口\n{SEPARATOR}\n[枚举完成]\n")
+    return "".join(parts)
+
+
+def filtered_windows_report():
+    """值得关注的顶层窗口，按类型分类，类型内按进程排列"""
+    windows_by_type = {}
+    for windows in snapshot_windows().values():
+        for info in windows:
+            if is_interesting_window(info):
+                windows_by_type.setdefault(get_window_type(info), []).append(info)
+
+    parts = [f"\n[按类型显示感兴趣的窗口]\n{SEPARATOR}\n\n"]
+    for window_type, windows in sorted(windows_by_type.items()):
+        parts.append(f"\n== {window_type}（{len(windows)}）==\n")
+        parts.extend(format_window_info(info) + "\n" for info in windows)
+    parts.append(f"\n{SEPARATOR}\n[枚举完成]\n")
+    return "".join(parts)
+
+
+def special_app_windows_report(keywords=SPECIAL_APP_KEYWORDS):
+    """
+    查找特殊应用的窗口：进程名或路径匹配的进程的所有窗口，以及类名或标题匹配的顶层窗口。
+
+    返回:
+        (报告文本, 找到的窗口信息列表)
+    """
+    keywords = [k.lower() for k in keywords]
+
+    def matches(*texts):
+        return any(k in (text or "").lower() for k in keywords for text in texts)
+
+    parts = [f"\n[查找特殊应用窗口]\n{SEPARATOR}\n\n"]
+    special_pids = set()
+    for proc in psutil.process_iter(['pid', 'name', 'exe']):
+        try:
+            proc_info = proc.info
+            if matches(proc_info.get('name'), proc_info.get('exe')):
+                special_pids.add(proc_info['pid'])
+                parts.append(f"发现特殊应用进程: {proc_info.get('name')} (PID: {proc_info['pid']}, 路径: {proc_info.get('exe')})\n")
+        except Exception as e:
+            parts.append(f"处理进程时出错: {e}\n")
+
+    found = []
+    matched_by_name = []
+    for pid, windows in snapshot_windows(include_children=True).items():
+        if pid in special_pids:
+            found.extend(windows)
+            continue
+        for info in windows:
+            if info['depth'] == 0 and matches(info['class_name'], info['title']):
+                matched_by_name.append(info)
+
+    for info in found:
+        label = "  子窗口" if info['depth'] else "找到窗口"
+        parts.append(f"{label}: {info['title'] or '(无标题)'} (HWND: {info['hwnd']}, 类名: {info['class_name']})\n")
+    parts.append("\n[通过类名/标题匹配]\n")
+    for info in matched_by_name:
+        parts.append(f"通过类名/标题匹配找到窗口: {info['title'] or '(无标题)'} "
+                     f"(HWND: {info['hwnd']}, 类名: {info['class_name']})\n")
+    found.extend(matched_by_name)
+
+    parts.append(f"\n[查找结果]\n找到 {len(found)} 个可能的特殊应用窗口\n")
+    if found:
+        parts.append("\n详细信息:\n")
+        parts.extend(format_window_info(info, 0) + "\n" for info in found)
+    parts.append(f"\n{SEPARATOR}\n[查找完成]\n")
+    return "".join(parts), found
+
+
+def process_list_report():
+    """系统中的所有进程，按名称排序"""
+    parts = [f"\n[系统进程列表]\n{SEPARATOR}\n\n"]
+    processes = []
+    try:
+        for proc in psutil.process_iter(['pid', 'name', 'exe']):
+            try:
+                proc_info = proc.info
+                processes.append((proc_info['pid'], proc_info.get('name') or UNKNOWN, proc_info.get('exe') or UNKNOWN))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        # 按名称排序
+        processes.sort(key=lambda p: p[1].lower())
+        for pid, name, exe in processes:
+            parts.append(f"PID: {pid}, 名称: {name}\n  路径: {exe}\n{'-' * 50}\n")
+        parts.append(f"\n总共找到 {len(processes)} 个进程\n")
+    except Exception as e:
+        parts.append(f"获取进程列表时出错: {e}\n")
+    parts.append(f"\n{SEPARATOR}\n[列表完成]\n")
+    return "".join(parts)
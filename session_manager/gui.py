@@ -12,6 +12,7 @@ import threading
 import time
 import json
 import queue
+from collections import deque
 from datetime import datetime
 from functools import partial
 import webbrowser
@@ -21,13 +22,15 @@ from PIL import Image, ImageTk, ImageDraw
 import winshell
 import pygetwindow as gw
 from session_manager.utils import get_process_path_from_hwnd
-import win32gui
-import win32process
-import psutil
-import win32con
 
 from . import config
-from .core import collect_session_data, restore_session
+from .core import collect_session_data, restore_session, create_session_preview
+from .thumbnails import get_thumbnail_store, thumbnail_key
+from .launcher import format_restore_report
+from .background import BackgroundExecutor
+from . import diagnostics
+from .session_diff import diff_sessions, diff_with_live, is_empty_diff, format_diff_report
+from .storage import export_archive, import_archive, format_archive_report
 
 # 日志记录器
 logger = logging.getLogger(__name__)
@@ -41,6 +44,17 @@ TITLE_FONT = ("Segoe UI", 12, "bold")
 HEADER_FONT = ("Segoe UI", 11, "bold")
 DEFAULT_THEME = "vista"  # 可选: 'winnative', 'clam', 'alt', 'default', 'classic', 'vista', 'xpnative'
 
+# 窗口列表每个时间片最多占用主循环的时间（秒），超出后让出给其他事件
+TREE_SLICE_SECONDS = 0.015
+# 后台操作进行时轮询事件队列的间隔（毫秒）
+BACKGROUND_POLL_MS = 50
+# 日志区：有新日志后延迟多久刷新（毫秒）、每次刷新最多插入的条数、默认保留的行数
+LOG_FLUSH_MS = 100
+LOG_BATCH_SIZE = 500
+DEFAULT_LOG_MAX_LINES = 2000
+# 会话布局预览图的尺寸
+PREVIEW_SIZE = (320, 180)
+
 # 颜色方案
 COLORS = {
     "light": {
@@ -74,38 +88,58 @@ COLORS = {
 }
 
 class GuiLogHandler(logging.Handler):
-    """将日志信息发送到GUI"""
+    """
+    将日志信息发送到GUI。
+
+    emit() 可能在任意线程中调用（后台任务、自动保存、恢复调度、日志同步等），只把日志放入队列，
+    不接触 Tk 对象。由 start() 在界面线程中启动的 after 循环每 LOG_FLUSH_MS 毫秒批量取出
+    最多 LOG_BATCH_SIZE 条并一次性插入日志区；一批没有取完时立即继续。
+    """
     def __init__(self, app):
         super().__init__()
         self.app = app
         self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
         self.log_queue = queue.Queue()
-        self.start_queue_listener()
+        self._running = False
 
     def emit(self, record):
-        log_entry = self.format(record)
+        try:
+            log_entry = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
         self.log_queue.put((record.levelno, log_entry))
-    
-    def start_queue_listener(self):
-        """启动一个线程监听日志队列"""
-        def check_queue():
+
+    def start(self):
+        """在界面线程中调用，启动刷新循环"""
+        if not self._running:
+            self._running = True
+            self.app.root.after(LOG_FLUSH_MS, self.flush_to_gui)
+
+    def stop(self):
+        """在界面线程中调用，停止刷新循环"""
+        self._running = False
+
+    def flush_to_gui(self):
+        """在界面线程中批量取出日志并写入日志区，然后安排下一次刷新"""
+        if not self._running:
+            return
+        records = []
+        try:
+            while len(records) < LOG_BATCH_SIZE:
+                records.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if records:
             try:
-                while True:
-                    try:
-                        level, message = self.log_queue.get_nowait()
-                        if hasattr(self.app, 'add_log_message'):
-                            self.app.add_log_message(level, message)
-                        self.log_queue.task_done()
-                    except queue.Empty:
-                        break
+                self.app.append_log_records(records)
             except Exception as e:
                 print(f"日志队列处理错误: {e}")
-            finally:
-                # 每100ms检查一次队列
-                self.app.root.after(100, check_queue)
-        
-        # 开始首次检查
-        self.app.root.after(100, check_queue)
+        try:
+            self.app.root.after(1 if not self.log_queue.empty() else LOG_FLUSH_MS, self.flush_to_gui)
+        except tk.TclError:
+            # 窗口已销毁
+            self._running = False
 
 class SessionManagerApp:
     def __init__(self, root, config, session_manager):
@@ -142,6 +176,9 @@ class SessionManagerApp:
         file_menu.add_command(label="导入会话", command=self.import_session)
         file_menu.add_command(label="导出会话", command=self.export_session)
         file_menu.add_separator()
+        file_menu.add_command(label="导入会话归档", command=self.import_all_sessions)
+        file_menu.add_command(label="导出全部会话", command=self.export_all_sessions)
+        file_menu.add_separator()
         file_menu.add_command(label="退出", command=self.root.quit)
         menubar.add_cascade(label="文件", menu=file_menu)
         session_menu = tk.Menu(menubar, tearoff=0)
@@ -149,6 +186,9 @@ class SessionManagerApp:
         session_menu.add_command(label="重命名会话", command=self.rename_session)
         session_menu.add_command(label="删除会话", command=self.delete_session)
         session_menu.add_command(label="清空会话", command=self.clear_session)
+        session_menu.add_separator()
+        session_menu.add_command(label="与当前桌面比较", command=self.compare_with_live)
+        session_menu.add_command(label="与其他会话比较", command=self.compare_sessions)
         menubar.add_cascade(label="会话", menu=session_menu)
         
         # 添加调试菜单
@@ -198,15 +238,36 @@ class SessionManagerApp:
         self.window_listbox.column("类型", width=80, anchor=tk.CENTER)
         self.window_listbox.column("路径", width=350)
         self.window_listbox.pack(fill=tk.BOTH, expand=True)
+
+        # 窗口布局预览（有缓存时切换会话不重新绘制）
+        self.preview_label = None
+        self._preview_photo = None
+        if config.get("ui", {}).get("session_preview", True):
+            self.preview_label = ttk.Label(right_frame, anchor=tk.CENTER)
+            self.preview_label.pack(fill=tk.X, pady=(5, 0))
         
         # 添加双击事件处理
         self.window_listbox.bind("<Double-1>", self.on_item_double_click)
+        # 浏览器窗口展开时才插入标签页
+        self.window_listbox.bind("<<TreeviewOpen>>", self.on_tree_open)
+        # 选中应用时显示它的缩略图
+        self.window_listbox.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.thumbnail_store = get_thumbnail_store(config) if config.get("ui", {}).get("window_thumbnails", True) else None
+        # 窗口列表状态：行键 -> (节点ID, 内容签名)；浏览器节点 -> 标签页列表
+        self._tree_rows = {}
+        self._tree_tabs = {}
+        self._tree_loaded = set()
+        self._tree_loading = {}
+        self._tree_tasks = deque()
+        self._tree_after = None
         
         # 操作按钮区
         btn_frame = ttk.Frame(main_frame)
         btn_frame.grid(row=1, column=0, columnspan=2, pady=10, sticky="ew")
-        ttk.Button(btn_frame, text="保存会话", command=self.save_session).pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="恢复会话", command=self.restore_session).pack(side="left", padx=5)
+        self.save_button = ttk.Button(btn_frame, text="保存会话", command=self.save_session)
+        self.save_button.pack(side="left", padx=5)
+        self.restore_button = ttk.Button(btn_frame, text="恢复会话", command=self.restore_session)
+        self.restore_button.pack(side="left", padx=5)
         ttk.Button(btn_frame, text="导入会话", command=self.import_session).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="导出会话", command=self.export_session).pack(side="left", padx=5)
         ttk.Button(btn_frame, text="重命名", command=self.rename_session).pack(side="left", padx=5)
@@ -218,6 +279,10 @@ class SessionManagerApp:
         log_frame.pack(fill=tk.BOTH, expand=False, padx=10, pady=(0, 10))
         self.log_text = scrolledtext.ScrolledText(log_frame, state='disabled', height=6, wrap=tk.WORD, font=('微软雅黑', 9))
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_text.tag_config("error", foreground="red")
+        self.log_text.tag_config("warning", foreground="orange")
+        self.log_text.tag_config("info", foreground="blue")
+        self.log_max_lines = max(1, int(config.get("ui", {}).get("log_max_lines", DEFAULT_LOG_MAX_LINES)))
         
         # 状态栏和退出按钮区域
         bottom_frame = ttk.Frame(root)
@@ -230,6 +295,11 @@ class SessionManagerApp:
         # 退出按钮
         exit_btn = ttk.Button(bottom_frame, text="退出", command=self.root.quit)
         exit_btn.pack(side=tk.RIGHT, padx=10, pady=2)
+
+        # 后台操作的进度条和取消按钮，操作进行时才显示
+        self.executor = BackgroundExecutor()
+        self.cancel_button = ttk.Button(bottom_frame, text="取消", command=self.cancel_task)
+        self.progress_bar = ttk.Progressbar(bottom_frame, length=160, mode="indeterminate")
         
         # 刷新应用列表
         self.refresh_window_list()
@@ -250,56 +320,137 @@ class SessionManagerApp:
             self.current_session_name = name
             self.current_session_items = self.session_manager.get_session(name)
             self.refresh_window_list()
-            self.status_bar.config(text=f"已切换到会话：{name}")
+            info = self.session_manager.get_session_info(name)
+            if info and info.get("saved_at"):
+                saved_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(info["saved_at"]))
+                counts = f"{info['apps']} 个应用，{info['tabs']} 个标签页，" if info.get("apps") is not None else ""
+                self.status_bar.config(text=f"已切换到会话：{name}（{counts}保存于 {saved_at}）")
+            else:
+                self.status_bar.config(text=f"已切换到会话：{name}")
 
     def save_session(self):
-        try:
-            # 收集会话数据
-            session_data = collect_session_data(self.config)
-            
-            # 保存会话数据
-            self.session_manager.set_session(self.current_session_name, session_data)
-            self.current_session_items = session_data
-            
-            # 刷新窗口列表
-            self.refresh_window_list()
-            
+        session_name = self.current_session_name
+
+        def work(task):
+            # 收集会话数据并保存
+            session_data = collect_session_data(self.config, progress=task.report, cancel_event=task.cancel_event)
+            task.check_cancelled()
+            self.session_manager.set_session(session_name, session_data)
+            if self.thumbnail_store is not None:
+                self.thumbnail_store.capture_session(session_name, session_data)
+            return session_data
+
+        def done(session_data):
+            if self.current_session_name == session_name:
+                self.current_session_items = session_data
+                # 刷新窗口列表
+                self.refresh_window_list()
             # 更新状态栏
             app_count = len(session_data.get("applications", []))
-            self.status_bar.config(text=f"会话 '{self.current_session_name}' 已保存。包含 {app_count} 个应用。")
-            
+            self.status_bar.config(text=f"会话 '{session_name}' 已保存。包含 {app_count} 个应用。")
             # 显示成功消息
-            messagebox.showinfo("保存成功", f"会话 '{self.current_session_name}' 已保存。\n共包含 {app_count} 个应用。")
-        except Exception as e:
-            logger.error(f"保存会话时出错: {e}", exc_info=True)
+            messagebox.showinfo("保存成功", f"会话 '{session_name}' 已保存。\n共包含 {app_count} 个应用。")
+
+        def failed(e):
             self.log_to_gui(f"保存会话失败: {e}")
             messagebox.showerror("保存失败", f"保存会话时出错: {e}")
 
+        self.run_task("保存会话", work, done, failed)
+
     def restore_session(self):
-        try:
-            # 获取当前会话数据
-            session_data = self.get_session_data(self.current_session_name)
-            
-            # 检查会话数据是否为空
-            if not session_data or not session_data.get("applications"):
-                messagebox.showwarning("恢复失败", "当前会话没有可恢复的应用。")
-                return
-                
-            # 恢复会话
-            success_count, fail_count = restore_session(session_data, self.config)
-            
+        session_name = self.current_session_name
+        # 获取当前会话数据
+        session_data = self.get_session_data(session_name)
+
+        # 检查会话数据是否为空
+        if not session_data or not session_data.get("applications"):
+            messagebox.showwarning("恢复失败", "当前会话没有可恢复的应用。")
+            return
+
+        def work(task):
+            def progress(done, total, app_result):
+                name = app_result.get("title") or os.path.basename(app_result.get("process_path", ""))
+                task.report(f"正在恢复会话 '{session_name}'：{name} [{app_result['status']}]", done, total)
+            return restore_session(session_data, self.config, cancel_event=task.cancel_event, progress=progress)
+
+        def done(result):
+            success_count, fail_count = result["success"], result["failed"]
+            summary = f"成功: {success_count}, 失败: {fail_count}"
+            if result.get("cancelled"):
+                summary += f", 已取消: {result['cancelled']}"
             # 显示结果
-            if success_count == 0 and fail_count == 0:
-                self.status_bar.config(text=f"会话 '{self.current_session_name}' 没有内容可恢复。")
-                messagebox.showinfo("恢复完成", f"会话 '{self.current_session_name}' 没有内容可恢复。")
+            if success_count == 0 and fail_count == 0 and not result.get("cancelled"):
+                self.status_bar.config(text=f"会话 '{session_name}' 没有内容可恢复。")
+                messagebox.showinfo("恢复完成", f"会话 '{session_name}' 没有内容可恢复。")
             else:
-                self.status_bar.config(text=f"会话 '{self.current_session_name}' 恢复完成。成功: {success_count}, 失败: {fail_count}")
-                messagebox.showinfo("恢复完成", f"会话 '{self.current_session_name}' 已尝试恢复。\n成功: {success_count}, 失败: {fail_count}")
-        except Exception as e:
-            logger.error(f"恢复会话时出错: {e}", exc_info=True)
+                # 输出每个应用的启动耗时明细
+                self.log_to_gui(format_restore_report(result))
+                self.status_bar.config(text=f"会话 '{session_name}' 恢复完成。{summary}, 耗时: {result['elapsed_ms'] / 1000:.1f}s")
+                messagebox.showinfo("恢复完成", f"会话 '{session_name}' 已尝试恢复。\n{summary}\n耗时: {result['elapsed_ms'] / 1000:.1f}s")
+
+        def failed(e):
             self.log_to_gui(f"恢复会话失败: {e}")
             messagebox.showerror("恢复失败", f"恢复会话时出错: {e}")
 
+        self.run_task("恢复会话", work, done, failed)
+
+    # --- 后台操作 ---
+    def run_task(self, name, work, on_done, on_error=None):
+        """
+        在后台线程中执行耗时操作，进度显示在状态栏，完成后在界面线程中调用 on_done(结果)。
+        同一时间只允许一个操作。
+
+        返回:
+            是否已开始执行
+        """
+        task = self.executor.submit(
+            name, work,
+            on_done=partial(self._finish_task, on_done),
+            on_progress=self._task_progress,
+            on_error=partial(self._finish_task, on_error),
+            on_cancelled=partial(self._finish_task, lambda: self.status_bar.config(text=f"{name}已取消。"))
+        )
+        if task is None:
+            messagebox.showwarning("操作进行中", f"'{self.executor.current.name}' 正在进行，请等待完成或取消后再试。")
+            return False
+        self.status_bar.config(text=f"正在{name}...")
+        self.save_button.config(state=tk.DISABLED)
+        self.restore_button.config(state=tk.DISABLED)
+        self.progress_bar.config(mode="indeterminate", value=0)
+        self.progress_bar.pack(side=tk.RIGHT, padx=5)
+        self.progress_bar.start(20)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5, pady=2)
+        self.root.after(BACKGROUND_POLL_MS, self._poll_tasks)
+        return True
+
+    def cancel_task(self):
+        if self.executor.busy:
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_bar.config(text=f"正在取消{self.executor.current.name}...")
+            self.executor.cancel()
+
+    def _poll_tasks(self):
+        if self.executor.poll():
+            self.root.after(BACKGROUND_POLL_MS, self._poll_tasks)
+
+    def _task_progress(self, progress):
+        self.status_bar.config(text=progress["message"])
+        if progress["total"]:
+            if str(self.progress_bar.cget("mode")) != "determinate":
+                self.progress_bar.stop()
+                self.progress_bar.config(mode="determinate")
+            self.progress_bar.config(maximum=progress["total"], value=progress["done"] or 0)
+
+    def _finish_task(self, callback, *args):
+        self.progress_bar.stop()
+        self.progress_bar.pack_forget()
+        self.cancel_button.pack_forget()
+        self.save_button.config(state=tk.NORMAL)
+        self.restore_button.config(state=tk.NORMAL)
+        if callback is not None:
+            callback(*args)
+
     def import_session(self):
         file_path = filedialog.askopenfilename(
             title="导入会话",
@@ -334,6 +485,42 @@ class SessionManagerApp:
         else:
             messagebox.showerror("导出失败", "导出会话失败，请检查日志。")
 
+    def export_all_sessions(self):
+        file_path = filedialog.asksaveasfilename(
+            title="导出全部会话",
+            defaultextension=".jsonl.gz",
+            filetypes=[("会话归档", "*.jsonl.gz *.jsonl"), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+        self._run_archive_task("导出", lambda: export_archive(self.session_manager, file_path))
+
+    def import_all_sessions(self):
+        file_path = filedialog.askopenfilename(
+            title="导入会话归档",
+            filetypes=[("会话归档", "*.jsonl.gz *.jsonl"), ("所有文件", "*.*")]
+        )
+        if not file_path:
+            return
+        overwrite = messagebox.askyesno("导入会话归档", "是否覆盖同名会话？\n选择“否”将跳过已存在的会话。")
+        workers = self.config["advanced"].get("restore_concurrency", 4)
+        self._run_archive_task("导入", lambda: import_archive(self.session_manager, file_path,
+                                                            overwrite=overwrite, workers=workers))
+
+    def _run_archive_task(self, action, task):
+        """在后台执行归档导入导出，完成后在界面线程中报告结果"""
+        def done(stats):
+            report = format_archive_report(stats)
+            self.refresh_session_list()
+            self.log_to_gui(f"{action}会话归档完成: {report}")
+            self.status_bar.config(text=f"{action}会话归档完成。{report}")
+            messagebox.showinfo(f"{action}完成", report)
+
+        def failed(e):
+            messagebox.showerror(f"{action}失败", f"{action}会话归档失败: {e}")
+
+        self.run_task(f"{action}会话归档", lambda t: task(), done, failed)
+
     def create_session(self):
         new_name = simpledialog.askstring("新建会话", "请输入新会话名称：", parent=self.root)
         if not new_name:
@@ -360,10 +547,11 @@ class SessionManagerApp:
         if new_name in self.session_manager.get_session_names():
             messagebox.showwarning("重命名失败", "会话名称已存在。")
             return
-        items = self.session_manager.get_session(self.current_session_name)
-        self.session_manager.set_session(new_name, items)
-        self.session_manager.delete_session(self.current_session_name)
+        self.session_manager.rename_session(self.current_session_name, new_name)
+        if self.thumbnail_store is not None:
+            self.thumbnail_store.rename_session(self.current_session_name, new_name)
         self.refresh_session_list()
+        self.session_list.selection_clear(0, tk.END)
         idx = self.session_manager.get_session_names().index(new_name)
         self.session_list.selection_set(idx)
         self.on_session_select(None)
@@ -377,6 +565,8 @@ class SessionManagerApp:
         if not messagebox.askyesno("确认删除", f"确定要删除会话 '{self.current_session_name}' 吗？此操作不可恢复。"):
             return
         self.session_manager.delete_session(self.current_session_name)
+        if self.thumbnail_store is not None:
+            self.thumbnail_store.remove_session(self.current_session_name)
         self.refresh_session_list()
         session_names = self.session_manager.get_session_names()
         if session_names:
@@ -404,6 +594,104 @@ class SessionManagerApp:
         self.status_bar.config(text=f"会话 '{self.current_session_name}' 已清空。")
         messagebox.showinfo("清空成功", f"会话 '{self.current_session_name}' 已清空。")
 
+    def compare_with_live(self):
+        """比较当前会话与当前桌面（采集桌面在后台线程中进行）"""
+        session_name = self.current_session_name
+        session_data = self.get_session_data(session_name)
+
+        def work(task):
+            return diff_with_live(session_data, self.config, progress=task.report, cancel_event=task.cancel_event)
+
+        def done(diff):
+            self.status_bar.config(text="会话比较完成。")
+            self.show_diff(diff, session_name, "当前桌面")
+
+        def failed(e):
+            logger.error(f"比较会话时出错: {e}")
+            messagebox.showerror("比较失败", f"比较会话时出错: {e}")
+
+        self.run_task("比较会话", work, done, failed)
+
+    def compare_sessions(self):
+        """比较当前会话与另一个会话"""
+        choices = [name for name in self.session_manager.get_session_names() if name != self.current_session_name]
+        if not choices:
+            messagebox.showinfo("会话比较", "没有其他会话可以比较。")
+            return
+        other = self.choose_from_list("会话比较", f"将会话 '{self.current_session_name}' 与哪个会话比较：", choices)
+        if not other:
+            return
+        diff = diff_sessions(self.get_session_data(self.current_session_name), self.get_session_data(other))
+        self.show_diff(diff, self.current_session_name, other)
+
+    def choose_from_list(self, title, prompt, choices):
+        """模态列表选择对话框，返回选中的项，取消时返回 None"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(title)
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        ttk.Label(dialog, text=prompt).pack(padx=10, pady=(10, 5), anchor=tk.W)
+        listbox = tk.Listbox(dialog, height=min(12, len(choices)), width=40, font=('微软雅黑', 10))
+        listbox.insert(tk.END, *choices)
+        listbox.selection_set(0)
+        listbox.pack(padx=10, fill=tk.BOTH, expand=True)
+        selected = []
+
+        def accept(event=None):
+            idx = listbox.curselection()
+            if idx:
+                selected.append(choices[idx[0]])
+            dialog.destroy()
+
+        buttons = ttk.Frame(dialog)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="确定", command=accept).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        listbox.bind("<Double-Button-1>", accept)
+        dialog.bind("<Return>", accept)
+        dialog.bind("<Escape>", lambda event: dialog.destroy())
+        listbox.focus_set()
+        dialog.grab_set()
+        self.root.wait_window(dialog)
+        return selected[0] if selected else None
+
+    def show_diff(self, diff, old_label, new_label):
+        """在新窗口中显示会话差异"""
+        self.log_to_gui(format_diff_report(diff, old_label, new_label).splitlines()[0])
+        if is_empty_diff(diff):
+            messagebox.showinfo("会话比较", f"'{old_label}' 与 '{new_label}' 没有差异。")
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"会话比较: {old_label} -> {new_label}")
+        window.geometry("800x500")
+        tree = ttk.Treeview(window, columns=("详情",), show="tree headings")
+        tree.heading("#0", text="条目")
+        tree.heading("详情", text="详情")
+        tree.column("#0", width=400, anchor=tk.W)
+        tree.column("详情", width=380)
+        scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        apps, tabs = diff["apps"], diff["tabs"]
+        groups = [
+            ("新增应用", apps["added"], lambda a: (a.get("title", ""), a.get("process_path", ""))),
+            ("删除应用", apps["removed"], lambda a: (a.get("title", ""), a.get("process_path", ""))),
+            ("移动应用", apps["moved"], lambda m: (m["item"].get("title", ""), f"位置 {m['from'] + 1} -> {m['to'] + 1}")),
+            ("新增标签页", tabs["added"], lambda t: (t["title"], t["url"])),
+            ("删除标签页", tabs["removed"], lambda t: (t["title"], t["url"])),
+            ("移动标签页", tabs["moved"], lambda t: (t["title"], f"窗口 {t['from']['window'] + 1} -> {t['to']['window'] + 1}"))
+        ]
+        for label, items, describe in groups:
+            if not items:
+                continue
+            parent = tree.insert("", "end", text=f"{label}（{len(items)}）", open=True)
+            for item in items:
+                text, detail = describe(item)
+                tree.insert(parent, "end", text=text, values=(detail,))
+
     def show_help(self):
         messagebox.showinfo("使用说明", "1. 选择会话，右侧显示应用列表。\n2. 可保存/恢复/导入/导出/重命名/删除/清空会话。\n3. 右键支持更多操作。")
 
@@ -412,10 +700,7 @@ class SessionManagerApp:
 
     def log_to_gui(self, msg):
         """向GUI日志区输出信息"""
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, msg + '\n')
-        self.log_text.see(tk.END)
-        self.log_text.config(state='disabled')
+        self._append_log_text([msg + '\n', ()])
 
     def refresh_windows(self):
         windows = gw.getAllWindows()
@@ -427,358 +712,100 @@ class SessionManagerApp:
             except Exception as e:
                 print(f"窗口信息获取异常: {e}")
 
-    def get_window_info(self, hwnd):
-        """获取窗口详细信息"""
-        info = {
-            'hwnd': hwnd,
-            'title': win32gui.GetWindowText(hwnd),
-            'class_name': win32gui.GetClassName(hwnd),
-            'visible': win32gui.IsWindowVisible(hwnd),
-            'style': win32gui.GetWindowLong(hwnd, win32con.GWL_STYLE),
-            'rect': win32gui.GetWindowRect(hwnd)
-        }
-        try:
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            proc = psutil.Process(pid)
-            info['pid'] = pid
-            info['exe'] = proc.exe()
-            info['name'] = proc.name()
-        except Exception:
-            info['pid'] = None
-            info['exe'] = "未知"
-            info['name'] = "未知"
-        return info
-
-    def format_window_info(self, info, depth=0):
-        """格式化窗口信息输出"""
-        indent = "  " * depth
-        style_flags = []
-        if info['style'] & win32con.WS_VISIBLE:
-            style_flags.append("可见")
-        if info['style'] & win32con.WS_CHILD:
-            style_flags.append("子窗口")
-        if info['style'] & win32con.WS_POPUP:
-            style_flags.append("弹出窗口")
-        
-        rect = info['rect']
-        size = f"{rect[2]-rect[0]}x{rect[3]-rect[1]}"
-        
-        return (
-            f"{indent}窗口信息:\n"
-            f"{indent}  HWND: {info['hwnd']}\n"
-            f"{indent}  标题: {info['title'] or '(无标题)'}\n"
-            f"{indent}  类名: {info['class_name']}\n"
-            f"{indent}  PID: {info['pid']}\n"
-            f"{indent}  进程: {info['name']}\n"
-            f"{indent}  路径: {info['exe']}\n"
-            f"{indent}  位置: ({rect[0]},{rect[1]}) 大小: {size}\n"
-            f"{indent}  样式: {', '.join(style_flags)}\n"
-        )
-
+    # --- 调试菜单：诊断视图在后台线程中生成，结果在新窗口中一次性显示 ---
     def enum_all_windows_and_children(self):
-        def log_window(hwnd, depth=0):
-            """递归记录窗口信息"""
-            info = self.get_window_info(hwnd)
-            self.log_text.insert(tk.END, self.format_window_info(info, depth) + "\n")
-            # 枚举子窗口
-            win32gui.EnumChildWindows(hwnd, lambda h, _: log_window(h, depth+1), None)
-
-        self.log_text.config(state='normal')
-        self.log_text.delete(1.0, tk.END)  # 清空之前的日志
-        self.log_text.insert(tk.END, '\n[开始递归枚举所有窗口和子窗口]\n' + '='*50 + '\n\n')
-        win32gui.EnumWindows(lambda hwnd, _: log_window(hwnd), None)
-        self.log_text.insert(tk.END, '\n' + '='*50 + '\n[枚举完成]\n')
-        self.log_text.config(state='disabled')
-        self.log_text.see(tk.END)
-
-    def is_interesting_window(self, info):
-        """判断窗口是否值得关注"""
-        # 忽略不可见窗口
-        if not (info['style'] & win32con.WS_VISIBLE):
-            return False
-            
-        # 特殊处理：即使是子窗口，如果有标题且尺寸合理，也可能是值得关注的窗口
-        is_child = info['style'] & win32con.WS_CHILD
-        rect = info['rect']
-        window_width = rect[2] - rect[0]
-        window_height = rect[3] - rect[1]
-        has_reasonable_size = window_width > 100 and window_height > 100
-        
-        # 如果是子窗口但有标题且尺寸合理，仍然考虑
-        if is_child and (not info['title'] or not has_reasonable_size):
-            return False
-            
-        # 忽略特定类名的系统窗口
-        ignored_classes = {
-            'Shell_TrayWnd',  # 任务栏
-            'DV2ControlHost',  # 系统控件
-            'Windows.UI.Core.CoreWindow',  # UWP核心窗口
-            # 保留ApplicationFrameWindow，因为一些UWP应用使用这个类名
-        }
-        if info['class_name'] in ignored_classes:
-            return False
-            
-        # 忽略特定进程的窗口
-        ignored_processes = {
-            'SearchApp.exe',
-            'TextInputHost.exe',
-            # 只有在标题为空时才忽略explorer.exe
-        }
-        if info['name'] in ignored_processes and not info['title']:
-            return False
-            
-        # 特殊处理：某些应用可能没有标准窗口样式但仍需要被捕获
-        # 如果窗口有标题且尺寸合理，即使不是标准窗口也考虑
-        if info['title'] and has_reasonable_size:
-            return True
-            
-        # 如果窗口没有标题但进程名看起来是应用程序，也考虑
-        if not info['title'] and info['name'] not in ['explorer.exe', 'dwm.exe', 'ApplicationFrameHost.exe']:
-            # 检查窗口尺寸是否合理
-            if has_reasonable_size:
-                return True
-                
-        return True
-
-    def get_window_type(self, info):
-        """获取窗口类型"""
-        exe_lower = info['exe'].lower() if info['exe'] != "未知" else ""
-        
-        # 浏览器检测
-        if 'chrome.exe' in exe_lower:
-            return 'browser'
-        elif 'msedge.exe' in exe_lower:
-            return 'browser'
-        elif 'firefox.exe' in exe_lower:
-            return 'browser'
-        
-        # 特殊应用检测
-        if 'pixpin' in exe_lower:
-            return 'application'
-        elif 'fastorange' in exe_lower:
-            return 'application'
-        
-        # 文件资源管理器
-        elif 'explorer.exe' in exe_lower and info['title']:
-            return 'explorer'
-            
-        # 其他应用程序
-        elif info['style'] & win32con.WS_POPUP:
-            return 'popup'
-        else:
-            return 'application'
+        self.show_diagnostics("枚举所有窗口", diagnostics.all_windows_report)
 
     def enum_filtered_windows(self):
         """枚举并按类型分类显示感兴趣的窗口"""
-        windows_by_type = {}
-        
-        def collect_window(hwnd, lparam):
-            try:
-                info = self.get_window_info(hwnd)
-                if self.is_interesting_window(info):
-                    window_type = self.get_window_type(info)
-                    if window_type not in windows_by_type:
-                        windows_by_type[window_type] = []
-                    windows_by_type[window_type].append(info)
-                    
-                    # 记录日志，帮助调试
-                    self.log_to_gui(f"发现窗口: {info['title']} (HWND: {info['hwnd']}, 类名: {info['class_name']}, 进程: {info['name']})")
-            except Exception as e:
-                self.log_to_gui(f"处理窗口时出错: {e}")
-            return True  # 继续枚举
-        
-        self.log_text.config(state='normal')
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.insert(tk.END, '\n[按类型显示感兴趣的窗口]\n' + '='*50 + '\n\n')
-        
-        # 枚举窗口
-        win32gui.EnumWindows(collect_window, None)
-        
-        # 显示结果
-        for window_type, windows in sorted(windows_by_type.items()):
-            self.log_text.insert(tk.END, f"\n== {window_type} ==\n")
-            for info in windows:
-                self.log_text.insert(tk.END, self.format_window_info(info) + "\n")
-        
-        self.log_text.insert(tk.END, '\n' + '='*50 + '\n[枚举完成]\n')
-        self.log_text.config(state='disabled')
-        self.log_text.see(tk.END) 
+        self.show_diagnostics("显示主要窗口", diagnostics.filtered_windows_report)
 
     def find_special_app_windows(self):
-        """使用多种方法查找特殊应用的窗口"""
-        self.log_text.config(state='normal')
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.insert(tk.END, '\n[开始查找特殊应用窗口]\n' + '='*50 + '\n\n')
-        
-        # 1. 通过进程名查找
-        special_apps = ['PixPin', 'FastOrange']
-        found_windows = []
-        
-        # 获取所有进程
-        for proc in psutil.process_iter(['pid', 'name', 'exe']):
-            try:
-                proc_info = proc.info
-                proc_name = proc_info['name'] if 'name' in proc_info else ""
-                proc_exe = proc_info['exe'] if 'exe' in proc_info else ""
-                
-                # 检查进程名是否包含特殊应用名称
-                is_special = False
-                matching_app = ""
-                for app in special_apps:
-                    if (app.lower() in proc_name.lower() or 
-                        (proc_exe and app.lower() in proc_exe.lower())):
-                        is_special = True
-                        matching_app = app
-                        break
-                
-                if is_special:
-                    self.log_text.insert(tk.END, f"发现特殊应用进程: {proc_name} (PID: {proc_info['pid']}, 路径: {proc_exe})\n")
-                    
-                    # 2. 尝试查找该进程的所有窗口
-                    def enum_windows_callback(hwnd, pid):
-                        try:
-                            _, win_pid = win32process.GetWindowThreadProcessId(hwnd)
-                            if win_pid == pid:
-                                window_info = self.get_window_info(hwnd)
-                                found_windows.append(window_info)
-                                self.log_text.insert(tk.END, f"找到窗口: {window_info['title'] or '(无标题)'} "
-                                                           f"(HWND: {hwnd}, 类名: {window_info['class_name']})\n")
-                                
-                                # 3. 查找子窗口
-                                def enum_child_callback(child_hwnd, _):
-                                    try:
-                                        child_info = self.get_window_info(child_hwnd)
-                                        found_windows.append(child_info)
-                                        self.log_text.insert(tk.END, f"  子窗口: {child_info['title'] or '(无标题)'} "
-                                                                   f"(HWND: {child_hwnd}, 类名: {child_info['class_name']})\n")
-                                    except Exception as e:
-                                        self.log_text.insert(tk.END, f"  获取子窗口信息出错: {e}\n")
-                                    return True
-                                
-                                win32gui.EnumChildWindows(hwnd, enum_child_callback, None)
-                        except Exception as e:
-                            self.log_text.insert(tk.END, f"枚举窗口时出错: {e}\n")
-                        return True
-                    
-                    win32gui.EnumWindows(lambda hwnd, lParam: enum_windows_callback(hwnd, proc_info['pid']), None)
-            except Exception as e:
-                self.log_text.insert(tk.END, f"处理进程时出错: {e}\n")
-        
-        # 4. 尝试使用其他方法查找窗口
-        self.log_text.insert(tk.END, '\n[尝试使用其他方法查找特殊窗口]\n')
-        
-        # 使用窗口类名的部分匹配
-        def find_by_class_partial_match(hwnd, _):
-            try:
-                class_name = win32gui.GetClassName(hwnd)
-                title = win32gui.GetWindowText(hwnd)
-                
-                for app in special_apps:
-                    if (app.lower() in class_name.lower() or 
-                        (title and app.lower() in title.lower())):
-                        window_info = self.get_window_info(hwnd)
-                        if window_info not in found_windows:
-                            found_windows.append(window_info)
-                            self.log_text.insert(tk.END, f"通过类名/标题匹配找到窗口: {title or '(无标题)'} "
-                                               f"(HWND: {hwnd}, 类名: {class_name})\n")
-            except Exception as e:
-                pass  # 忽略错误
-            return True
-        
-        win32gui.EnumWindows(find_by_class_partial_match, None)
-        
-        # 5. 总结结果
-        self.log_text.insert(tk.END, f"\n[查找结果]\n找到 {len(found_windows)} 个可能的特殊应用窗口\n")
-        
-        if found_windows:
-            self.log_text.insert(tk.END, "\n详细信息:\n")
-            for info in found_windows:
-                self.log_text.insert(tk.END, self.format_window_info(info) + "\n")
-        
-        self.log_text.insert(tk.END, '\n' + '='*50 + '\n[查找完成]\n')
-        self.log_text.config(state='disabled')
-        self.log_text.see(tk.END)
-        
-        return found_windows 
+        """查找特殊应用的窗口"""
+        self.show_diagnostics("查找特殊应用窗口", lambda: diagnostics.special_app_windows_report()[0])
 
     def list_all_processes(self):
         """列出系统中的所有进程"""
-        self.log_text.config(state='normal')
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.insert(tk.END, '\n[系统进程列表]\n' + '='*50 + '\n\n')
-        
-        try:
-            processes = []
-            
-            for proc in psutil.process_iter(['pid', 'name', 'exe', 'cmdline']):
-                try:
-                    proc_info = proc.info
-                    pid = proc_info['pid']
-                    name = proc_info['name'] if 'name' in proc_info else "未知"
-                    exe = proc_info['exe'] if 'exe' in proc_info else "未知"
-                    
-                    # 收集进程信息
-                    processes.append({
-                        'pid': pid,
-                        'name': name,
-                        'exe': exe
-                    })
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    pass
-            
-            # 按名称排序
-            processes.sort(key=lambda x: x['name'].lower())
-            
-            # 显示进程信息
-            for proc in processes:
-                self.log_text.insert(tk.END, f"PID: {proc['pid']}, 名称: {proc['name']}\n")
-                self.log_text.insert(tk.END, f"  路径: {proc['exe']}\n")
-                self.log_text.insert(tk.END, "-"*50 + "\n")
-                
-            self.log_text.insert(tk.END, f"\n总共找到 {len(processes)} 个进程\n")
-        except Exception as e:
-            self.log_text.insert(tk.END, f"获取进程列表时出错: {e}\n")
-        
-        self.log_text.insert(tk.END, '\n' + '='*50 + '\n[列表完成]\n')
-        self.log_text.config(state='disabled')
-        self.log_text.see(tk.END) 
+        self.show_diagnostics("列出所有进程", diagnostics.process_list_report)
+
+    def show_diagnostics(self, title, build_report):
+        """在后台线程中生成诊断报告，完成后显示"""
+        def failed(e):
+            messagebox.showerror(title, f"{title}时出错: {e}")
+
+        def done(text):
+            self.status_bar.config(text=f"{title}完成。")
+            self.show_text_window(title, text)
+
+        self.run_task(title, lambda task: build_report(), done, failed)
+
+    def show_text_window(self, title, text):
+        """在新窗口中显示只读文本（一次插入）"""
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("800x600")
+        text_widget = scrolledtext.ScrolledText(window, wrap=tk.NONE, font=('Consolas', 9))
+        text_widget.pack(fill=tk.BOTH, expand=True)
+        text_widget.insert(tk.END, text)
+        text_widget.config(state='disabled')
+
+    @staticmethod
+    def _log_tag(level):
+        """根据日志级别选择颜色标签"""
+        if level >= logging.ERROR:
+            return "error"
+        if level >= logging.WARNING:
+            return "warning"
+        if level >= logging.INFO:
+            return "info"
+        return ()
 
     def add_log_message(self, level, message):
         """添加日志消息到GUI"""
+        self.append_log_records([(level, message)])
+
+    def append_log_records(self, records):
+        """将 [(级别, 消息)] 一次性插入日志区"""
+        chunks = []
+        for level, message in records:
+            chunks.append(message + '\n')
+            chunks.append(self._log_tag(level))
+        self._append_log_text(chunks)
+
+    def _append_log_text(self, chunks):
+        """
+        chunks 为交替的文本和标签，与 Text.insert 的参数格式相同。
+        插入后只保留最后 log_max_lines 行。
+        """
         self.log_text.config(state='normal')
-        
-        # 根据日志级别选择颜色
-        tag = None
-        if level >= logging.ERROR:
-            tag = "error"
-            self.log_text.tag_config("error", foreground="red")
-        elif level >= logging.WARNING:
-            tag = "warning"
-            self.log_text.tag_config("warning", foreground="orange")
-        elif level >= logging.INFO:
-            tag = "info"
-            self.log_text.tag_config("info", foreground="blue")
-        
-        # 插入日志消息
-        self.log_text.insert(tk.END, message + '\n', tag)
+        self.log_text.insert(tk.END, *chunks)
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        excess = line_count - 1 - self.log_max_lines
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
         self.log_text.see(tk.END)
-        self.log_text.config(state='disabled') 
+        self.log_text.config(state='disabled')
 
     def get_session_data(self, session_name):
         """获取会话数据"""
         return self.session_manager.get_session(session_name)
 
     def refresh_window_list(self):
-        """刷新窗口列表，支持浏览器窗口下显示所有标签页"""
+        """
+        刷新窗口列表，支持浏览器窗口下显示所有标签页。
+
+        与上一次显示的内容比较，只删除、插入或更新变化的行；插入分时间片进行，
+        浏览器窗口的标签页在节点展开时才插入。
+        """
         if not self.current_session_name:
             return
-        # 清空列表
-        for i in self.window_listbox.get_children():
-            self.window_listbox.delete(i)
+        reopen = self._cancel_tree_tasks()
         # 获取当前会话数据
         session_data = self.get_session_data(self.current_session_name)
+        self.update_preview(session_data)
         if not session_data:
             self.log_to_gui("会话数据为空")
+            self._clear_window_list()
             return
         # 获取应用程序列表
         applications = []
@@ -786,50 +813,201 @@ class SessionManagerApp:
             applications = session_data.get("applications", [])
         elif isinstance(session_data, list):
             applications = session_data
+            session_data = {}
         else:
             self.log_to_gui(f"警告：会话数据格式无效（类型：{type(session_data)}），已跳过。")
+            self._clear_window_list()
+            return
+
+        rows = self._build_tree_rows(session_data.get("browser_windows", []), applications)
+        previous = self._tree_rows
+        self._tree_rows = {}
+        plan = []
+        for key, signature, text, values, item_type, tabs in rows:
+            iid, old_signature = previous.pop(key, (None, None))
+            plan.append((key, iid, signature != old_signature, signature, text, values, item_type, tabs))
+            if iid is not None:
+                self._tree_rows[key] = (iid, old_signature)
+        # 先一次性删除不再存在的行
+        stale = [iid for iid, _ in previous.values()]
+        if stale:
+            self.window_listbox.delete(*stale)
+            for iid in stale:
+                self._forget_tree_node(iid)
+        self._tree_tasks.append(self._apply_tree_rows(plan))
+        for iid in reopen:
+            self._load_tree_tabs(iid)
+        self._pump_tree_tasks()
+
+    def update_preview(self, session_data):
+        """显示会话的窗口布局预览，会话中没有窗口位置信息时隐藏"""
+        if self.preview_label is None:
+            return
+        image = create_session_preview(session_data, self.config, PREVIEW_SIZE) if session_data else None
+        if image is None:
+            self._preview_photo = None
+            self.preview_label.config(image="")
+            return
+        self._preview_photo = ImageTk.PhotoImage(image)
+        self.preview_label.config(image=self._preview_photo)
+
+    def on_tree_select(self, event):
+        """选中应用时显示它的缩略图（从磁盘读取），没有缩略图时显示会话布局预览"""
+        if self.preview_label is None or self.thumbnail_store is None:
             return
+        selection = self.window_listbox.selection()
+        image = None
+        if selection:
+            item = self.window_listbox.item(selection[0])
+            values = item.get("values") or ()
+            if len(values) >= 2 and values[0] in ("application", "special"):
+                image = self.thumbnail_store.load(self.current_session_name, thumbnail_key(values[1], item.get("text")))
+        if image is None:
+            self.update_preview(self.get_session_data(self.current_session_name))
+            return
+        self._preview_photo = ImageTk.PhotoImage(image)
+        self.preview_label.config(image=self._preview_photo)
+
+    def _build_tree_rows(self, browser_windows, applications):
+        """生成窗口列表的行 [(行键, 内容签名, 文本, 列值, 类型, 标签页列表或 None)]"""
+        rows = []
+        seen = {}
+
+        def row_key(*parts):
+            n = seen.get(parts, 0)
+            seen[parts] = n + 1
+            return parts + (n,)
+
         # 合并browser_windows到树形结构
-        browser_windows = session_data.get("browser_windows", [])
         for bw in browser_windows:
-            # 插入浏览器窗口为父节点
-            title = f"[浏览器] {bw.get('title', '')}（{len(bw.get('tabs', []))}个标签页）"
-            parent_id = self.window_listbox.insert(
-                "", "end",
-                text=title,
-                values=("browser", bw.get("browser", "")),
-                image=self.get_icon_for_type("browser")
-            )
-            # 插入所有标签页为子节点
-            for tab in bw.get("tabs", []):
-                tab_title = tab.get("title", tab.get("url", ""))
-                tab_url = tab.get("url", "")
-                self.window_listbox.insert(
-                    parent_id, "end",
-                    text=tab_title,
-                    values=("tab", tab_url),
-                    image=self.get_icon_for_type("tab")
-                )
+            if not isinstance(bw, dict):
+                continue
+            tabs = [tab for tab in bw.get("tabs", []) if isinstance(tab, dict)]
+            title = f"[浏览器] {bw.get('title', '')}（{len(tabs)}个标签页）"
+            values = ("browser", bw.get("browser", ""))
+            signature = (title, values, tuple((tab.get("title"), tab.get("url")) for tab in tabs))
+            rows.append((row_key("browser", bw.get("title", ""), values[1]), signature, title, values, "browser", tabs))
         # 添加普通应用到列表
         for app_info in applications:
             if not isinstance(app_info, dict):
                 self.log_to_gui(f"警告：应用数据无效（类型：{type(app_info)}），已跳过。")
                 continue
-            window_title = app_info.get("title", "未知应用")
-            window_path = app_info.get("path") or app_info.get("process_path", "")
             if app_info.get("is_browser", False):
                 continue  # 已在browser_windows中展示
-            elif app_info.get("special_app", False):
-                window_type = "special"
+            window_title = app_info.get("title", "未知应用")
+            window_path = app_info.get("path") or app_info.get("process_path", "")
+            window_type = "special" if app_info.get("special_app", False) else "application"
+            values = (window_type, window_path)
+            rows.append((row_key(window_type, window_title, window_path), (window_title, values),
+                         window_title, values, window_type, None))
+        return rows
+
+    def _apply_tree_rows(self, plan):
+        """按顺序插入新行、更新变化的行并调整保留行的位置（分时间片执行的生成器）"""
+        tree = self.window_listbox
+        for index, (key, iid, changed, signature, text, values, item_type, tabs) in enumerate(plan):
+            if iid is None:
+                iid = tree.insert("", index, text=text, values=values, image=self.get_icon_for_type(item_type))
+                self._tree_rows[key] = (iid, signature)
+                self._set_tree_tabs(iid, tabs)
             else:
-                window_type = "application"
-            app_icon = self.get_icon_for_type(window_type)
-            self.window_listbox.insert(
-                "", "end",
-                text=window_title,
-                values=(window_type, window_path),
-                image=app_icon
-            )
+                if tree.index(iid) != index:
+                    tree.move(iid, "", index)
+                if changed:
+                    tree.item(iid, text=text, values=values)
+                    was_open = tree.item(iid, "open")
+                    loading = self._tree_loading.pop(iid, None)
+                    if loading is not None:
+                        self._tree_tasks.remove(loading)
+                    if tree.get_children(iid):
+                        tree.delete(*tree.get_children(iid))
+                    self._tree_loaded.discard(iid)
+                    self._set_tree_tabs(iid, tabs)
+                    if was_open:
+                        self._load_tree_tabs(iid)
+                    self._tree_rows[key] = (iid, signature)
+            yield
+
+    def _set_tree_tabs(self, iid, tabs):
+        """记录浏览器节点的标签页，插入占位子节点以显示展开按钮"""
+        if tabs:
+            self._tree_tabs[iid] = tabs
+            self.window_listbox.insert(iid, "end", text="加载中…", values=("info", ""),
+                                       image=self.get_icon_for_type("info"))
+        else:
+            self._tree_tabs.pop(iid, None)
+
+    def on_tree_open(self, event):
+        """展开浏览器窗口节点时插入其标签页"""
+        self._load_tree_tabs(self.window_listbox.focus())
+
+    def _load_tree_tabs(self, iid):
+        if iid not in self._tree_tabs or iid in self._tree_loaded:
+            return
+        self._tree_loaded.add(iid)
+        task = self._tree_loading[iid] = self._insert_tree_tabs(iid, self._tree_tabs[iid])
+        self._tree_tasks.append(task)
+        if self._tree_after is None:
+            self._tree_after = self.root.after(0, self._pump_tree_tasks)
+
+    def _insert_tree_tabs(self, iid, tabs):
+        tree = self.window_listbox
+        tree.delete(*tree.get_children(iid))
+        icon = self.get_icon_for_type("tab")
+        for tab in tabs:
+            tree.insert(iid, "end", text=tab.get("title", tab.get("url", "")),
+                        values=("tab", tab.get("url", "")), image=icon)
+            yield
+        self._tree_loading.pop(iid, None)
+
+    def _pump_tree_tasks(self):
+        """执行排队的列表更新，每个时间片不超过 TREE_SLICE_SECONDS，剩余部分通过 root.after 继续"""
+        self._tree_after = None
+        deadline = time.perf_counter() + TREE_SLICE_SECONDS
+        tasks = self._tree_tasks
+        while tasks and time.perf_counter() < deadline:
+            try:
+                next(tasks[0])
+            except StopIteration:
+                tasks.popleft()
+        if tasks and self._tree_after is None:
+            self._tree_after = self.root.after(1, self._pump_tree_tasks)
+
+    def _cancel_tree_tasks(self):
+        """
+        取消未完成的列表更新；标签页只插入了一部分的节点恢复为未加载状态。
+
+        返回:
+            其中仍处于展开状态、需要重新加载标签页的节点
+        """
+        if self._tree_after is not None:
+            self.root.after_cancel(self._tree_after)
+            self._tree_after = None
+        self._tree_tasks.clear()
+        tree = self.window_listbox
+        reopen = []
+        for iid in self._tree_loading:
+            if tree.exists(iid):
+                tree.delete(*tree.get_children(iid))
+                self._tree_loaded.discard(iid)
+                self._set_tree_tabs(iid, self._tree_tabs.get(iid))
+                if tree.item(iid, "open"):
+                    reopen.append(iid)
+        self._tree_loading.clear()
+        return reopen
+
+    def _forget_tree_node(self, iid):
+        self._tree_tabs.pop(iid, None)
+        self._tree_loaded.discard(iid)
+        self._tree_loading.pop(iid, None)
+
+    def _clear_window_list(self):
+        children = self.window_listbox.get_children()
+        if children:
+            self.window_listbox.delete(*children)
+        self._tree_rows = {}
+        self._tree_tabs.clear()
+        self._tree_loaded.clear()
 
     def get_icon_for_type(self, item_type):
         """根据项目类型获取图标"""
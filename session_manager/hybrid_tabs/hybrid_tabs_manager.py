@@ -20,7 +20,7 @@ from session_manager.browser_tabs import (
 
 # 导入WebSocket服务器
 from session_manager.hybrid_tabs.websocket_server import (
-    get_latest_tabs,
+    get_tab_store,
     get_server_status,
     run_server_in_thread,
     stop_server
@@ -33,7 +33,15 @@ DEFAULT_WS_CONFIG = {
     "enabled": True,
     "host": "127.0.0.1",
     "port": 8765,
-    "auto_start": True
+    "auto_start": True,
+    "compression": True,
+    "binary_encoding": True,
+    "measure": False,
+    "measure_interval": 60,
+    "coalesce_window": 0.1,
+    "inbound_queue_size": 64,
+    "max_message_bytes": 1048576,
+    "ack_mode": "each"
 }
 
 # 浏览器ID映射
@@ -93,7 +101,7 @@ class HybridTabsManager:
         host = self.ws_config.get("host", "127.0.0.1")
         port = self.ws_config.get("port", 8765)
         
-        success = run_server_in_thread(host, port)
+        success = run_server_in_thread(host, port, self.ws_config)
         if success:
             self.websocket_started = True
             logger.info(f"WebSocket服务器已启动 ({host}:{port})")
@@ -180,11 +188,12 @@ class HybridTabsManager:
             # 获取浏览器ID
             browser_id = BROWSER_ID_MAPPING.get(browser_exe, "unknown")
             
-            # 获取最新的标签页数据
-            tabs_data = get_latest_tabs()
-            if not tabs_data or browser_id not in tabs_data:
+            # 获取最新的标签页数据（只读快照，之后的查找都基于同一个快照）
+            browser = get_tab_store().browser(browser_id)
+            if browser is None:
                 logger.debug(f"WebSocket中未找到浏览器 {browser_id} 的标签页数据")
                 return []
+            windows = browser["windows"]
             
             # 清理窗口标题，去除浏览器后缀
             clean_window_title = window_title
@@ -193,12 +202,13 @@ class HybridTabsManager:
                     clean_window_title = clean_window_title[:-len(suffix)]
                     break
             
-            # 遍历所有窗口，寻找匹配的窗口
+            # 浏览器窗口标题就是活动标签页标题，先按索引精确查找，找不到时再遍历所有窗口计算相似度
             matching_tabs = []
-            best_match_window = None
-            best_match_score = 0
+            best_match_window = browser["active_titles"].get(clean_window_title)
+            best_match_score = 1.0 if best_match_window is not None else 0
+            candidates = windows.items() if best_match_window is None else ()
             
-            for window_id, window_data in tabs_data[browser_id].items():
+            for window_id, window_data in candidates:
                 window_tabs = window_data.get("tabs", [])
                 
                 # 检查是否有标签页标题与窗口标题匹配
@@ -224,8 +234,8 @@ class HybridTabsManager:
                         best_match_window = window_id
             
             # 如果找到匹配的窗口，返回该窗口的所有标签页
-            if best_match_window:
-                window_data = tabs_data[browser_id][best_match_window]
+            if best_match_window is not None:
+                window_data = windows[best_match_window]
                 window_tabs = window_data.get("tabs", [])
                 
                 # 转换为静态方法返回的格式
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+WebSocket 标签页状态存储
+
+WebSocket 服务器在 asyncio 线程中写入标签页，混合标签页管理器在界面或采集线程中读取。
+存储以写时复制方式发布不可变快照：每次更新都构造新的浏览器快照，再替换一次引用（原子操作），
+读取方只读取一次引用，得到的视图始终一致，不需要加锁。写入方之间用锁串行化。
+
+浏览器快照（只读映射）:
+    {
+        "windows": {window_id: 窗口状态},
+        "active_titles": {活动标签页标题: window_id},   # 按活动标签页标题索引窗口
+        "version": 更新次数
+    }
+
+窗口状态（只读映射）:
+    {"tabs": (标签页, ...), "seq": 序号, "timestamp": ISO 时间, "client_id": 客户端, "active_title": 活动标签页标题}
+
+标签页也是只读映射；需要修改时复制为新字典（tab_sync.apply_tab_delta 即如此）。
+"""
+
+import threading
+from datetime import datetime
+from types import MappingProxyType
+
+_EMPTY = MappingProxyType({})
+
+
+def _freeze_tabs(tabs):
+    """标签页列表转为只读映射的元组；已是只读映射的标签页直接复用"""
+    return tuple(tab if isinstance(tab, MappingProxyType) else MappingProxyType(tab)
+                 for tab in tabs if isinstance(tab, (dict, MappingProxyType)))
+
+
+def _active_title(tabs):
+    for tab in tabs:
+        if tab.get("active"):
+            return tab.get("title") or ""
+    return ""
+
+
+class TabStateStore:
+    """标签页和服务器状态的写时复制存储"""
+
+    def __init__(self, status=None):
+        self._write_lock = threading.Lock()
+        self._browsers = _EMPTY
+        self._status = MappingProxyType(dict(status or {}))
+
+    # --- 读取（无锁） ---
+
+    def browsers(self):
+        """所有浏览器的快照 {browser_id: 浏览器快照}"""
+        return self._browsers
+
+    def browser(self, browser_id):
+        """浏览器快照，没有数据时返回 None"""
+        return self._browsers.get(browser_id)
+
+    def window(self, browser_id, window_id):
+        """窗口状态，没有数据时返回 None"""
+        browser = self._browsers.get(browser_id)
+        return browser["windows"].get(window_id) if browser is not None else None
+
+    def find_window_by_active_title(self, browser_id, title):
+        """按活动标签页标题查找窗口，返回 (window_id, 窗口状态)，找不到时返回 (None, None)"""
+        browser = self._browsers.get(browser_id)
+        if browser is None or not title:
+            return None, None
+        window_id = browser["active_titles"].get(title)
+        if window_id is None:
+            return None, None
+        return window_id, browser["windows"][window_id]
+
+    def status(self):
+        """服务器状态快照"""
+        return self._status
+
+    # --- 写入 ---
+
+    def set_window(self, browser_id, window_id, tabs, seq=0, client_id=None):
+        """替换一个窗口的标签页，返回新的窗口状态"""
+        tabs = _freeze_tabs(tabs)
+        state = MappingProxyType({
+            "tabs": tabs,
+            "seq": seq,
+            "timestamp": datetime.now().isoformat(),
+            "client_id": client_id,
+            "active_title": _active_title(tabs)
+        })
+        with self._write_lock:
+            browser = self._browsers.get(browser_id)
+            windows = dict(browser["windows"]) if browser is not None else {}
+            windows[window_id] = state
+            self._publish(browser_id, browser, windows)
+        return state
+
+    def remove_window(self, browser_id, window_id):
+        """删除一个窗口，返回是否存在"""
+        with self._write_lock:
+            browser = self._browsers.get(browser_id)
+            if browser is None or window_id not in browser["windows"]:
+                return False
+            windows = dict(browser["windows"])
+            del windows[window_id]
+            self._publish(browser_id, browser, windows)
+            return True
+
+    def update_status(self, **changes):
+        """合并修改服务器状态"""
+        with self._write_lock:
+            self._status = MappingProxyType({**self._status, **changes})
+
+    def clear(self):
+        with self._write_lock:
+            self._browsers = _EMPTY
+
+    def _publish(self, browser_id, previous, windows):
+        # 调用方持有写锁；先构造完整的新快照，最后一步替换引用
+        snapshot = MappingProxyType({
+            "windows": MappingProxyType(windows),
+            "active_titles": MappingProxyType({state["active_title"]: window_id
+                                               for window_id, state in windows.items()
+                                               if state["active_title"]}),
+            "version": (previous["version"] + 1) if previous is not None else 1
+        })
+        browsers = dict(self._browsers)
+        browsers[browser_id] = snapshot
+        self._browsers = MappingProxyType(browsers)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+标签页增量同步协议
+
+浏览器扩展除了发送完整快照（"tabs" 消息）外，可以只发送变化（"tabs_delta" 消息）:
+
+    {
+        "type": "tabs_delta",
+        "version": 1,
+        "browser_id": "chrome",
+        "window_id": 12,
+        "seq": 43,                   # 该窗口的序号，每条增量加 1
+        "ops": [
+            {"op": "add", "index": 3, "tab": {"id": 901, "url": "...", "title": "...", "active": false}},
+            {"op": "remove", "tab_id": 877},
+            {"op": "update", "tab_id": 880, "changes": {"title": "...", "active": true}},
+            {"op": "move", "tab_id": 880, "index": 0}
+        ]
+    }
+
+标签页按 "id" 识别。快照消息可以带 "seq" 作为之后增量的起点（不带时为 0）。
+服务器发现序号不连续、窗口没有快照或操作无法应用时回复 "resync"，扩展应重新发送该窗口的完整快照。
+"""
+
+PROTOCOL_VERSION = 2
+DELTA_VERSION = 1
+CAPABILITIES = ["tabs", "tabs_delta"]
+
+OP_ADD = "add"
+OP_REMOVE = "remove"
+OP_UPDATE = "update"
+OP_MOVE = "move"
+
+
+class TabDeltaError(ValueError):
+    """增量无法应用到当前快照，需要重新同步"""
+
+
+def _find(tabs, tab_id):
+    for index, tab in enumerate(tabs):
+        if tab.get("id") == tab_id:
+            return index
+    raise TabDeltaError(f"标签页 {tab_id} 不存在")
+
+
+def _clamp(index, length):
+    if not isinstance(index, int):
+        return length
+    return max(0, min(index, length))
+
+
+def apply_tab_delta(tabs, ops):
+    """
+    把增量操作依次应用到标签页列表。
+
+    返回:
+        新的标签页列表；原列表和其中的标签页字典不会被修改（被更新的标签页替换为新字典）
+
+    异常:
+        TabDeltaError: 操作类型未知、标签页不存在或新增的标签页 id 重复
+    """
+    result = list(tabs)
+    for op in ops:
+        if not isinstance(op, dict):
+            raise TabDeltaError(f"无效的增量操作: {op!r}")
+        kind = op.get("op")
+        if kind == OP_ADD:
+            tab = op.get("tab")
+            if not isinstance(tab, dict):
+                raise TabDeltaError("add 操作缺少 tab")
+            if tab.get("id") is not None and any(t.get("id") == tab["id"] for t in result):
+                raise TabDeltaError(f"标签页 {tab['id']} 已存在")
+            result.insert(_clamp(op.get("index"), len(result)), dict(tab))
+        elif kind == OP_REMOVE:
+            del result[_find(result, op.get("tab_id"))]
+        elif kind == OP_UPDATE:
+            index = _find(result, op.get("tab_id"))
+            changes = op.get("changes") or {}
+            if not isinstance(changes, dict):
+                raise TabDeltaError("update 操作的 changes 不是对象")
+            result[index] = {**result[index], **changes}
+        elif kind == OP_MOVE:
+            tab = result.pop(_find(result, op.get("tab_id")))
+            result.insert(_clamp(op.get("index"), len(result)), tab)
+        else:
+            raise TabDeltaError(f"未知的增量操作: {kind}")
+    return result
+
+
+def check_delta(window_state, message):
+    """
+    检查增量消息能否应用到窗口的当前状态。
+
+    返回:
+        None 表示可以应用，否则返回需要重新同步的原因
+    """
+    version = message.get("version", DELTA_VERSION)
+    if version != DELTA_VERSION:
+        return f"不支持的增量版本 {version}"
+    if window_state is None:
+        return "没有该窗口的快照"
+    seq = message.get("seq")
+    expected = window_state.get("seq", 0) + 1
+    if seq != expected:
+        return f"序号不连续（期望 {expected}，收到 {seq}）"
+    return None
@@ -5,7 +5,6 @@ WebSocket服务器适配器 - 用于接收浏览器扩展发送的标签页数
 """
 
 import asyncio
-import json
 import logging
 import os
 import signal
@@ -16,127 +15,402 @@ from datetime import datetime
 
 import websockets
 
+from session_manager.hybrid_tabs.tab_sync import (
+    PROTOCOL_VERSION,
+    CAPABILITIES,
+    TabDeltaError,
+    apply_tab_delta,
+    check_delta
+)
+from session_manager.hybrid_tabs.tab_store import TabStateStore
+from session_manager.hybrid_tabs.wire import (
+    ENCODING_JSON,
+    ENCODING_COMPACT,
+    WireStats,
+    decode_message,
+    encode_message
+)
+
 logger = logging.getLogger(__name__)
 
 # 存储所有连接的客户端
 connected_clients = set()
-# 存储最新的标签页数据
-latest_tabs_data = {}
 # 服务器实例
 server_instance = None
-# 服务器状态
-server_status = {
+# 最新的标签页数据和服务器状态（写时复制，其他线程可无锁读取）
+tab_store = TabStateStore(status={
     "running": False,
     "start_time": None,
     "host": "127.0.0.1",
     "port": 8765,
     "client_count": 0,
-    "last_message_time": None
+    "last_message_time": None,
+    "messages_received": 0,
+    "messages_coalesced": 0
+})
+# 服务器选项（见配置参考 websocket 部分），由 start_server 设置
+server_options = {
+    "compression": True,
+    "binary_encoding": True,
+    "measure": False,
+    "measure_interval": 60,
+    "coalesce_window": 0.1,
+    "inbound_queue_size": 64,
+    "max_message_bytes": 1048576,
+    "ack_mode": "each"
 }
+# ack_mode 的取值：每条消息确认 / 每批一条 tabs_ack / 不确认（resync 和心跳总是回复）
+ACK_EACH = "each"
+ACK_BATCH = "batch"
+ACK_NONE = "none"
+# 测量模式下的流量统计
+wire_stats = None
+
+def _invalid_field(data):
+    """标签页消息的字段类型错误时返回原因（tabs、ops 必须是列表，seq 必须是整数）"""
+    seq = data.get("seq", 0 if data.get("type") == "tabs" else None)
+    if not isinstance(seq, int) or isinstance(seq, bool):
+        return f"seq 不是整数: {seq!r}"
+    field = "tabs" if data.get("type") == "tabs" else "ops"
+    if not isinstance(data.get(field, []), list):
+        return f"{field} 不是列表"
+    return None
+
+def _resync(browser_id, window_id, reason):
+    return {
+        "type": "resync",
+        "browser_id": browser_id,
+        "window_id": window_id,
+        "reason": reason,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def apply_window_updates(browser_id, window_id, messages, client_id):
+    """
+    把同一窗口的一组快照（"tabs"）和增量（"tabs_delta"，格式见 tab_sync）依次应用到窗口的当前状态，
+    最后只发布一次新状态。
+
+    字段类型错误的快照被跳过并返回 resync，之后的消息照常处理。
+    增量的序号不连续、字段类型错误或无法应用时，之前的结果照常保存，该增量和之后的消息被丢弃，
+    返回 resync 请求扩展重新发送快照。
+
+    返回:
+        每条已处理消息的回复列表（tabs_received、tabs_delta_received 或最后一条 resync）
+    """
+    # 增量只在事件循环线程中处理，读取和写入之间窗口状态不会被其他消息修改
+    window_state = tab_store.window(browser_id, window_id)
+    tabs = window_state["tabs"] if window_state is not None else None
+    seq = window_state["seq"] if window_state is not None else 0
+    replies = []
+    changed = False
+    
+    for data in messages:
+        invalid = _invalid_field(data)
+        if data.get("type") == "tabs":
+            if invalid is not None:
+                logger.warning("跳过 %s 窗口 %s 的无效快照: %s", browser_id, window_id, invalid)
+                replies.append(_resync(browser_id, window_id, invalid))
+                continue
+            tabs = data.get("tabs", [])
+            seq = data.get("seq", 0)
+            changed = True
+            logger.debug("已更新 %s 的 %s 个标签页", browser_id, len(tabs))
+            replies.append({
+                "type": "tabs_received",
+                "count": len(tabs),
+                "seq": seq,
+                "timestamp": datetime.now().isoformat()
+            })
+            continue
+        
+        reason = invalid or check_delta({"seq": seq} if tabs is not None else None, data)
+        if reason is None:
+            try:
+                tabs = apply_tab_delta(tabs, data.get("ops", []))
+            except TabDeltaError as e:
+                reason = str(e)
+        if reason is not None:
+            logger.info("要求 %s 重新同步 %s 窗口 %s: %s", client_id, browser_id, window_id, reason)
+            replies.append(_resync(browser_id, window_id, reason))
+            break
+        seq = data["seq"]
+        changed = True
+        logger.debug("已应用 %s 窗口 %s 的 %s 个增量操作（序号 %s）", browser_id, window_id, len(data.get("ops", [])), seq)
+        replies.append({
+            "type": "tabs_delta_received",
+            "browser_id": browser_id,
+            "window_id": window_id,
+            "seq": seq,
+            "count": len(tabs),
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    if changed:
+        tab_store.set_window(browser_id, window_id, tabs, seq, client_id)
+    return replies
+
+def handle_tabs_snapshot(data, client_id):
+    """处理完整快照消息（"tabs"），返回确认消息"""
+    return apply_window_updates(data.get("browser_id", "unknown"), data.get("window_id", "unknown"),
+                                [{**data, "type": "tabs"}], client_id)[0]
+
+def handle_tabs_delta(data, client_id):
+    """
+    处理增量消息（"tabs_delta"，格式见 tab_sync）。
+    序号连续时应用到窗口的当前快照并返回确认；否则不修改快照，返回 resync 请求扩展重新发送快照。
+    """
+    return apply_window_updates(data.get("browser_id", "unknown"), data.get("window_id", "unknown"),
+                                [{**data, "type": "tabs_delta"}], client_id)[0]
+
+def _message_type(message):
+    return message.get("type", "unknown") if isinstance(message, dict) else "unknown"
+
+def _decode(frame, client_id):
+    """解码收到的帧；测量模式下记录字节数和解码耗时"""
+    if wire_stats is None:
+        return decode_message(frame, server_options["max_message_bytes"])
+    started = time.perf_counter()
+    data, encoding = decode_message(frame, server_options["max_message_bytes"])
+    wire_stats.record(client_id, "in", _message_type(data), encoding, frame, time.perf_counter() - started)
+    return data, encoding
+
+async def _send(websocket, message, encoding, client_id):
+    """按客户端使用的编码发送消息；测量模式下记录字节数和编码耗时"""
+    if wire_stats is None:
+        await websocket.send(encode_message(message, encoding))
+        return
+    started = time.perf_counter()
+    frame = encode_message(message, encoding)
+    wire_stats.record(client_id, "out", _message_type(message), encoding, frame, time.perf_counter() - started)
+    await websocket.send(frame)
+
+async def _report_wire_stats(interval):
+    """测量模式下定期把流量统计写入日志"""
+    while True:
+        await asyncio.sleep(interval)
+        if wire_stats.entries:
+            logger.info("WebSocket 流量统计:\n%s", wire_stats.report())
+
+class _ClientState:
+    """一个连接的处理状态"""
+    
+    def __init__(self, websocket, client_id):
+        self.websocket = websocket
+        self.client_id = client_id
+        # 回复使用客户端最近一条消息的编码，欢迎消息总是 JSON
+        self.encoding = ENCODING_JSON
+        self.closed = False
+    
+    async def send(self, message):
+        if not self.closed:
+            await _send(self.websocket, message, self.encoding, self.client_id)
+
+async def _handle_batch(client, frames):
+    """
+    处理一批消息：同一窗口的快照只保留最后一个（之前的快照和增量被它取代），
+    每个窗口的更新合并后只发布一次，再按 ack_mode 回复。
+
+    ack_mode 为 each 时每条消息都要确认，不丢弃被取代的消息，仍依次应用后只发布一次。
+    """
+    ack_mode = server_options["ack_mode"]
+    pending = {}
+    heartbeats = 0
+    coalesced = 0
+    for frame in frames:
+        try:
+            data, message_encoding = _decode(frame, client.client_id)
+        except ValueError:
+            # JSON 或紧凑格式无效
+            logger.error(f"无法解析消息: {frame[:200]!r}")
+            continue
+        if message_encoding == ENCODING_COMPACT and not server_options["binary_encoding"]:
+            logger.warning("客户端 %s 发送了二进制消息，但未启用 binary_encoding", client.client_id)
+            continue
+        if not isinstance(data, dict):
+            logger.warning(f"收到无效的消息: {data!r}")
+            continue
+        client.encoding = message_encoding
+        message_type = data.get("type")
+        logger.debug("收到来自 %s 的消息: %s", client.client_id, message_type)
+        
+        if message_type in ("tabs", "tabs_delta"):
+            key = (data.get("browser_id", "unknown"), data.get("window_id", "unknown"))
+            if not all(isinstance(part, (str, int)) for part in key):
+                logger.warning("收到 browser_id 或 window_id 无效的消息: %r", key)
+                continue
+            if message_type == "tabs" and key in pending and ack_mode != ACK_EACH:
+                coalesced += len(pending[key])
+                pending[key] = [data]
+            else:
+                pending.setdefault(key, []).append(data)
+        elif message_type == "heartbeat":
+            heartbeats += 1
+        else:
+            # 处理未知类型的消息
+            logger.warning(f"收到未知类型的消息: {data}")
+    
+    tab_store.update_status(
+        last_message_time=datetime.now().isoformat(),
+        messages_received=tab_store.status()["messages_received"] + len(frames),
+        messages_coalesced=tab_store.status()["messages_coalesced"] + coalesced
+    )
+    
+    acked_windows = []
+    for (browser_id, window_id), messages in pending.items():
+        try:
+            replies = apply_window_updates(browser_id, window_id, messages, client.client_id)
+        except Exception as e:
+            # 一个窗口的消息出错不影响同一批中的其他窗口
+            logger.error("处理 %s 窗口 %s 的消息时出错: %s", browser_id, window_id, e, exc_info=True)
+            replies = [_resync(browser_id, window_id, f"服务器处理消息出错: {e}")]
+        for reply in replies:
+            if reply["type"] == "resync" or ack_mode == ACK_EACH:
+                await client.send(reply)
+        saved = [reply for reply in replies if reply["type"] != "resync"]
+        if saved:
+            last = saved[-1]
+            acked_windows.append({"browser_id": browser_id, "window_id": window_id,
+                                  "seq": last["seq"], "count": last["count"]})
+    if ack_mode == ACK_BATCH and acked_windows:
+        await client.send({
+            "type": "tabs_ack",
+            "windows": acked_windows,
+            "messages": len(frames),
+            "timestamp": datetime.now().isoformat()
+        })
+    for _ in range(heartbeats):
+        await client.send({
+            "type": "heartbeat_ack",
+            "timestamp": datetime.now().isoformat()
+        })
+
+async def _process_messages(client, queue):
+    """
+    从入站队列中取出消息处理。收到一条消息后等待 coalesce_window 秒，把这段时间内到达的消息作为一批处理；
+    收到 None 时结束。
+    """
+    while True:
+        frame = await queue.get()
+        if frame is None:
+            return
+        if server_options["coalesce_window"] > 0:
+            await asyncio.sleep(server_options["coalesce_window"])
+        frames = [frame]
+        finished = False
+        while not queue.empty():
+            frame = queue.get_nowait()
+            if frame is None:
+                finished = True
+                break
+            frames.append(frame)
+        try:
+            await _handle_batch(client, frames)
+        except websockets.exceptions.ConnectionClosed:
+            # 连接已关闭，继续取出队列中剩余的消息直到结束，使接收端不会阻塞在已满的队列上
+            client.closed = True
+        except Exception as e:
+            logger.error(f"处理消息时出错: {e}")
+        if finished:
+            return
 
 async def handle_client(websocket, path):
-    """处理WebSocket客户端连接"""
+    """
+    处理WebSocket客户端连接
+    
+    接收到的消息放入有界队列，由单独的任务合并处理。队列满时停止读取连接，
+    扩展的发送因 TCP 流量控制而变慢，内存占用不会随消息积压增长。
+    """
     client_id = f"client_{len(connected_clients) + 1}"
     logger.info(f"客户端 {client_id} 已连接")
     
     # 添加到连接集合
     connected_clients.add(websocket)
-    server_status["client_count"] = len(connected_clients)
+    tab_store.update_status(client_count=len(connected_clients))
+    client = _ClientState(websocket, client_id)
+    capabilities = CAPABILITIES + (["compact_binary"] if server_options["binary_encoding"] else [])
+    queue = asyncio.Queue(maxsize=max(1, server_options["inbound_queue_size"]))
+    processor = None
     
     try:
         # 发送欢迎消息
-        await websocket.send(json.dumps({
+        await client.send({
             "type": "welcome",
             "message": "已连接到Windows会话管理器标签页监控服务器",
             "client_id": client_id,
+            "protocol_version": PROTOCOL_VERSION,
+            "capabilities": capabilities,
+            "ack_mode": server_options["ack_mode"],
             "timestamp": datetime.now().isoformat()
-        }))
+        })
         
         # 处理来自客户端的消息
+        processor = asyncio.create_task(_process_messages(client, queue))
         async for message in websocket:
-            try:
-                data = json.loads(message)
-                logger.debug(f"收到来自 {client_id} 的消息: {data['type'] if 'type' in data else 'unknown'}")
-                server_status["last_message_time"] = datetime.now().isoformat()
-                
-                # 处理不同类型的消息
-                if data.get("type") == "tabs":
-                    # 处理标签页数据
-                    browser_id = data.get("browser_id", "unknown")
-                    window_id = data.get("window_id", "unknown")
-                    tabs = data.get("tabs", [])
-                    
-                    # 更新存储的标签页数据
-                    if browser_id not in latest_tabs_data:
-                        latest_tabs_data[browser_id] = {}
-                    
-                    latest_tabs_data[browser_id][window_id] = {
-                        "tabs": tabs,
-                        "timestamp": datetime.now().isoformat(),
-                        "client_id": client_id
-                    }
-                    
-                    logger.debug(f"已更新 {browser_id} 的 {len(tabs)} 个标签页")
-                    
-                    # 发送确认消息
-                    await websocket.send(json.dumps({
-                        "type": "tabs_received",
-                        "count": len(tabs),
-                        "timestamp": datetime.now().isoformat()
-                    }))
-                    
-                elif data.get("type") == "heartbeat":
-                    # 处理心跳消息
-                    await websocket.send(json.dumps({
-                        "type": "heartbeat_ack",
-                        "timestamp": datetime.now().isoformat()
-                    }))
-                    
-                else:
-                    # 处理未知类型的消息
-                    logger.warning(f"收到未知类型的消息: {data}")
-                    
-            except json.JSONDecodeError:
-                logger.error(f"无法解析JSON消息: {message}")
-            except Exception as e:
-                logger.error(f"处理消息时出错: {e}")
+            await queue.put(message)
                 
     except websockets.exceptions.ConnectionClosed:
         logger.info(f"客户端 {client_id} 连接已关闭")
     except Exception as e:
         logger.error(f"处理客户端 {client_id} 时出错: {e}")
     finally:
+        if processor is not None:
+            # 处理完已接收的消息后结束
+            await queue.put(None)
+            await processor
         # 从连接集合中移除
         connected_clients.remove(websocket)
-        server_status["client_count"] = len(connected_clients)
+        tab_store.update_status(client_count=len(connected_clients))
+        if wire_stats is not None:
+            wire_stats.forget_client(client_id)
         logger.info(f"客户端 {client_id} 已断开连接")
 
 def get_latest_tabs():
-    """获取最新的标签页数据"""
-    return latest_tabs_data
+    """获取最新的标签页数据 {browser_id: {window_id: 窗口状态}}（只读快照）"""
+    return {browser_id: browser["windows"] for browser_id, browser in tab_store.browsers().items()}
+
+def get_tab_store():
+    """标签页状态存储（见 tab_store）"""
+    return tab_store
 
 def get_server_status():
-    """获取服务器状态"""
-    return server_status
+    """获取服务器状态（只读快照）"""
+    return tab_store.status()
+
+def get_wire_stats():
+    """测量模式下返回流量统计报告文本，未启用时返回 None"""
+    return wire_stats.report() if wire_stats is not None else None
 
 async def broadcast_message(message):
     """向所有连接的客户端广播消息"""
     if connected_clients:
         await asyncio.gather(
-            *[client.send(json.dumps(message)) for client in connected_clients]
+            *[client.send(encode_message(message)) for client in connected_clients]
         )
 
-async def start_server(host='127.0.0.1', port=8765):
-    """启动WebSocket服务器"""
-    global server_instance, server_status
+async def start_server(host='127.0.0.1', port=8765, options=None):
+    """
+    启动WebSocket服务器
+    
+    参数:
+        options: 服务器选项（compression、binary_encoding、measure、measure_interval），未给出的使用默认值
+    """
+    global server_instance, wire_stats
+    
+    server_options.update({key: value for key, value in (options or {}).items() if key in server_options})
+    # permessage-deflate：标签页列表中重复的 URL 和标题压缩效果很好
+    compression = "deflate" if server_options["compression"] else None
+    if server_options["measure"]:
+        wire_stats = WireStats(compression=compression is not None)
+        asyncio.create_task(_report_wire_stats(server_options["measure_interval"]))
     
-    server_instance = await websockets.serve(handle_client, host, port)
-    server_status["running"] = True
-    server_status["start_time"] = datetime.now().isoformat()
-    server_status["host"] = host
-    server_status["port"] = port
+    # max_queue 限制 websockets 自身缓冲的帧数，与入站队列一起限制每个连接积压的消息
+    server_instance = await websockets.serve(handle_client, host, port, compression=compression,
+                                             max_size=server_options["max_message_bytes"],
+                                             max_queue=max(1, server_options["inbound_queue_size"]))
+    tab_store.update_status(running=True, start_time=datetime.now().isoformat(), host=host, port=port)
     
-    logger.info(f"WebSocket服务器已启动，监听 {host}:{port}")
+    logger.info(f"WebSocket服务器已启动，监听 {host}:{port}（压缩: {compression or '无'}，"
+                f"二进制编码: {'启用' if server_options['binary_encoding'] else '禁用'}）")
     
     # 设置信号处理
     loop = asyncio.get_running_loop()
@@ -151,21 +425,23 @@ async def start_server(host='127.0.0.1', port=8765):
 
 async def shutdown():
     """关闭服务器"""
-    global server_instance, server_status
+    global server_instance
     
     if server_instance:
         logger.info("正在关闭WebSocket服务器...")
         server_instance.close()
         await server_instance.wait_closed()
         server_instance = None
-        server_status["running"] = False
+        tab_store.update_status(running=False)
+        if wire_stats is not None and wire_stats.entries:
+            logger.info("WebSocket 流量统计:\n%s", wire_stats.report())
         logger.info("WebSocket服务器已关闭")
 
-def run_server_in_thread(host='127.0.0.1', port=8765):
+def run_server_in_thread(host='127.0.0.1', port=8765, options=None):
     """在后台线程中运行WebSocket服务器"""
     def _run_server():
         try:
-            asyncio.run(start_server(host, port))
+            asyncio.run(start_server(host, port, options))
         except Exception as e:
             logger.error(f"运行WebSocket服务器时出错: {e}")
     
@@ -174,17 +450,17 @@ def run_server_in_thread(host='127.0.0.1', port=8765):
     
     # 等待服务器启动
     for _ in range(10):  # 最多等待5秒
-        if server_status["running"]:
+        if tab_store.status()["running"]:
             logger.info(f"WebSocket服务器已在后台启动 ({host}:{port})")
             return True
         time.sleep(0.5)
     
     logger.warning("WebSocket服务器可能未能正常启动")
-    return server_status["running"]
+    return tab_store.status()["running"]
 
 def stop_server():
     """停止WebSocket服务器"""
-    if not server_status["running"]:
+    if not tab_store.status()["running"]:
         return
     
     try:
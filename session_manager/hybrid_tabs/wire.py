@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+WebSocket 消息编码与流量统计
+
+消息有两种编码:
+- json: 文本帧，紧凑 JSON（默认，兼容旧扩展）
+- compact: 二进制帧，使用会话存储的紧凑二进制格式（storage.compact_format，不做 lz4 压缩）。
+  字段名、URL 前缀等重复字符串只保存一次，大小约为 JSON 的一半。压缩交给 permessage-deflate；
+  启用压缩时 JSON 的压缩结果通常更小，二进制编码主要用于扩展不支持压缩的情况
+
+服务器按扩展最近一条消息使用的编码回复；欢迎消息的 capabilities 中包含 "compact_binary" 时扩展才应使用二进制帧。
+
+二进制帧来自本机未认证的连接，不使用读取可信会话文件的 compact_format.loads，而由 _WireDecoder 解码：
+不接受 lz4 压缩，并按 max_message_bytes 限制解码出的元素数、字符串字节数和嵌套深度
+（标签页表项可以引用之前的表项，不加限制时很小的帧也能展开成指数级的数据）。
+
+测量模式下 WireStats 按消息类型统计条数、编码后字节数、估算的线路字节数（启用 permessage-deflate 时
+用同样的 deflate 参数估算压缩后的大小，并加上帧头）以及编码/解码耗时。
+"""
+
+import json
+import struct
+import zlib
+
+from session_manager.storage import compact_format
+from session_manager.storage.compact_format import CompactFormatError
+
+ENCODING_JSON = "json"
+ENCODING_COMPACT = "compact"
+
+# 与 websocket.max_message_bytes 的默认值相同
+DEFAULT_MAX_MESSAGE_BYTES = 1048576
+# 标签页消息的嵌套很浅，超过此深度的二进制消息视为无效
+MAX_DEPTH = 32
+
+
+class _WireDecoder(compact_format._Decoder):
+    """
+    有上限的紧凑格式解码器。
+
+    元素数上限为 max_bytes // 2（同样内容的 JSON 每个元素至少两个字节），字符串总字节数上限为 max_bytes，
+    即解码结果不会大于一条最大的 JSON 消息。引用标签页表项时按该表项的大小计数。
+    """
+
+    def __init__(self, data, max_bytes):
+        super().__init__(data)
+        self.max_elements = max(1, max_bytes // 2)
+        self.max_string_bytes = max_bytes
+        self.elements = 0
+        self.string_bytes = 0
+        self.depth = 0
+        self.max_entry_depth = 0
+        # 标签页表项的 (元素数, 字符串字节数, 深度)
+        self.tab_costs = []
+
+    def _charge(self, elements, string_bytes):
+        self.elements += elements
+        self.string_bytes += string_bytes
+        if self.elements > self.max_elements:
+            raise CompactFormatError(f"消息解码后超过 {self.max_elements} 个元素")
+        if self.string_bytes > self.max_string_bytes:
+            raise CompactFormatError(f"消息解码后的字符串超过 {self.max_string_bytes} 字节")
+
+    def tables(self):
+        for _ in range(self.varint()):
+            length = self.varint()
+            self.strings.append(bytes(self.data[self.pos:self.pos + length]).decode('utf-8'))
+            self.pos += length
+        for _ in range(self.varint()):
+            self.shapes.append(tuple(self.strings[self.varint()] for _ in range(self.varint())))
+        for _ in range(self.varint()):
+            elements, string_bytes = self.elements, self.string_bytes
+            self.max_entry_depth = 0
+            self.tab_table.append(self.value())
+            self.tab_costs.append((self.elements - elements, self.string_bytes - string_bytes,
+                                   self.max_entry_depth))
+
+    def value(self):
+        self.depth += 1
+        try:
+            if self.depth > MAX_DEPTH:
+                raise CompactFormatError(f"消息嵌套超过 {MAX_DEPTH} 层")
+            self.max_entry_depth = max(self.max_entry_depth, self.depth)
+            self._charge(1, 0)
+            if self.data[self.pos] == compact_format.TAG_TAB_LIST:
+                self.pos += 1
+                result = []
+                for _ in range(self.varint()):
+                    index = self.varint()
+                    elements, string_bytes, depth = self.tab_costs[index]
+                    if self.depth + depth > MAX_DEPTH:
+                        raise CompactFormatError(f"消息嵌套超过 {MAX_DEPTH} 层")
+                    self.max_entry_depth = max(self.max_entry_depth, self.depth + depth)
+                    self._charge(elements, string_bytes)
+                    result.append(compact_format._copy(self.tab_table[index]))
+                return result
+            result = super().value()
+            if isinstance(result, str):
+                self._charge(0, len(result))
+            return result
+        finally:
+            self.depth -= 1
+
+
+def _loads_compact(frame, max_bytes):
+    header = len(compact_format.MAGIC) + 2
+    if len(frame) < header:
+        raise CompactFormatError("缺少紧凑格式消息头")
+    version, flags = frame[header - 2], frame[header - 1]
+    if version > compact_format.FORMAT_VERSION:
+        raise CompactFormatError(f"不支持的紧凑格式版本: {version}")
+    if flags & compact_format.FLAG_LZ4:
+        # 解压后的大小由发送方声明，不能信任；消息压缩交给 permessage-deflate
+        raise CompactFormatError("消息不能使用 lz4 压缩")
+    decoder = _WireDecoder(memoryview(frame)[header:], max_bytes)
+    try:
+        decoder.tables()
+        return decoder.value()
+    except CompactFormatError:
+        raise
+    except (IndexError, KeyError, TypeError, ValueError, struct.error, RecursionError) as e:
+        raise CompactFormatError(f"紧凑格式消息已损坏: {type(e).__name__}: {e}") from e
+
+
+def decode_message(frame, max_bytes=DEFAULT_MAX_MESSAGE_BYTES):
+    """
+    解码一帧消息。
+
+    参数:
+        max_bytes: 紧凑格式消息解码结果的大小上限（见 _WireDecoder）
+
+    返回:
+        (消息字典, 编码)
+
+    异常:
+        ValueError: 不是有效的 JSON 或紧凑格式（json.JSONDecodeError、CompactFormatError 都是其子类）
+    """
+    if isinstance(frame, (bytes, bytearray, memoryview)):
+        frame = bytes(frame)
+        if compact_format.is_compact(frame):
+            return _loads_compact(frame, max_bytes), ENCODING_COMPACT
+        frame = frame.decode('utf-8')
+    try:
+        return json.loads(frame), ENCODING_JSON
+    except RecursionError as e:
+        raise ValueError("JSON 消息嵌套过深") from e
+
+
+def encode_message(message, encoding=ENCODING_JSON):
+    """编码消息：json 返回 str（文本帧），compact 返回 bytes（二进制帧）"""
+    if encoding == ENCODING_COMPACT:
+        return compact_format.dumps(message, compress=False)
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+
+def _frame_header_size(length, masked):
+    header = 2 if length < 126 else 4 if length < 65536 else 10
+    return header + (4 if masked else 0)
+
+
+class WireStats:
+    """
+    按 (方向, 消息类型, 编码) 统计流量和编解码耗时。
+
+    compression 为 True 时为每个客户端的每个方向维护一个 deflate 压缩器（与 permessage-deflate
+    的上下文接管方式相同），估算压缩后的线路字节数。
+    """
+
+    def __init__(self, compression=True):
+        self.compression = compression
+        self.entries = {}
+        self._compressors = {}
+
+    def record(self, client_id, direction, msg_type, encoding, payload, seconds):
+        data = payload.encode('utf-8') if isinstance(payload, str) else payload
+        size = len(data)
+        wire = size
+        if self.compression:
+            key = (client_id, direction)
+            compressor = self._compressors.get(key)
+            if compressor is None:
+                compressor = self._compressors[key] = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            # permessage-deflate 去掉同步刷新末尾的 00 00 ff ff
+            wire = len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+        # 客户端发往服务器的帧带 4 字节掩码
+        wire += _frame_header_size(wire, masked=direction == "in")
+
+        entry = self.entries.setdefault((direction, msg_type, encoding),
+                                        {"count": 0, "bytes": 0, "wire_bytes": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["bytes"] += size
+        entry["wire_bytes"] += wire
+        entry["seconds"] += seconds
+
+    def forget_client(self, client_id):
+        for direction in ("in", "out"):
+            self._compressors.pop((client_id, direction), None)
+
+    def report(self):
+        """统计报告文本，每种消息一行"""
+        lines = [f"{'方向':<4}{'消息类型':<22}{'编码':<9}{'条数':>7}{'平均字节':>10}{'平均线路字节':>12}{'平均编解码(us)':>14}"]
+        for (direction, msg_type, encoding), entry in sorted(self.entries.items()):
+            count = entry["count"]
+            lines.append(f"{'收' if direction == 'in' else '发':<4}{msg_type:<22}{encoding:<9}{count:>7}"
+                         f"{entry['bytes'] / count:>10.0f}{entry['wire_bytes'] / count:>12.0f}"
+                         f"{entry['seconds'] / count * 1e6:>14.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,379 @@
+"""
+launcher.py
+并发应用启动器：按并发上限启动应用，通过检测进程/窗口出现判断启动完成，
+取代固定的 time.sleep 等待。
+"""
+
+import os
+import time
+import difflib
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psutil
+import pygetwindow as gw
+import win32gui
+import win32process
+
+logger = logging.getLogger(__name__)
+
+# 默认并发启动数量
+DEFAULT_CONCURRENCY = 4
+# 默认单个应用的就绪等待超时（秒）
+DEFAULT_READY_TIMEOUT = 5
+# 就绪检测轮询间隔（秒）
+DEFAULT_POLL_INTERVAL = 0.1
+
+# 启动结果状态
+STATUS_ALREADY_RUNNING = "already_running"
+STATUS_READY = "ready"
+STATUS_TIMEOUT = "timeout"
+STATUS_EXITED = "exited"
+STATUS_FAILED = "failed"
+STATUS_INVALID_PATH = "invalid_path"
+STATUS_CANCELLED = "cancelled"
+
+
+def snapshot_running_apps():
+    """
+    一次性采集当前窗口标题和运行中的进程，供所有应用的"是否已运行"判断复用，
+    避免每个应用都重新枚举一遍窗口和进程。
+    """
+    titles = []
+    try:
+        for window in gw.getAllWindows():
+            if window.title:
+                titles.append(window.title.lower())
+    except Exception as e:
+        logger.debug("枚举窗口标题失败: %s", e)
+
+    exes = set()
+    names = set()
+    for proc in psutil.process_iter(['exe', 'name']):
+        try:
+            if proc.info.get('exe'):
+                exes.add(os.path.normcase(proc.info['exe']))
+            if proc.info.get('name'):
+                names.add(proc.info['name'].lower())
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+
+    return {"titles": titles, "exes": exes, "names": names}
+
+
+def is_app_running(app_data, snapshot, threshold=0.7):
+    """根据运行快照判断应用是否已在运行，返回匹配原因或 None"""
+    app_title = app_data.get("title", "").lower()
+    app_path = app_data.get("process_path", "")
+
+    # 1. 通过标题相似度匹配
+    if app_title:
+        for title in snapshot["titles"]:
+            similarity = difflib.SequenceMatcher(None, title, app_title).ratio()
+            if similarity >= threshold:
+                logger.info("应用已在运行: '%s' (相似度: %.2f)", title, similarity)
+                return "title"
+
+    # 2. 通过进程路径匹配
+    if app_path and os.path.normcase(app_path) in snapshot["exes"]:
+        logger.info("应用进程已在运行: %s", app_path)
+        return "process_path"
+
+    # 3. 对于特殊应用，检查进程名
+    if app_data.get("special_app", False) and app_path:
+        if os.path.basename(app_path).lower() in snapshot["names"]:
+            logger.info("特殊应用进程已在运行: %s", os.path.basename(app_path))
+            return "process_name"
+
+    return None
+
+
+def find_process_windows(pids):
+    """返回属于指定进程集合的可见且有标题的顶层窗口句柄"""
+    found = []
+
+    def _callback(hwnd, _):
+        try:
+            if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
+                _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                if pid in pids:
+                    found.append(hwnd)
+        except Exception:
+            pass
+        return True
+
+    try:
+        win32gui.EnumWindows(_callback, None)
+    except Exception as e:
+        logger.debug("枚举窗口失败: %s", e)
+    return found
+
+
+def find_pids_by_exe(app_path):
+    """按可执行文件路径查找进程，用于处理启动后立即退出的引导进程"""
+    target = os.path.normcase(app_path)
+    pids = set()
+    for proc in psutil.process_iter(['pid', 'exe']):
+        try:
+            if proc.info.get('exe') and os.path.normcase(proc.info['exe']) == target:
+                pids.add(proc.info['pid'])
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+    return pids
+
+
+def _process_tree_pids(pid):
+    """返回进程及其所有子进程的PID集合"""
+    pids = {pid}
+    try:
+        for child in psutil.Process(pid).children(recursive=True):
+            pids.add(child.pid)
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        pass
+    return pids
+
+
+def _elapsed_ms(start, end):
+    return round((end - start) * 1000, 1)
+
+
+class AppLauncher:
+    """按并发上限启动应用，并通过进程/窗口出现判断应用已就绪"""
+
+    def __init__(self, config, max_workers=None, timeout=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        advanced = config.get("advanced", {})
+        self.config = config
+        self.max_workers = max(1, int(max_workers or advanced.get("restore_concurrency", DEFAULT_CONCURRENCY)))
+        if timeout is None:
+            timeout = advanced.get("window_detection_timeout", DEFAULT_READY_TIMEOUT)
+        self.timeout = float(timeout)
+        self.poll_interval = poll_interval
+        self.title_threshold = config.get("window_title_similarity_threshold", 0.7)
+
+    def wait_until_ready(self, process, app_path, background=False, cancel_event=None):
+        """
+        等待应用就绪：出现属于该进程（或其子进程）的可见窗口即视为就绪；
+        后台应用只要进程存活即视为就绪。
+
+        返回:
+            (状态, 就绪依据) 元组，就绪依据为 "window"、"process" 或 None
+        """
+        deadline = time.perf_counter() + self.timeout
+        exited_pids = None
+
+        while True:
+            if process.poll() is None:
+                pids = _process_tree_pids(process.pid)
+            else:
+                # 引导进程已退出，改为按路径查找真正的应用进程
+                if exited_pids is None or not exited_pids:
+                    exited_pids = find_pids_by_exe(app_path)
+                pids = exited_pids
+
+            if pids:
+                if background:
+                    return STATUS_READY, "process"
+                if find_process_windows(pids):
+                    return STATUS_READY, "window"
+
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            if time.perf_counter() >= deadline:
+                break
+            time.sleep(self.poll_interval)
+
+        if process.poll() is not None and not find_pids_by_exe(app_path):
+            return STATUS_EXITED, None
+        return STATUS_TIMEOUT, None
+
+    def launch(self, app_data, snapshot=None, queued_at=None, cancel_event=None):
+        """
+        启动单个应用并等待其就绪。
+
+        返回:
+            包含启动状态与耗时明细（毫秒）的字典
+        """
+        started_at = time.perf_counter()
+        if queued_at is None:
+            queued_at = started_at
+
+        app_title = app_data.get("title", "")
+        app_path = app_data.get("process_path", "")
+        is_special_app = app_data.get("special_app", False)
+
+        result = {
+            "title": app_title,
+            "process_path": app_path,
+            "status": STATUS_FAILED,
+            "success": False,
+            "ready_by": None,
+            "queue_ms": _elapsed_ms(queued_at, started_at),
+            "spawn_ms": 0.0,
+            "ready_ms": 0.0,
+            "total_ms": 0.0
+        }
+
+        if not app_path or not os.path.isfile(app_path):
+            logger.warning(f"应用路径无效: {app_path}")
+            result["status"] = STATUS_INVALID_PATH
+            result["total_ms"] = _elapsed_ms(queued_at, time.perf_counter())
+            return result
+
+        if snapshot is None:
+            snapshot = snapshot_running_apps()
+        if is_app_running(app_data, snapshot, self.title_threshold):
+            if is_special_app:
+                logger.info("跳过恢复已存在的特殊应用: %s", app_title)
+            else:
+                logger.info("跳过恢复已存在的应用程序: %s", app_title)
+            result["status"] = STATUS_ALREADY_RUNNING
+            result["success"] = True
+            result["total_ms"] = _elapsed_ms(queued_at, time.perf_counter())
+            return result
+
+        try:
+            if is_special_app:
+                logger.info("特殊应用不存在，开始启动: %s", app_path)
+            else:
+                logger.info("应用程序不存在，开始启动: %s", app_path)
+            process = subprocess.Popen([app_path])
+        except Exception as e:
+            logger.error(f"启动应用失败: {e}")
+            result["total_ms"] = _elapsed_ms(queued_at, time.perf_counter())
+            return result
+
+        spawned_at = time.perf_counter()
+        result["spawn_ms"] = _elapsed_ms(started_at, spawned_at)
+
+        status, ready_by = self.wait_until_ready(
+            process, app_path,
+            background=app_data.get("background", False),
+            cancel_event=cancel_event
+        )
+        finished_at = time.perf_counter()
+
+        result["status"] = status
+        result["ready_by"] = ready_by
+        result["ready_ms"] = _elapsed_ms(spawned_at, finished_at)
+        result["total_ms"] = _elapsed_ms(queued_at, finished_at)
+        # 超时只说明未检测到窗口，进程仍在运行时按启动成功处理
+        result["success"] = status in (STATUS_READY, STATUS_TIMEOUT)
+
+        if status == STATUS_READY:
+            logger.info("应用已就绪: %s (%s, %.0f ms)", app_title, ready_by, result['ready_ms'])
+        elif status == STATUS_TIMEOUT:
+            logger.warning(f"等待应用窗口超时 ({self.timeout:.1f}s): {app_title}")
+        else:
+            logger.warning(f"应用启动后已退出: {app_title}")
+        return result
+
+    def launch_all(self, applications, cancel_event=None, progress=None):
+        """
+        并发启动多个应用，同一可执行文件只启动一次。
+        progress 为可选回调 progress(启动结果)，每个应用启动结束时调用。
+
+        返回:
+            与 applications 顺序一致的启动结果列表
+        """
+        snapshot = snapshot_running_apps()
+        queued_at = time.perf_counter()
+        unique, first_index = dedupe_applications(applications)
+
+        results = [None] * len(applications)
+        workers = min(self.max_workers, max(1, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="app-launcher") as executor:
+            futures = {
+                executor.submit(self.launch_unless_cancelled, applications[i], snapshot, queued_at, cancel_event): i
+                for i in unique
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(results[futures[future]])
+
+        return fill_duplicate_results(applications, results, first_index)
+
+    def launch_unless_cancelled(self, app_data, snapshot, queued_at, cancel_event):
+        if cancel_event is not None and cancel_event.is_set():
+            return {
+                "title": app_data.get("title", ""),
+                "process_path": app_data.get("process_path", ""),
+                "status": STATUS_CANCELLED,
+                "success": False,
+                "ready_by": None,
+                "queue_ms": _elapsed_ms(queued_at, time.perf_counter()),
+                "spawn_ms": 0.0,
+                "ready_ms": 0.0,
+                "total_ms": 0.0
+            }
+        return self.launch(app_data, snapshot=snapshot, queued_at=queued_at, cancel_event=cancel_event)
+
+
+def _app_key(app_data, index):
+    return os.path.normcase(app_data.get("process_path", "") or f"#{index}")
+
+
+def dedupe_applications(applications):
+    """
+    按可执行文件路径去重。
+
+    返回:
+        (需要启动的条目下标列表, 路径键 -> 首个条目下标)
+    """
+    first_index = {}
+    unique = []
+    for i, app_data in enumerate(applications):
+        key = _app_key(app_data, i)
+        if key not in first_index:
+            first_index[key] = i
+            unique.append(i)
+    return unique, first_index
+
+
+def fill_duplicate_results(applications, results, first_index):
+    """同一路径的其余条目沿用首个条目的结果，标记为已在运行"""
+    for i, app_data in enumerate(applications):
+        if results[i] is not None:
+            continue
+        primary = results[first_index[_app_key(app_data, i)]]
+        results[i] = dict(primary, title=app_data.get("title", ""), status=STATUS_ALREADY_RUNNING,
+                          ready_by=None, queue_ms=0.0, spawn_ms=0.0, ready_ms=0.0, total_ms=0.0)
+    return results
+
+
+def make_restore_result(app_results, elapsed_ms):
+    """汇总每个应用的启动结果"""
+    success = sum(1 for r in app_results if r.get("success"))
+    cancelled = sum(1 for r in app_results if r.get("status") == STATUS_CANCELLED)
+    return {
+        "success": success,
+        "failed": len(app_results) - success - cancelled,
+        "cancelled": cancelled,
+        "elapsed_ms": round(elapsed_ms, 1),
+        "apps": app_results
+    }
+
+
+def format_restore_report(result):
+    """将恢复结果格式化为按应用列出启动耗时的文本"""
+    lines = [
+        f"成功: {result['success']}, 失败: {result['failed']}, 总耗时: {result['elapsed_ms'] / 1000:.2f}s"
+    ]
+    if result.get("cancelled"):
+        lines[0] += f", 已取消: {result['cancelled']}"
+    scheduler = result.get("scheduler")
+    if scheduler:
+        lines.append(
+            f"  调度: 最终并发 {scheduler['final_concurrency']}, 峰值并发 {scheduler['peak_concurrency']}, "
+            f"资源受限采样 {scheduler['throttled_samples']}/{scheduler['samples']}"
+        )
+    for r in result.get("apps", []):
+        name = r.get("title") or os.path.basename(r.get("process_path", "")) or "未知应用"
+        if len(name) > 40:
+            name = name[:37] + "..."
+        lines.append(
+            f"  [{r['status']}] {name}: 排队 {r['queue_ms']:.0f} ms, 启动 {r['spawn_ms']:.0f} ms, "
+            f"就绪 {r['ready_ms']:.0f} ms, 合计 {r['total_ms']:.0f} ms"
+        )
+    return "\n".join(lines)
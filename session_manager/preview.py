@@ -0,0 +1,320 @@
+"""
+preview.py
+会话窗口布局预览图。
+
+- 显示器布局（EnumDisplayMonitors 的结果）缓存在内存中，收到 WM_DISPLAYCHANGE 后失效
+- 预览图按 (会话布局哈希, 显示器布局哈希, 尺寸) 缓存为磁盘上的 PNG 文件，
+  会话和显示器都没有变化时直接读取，不再重新绘制
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+from session_manager.config import USER_DATA_DIR
+import win32api
+import win32con
+import win32gui
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR_NAME = "previews"
+DEFAULT_PREVIEW_SIZE = (800, 600)
+# 磁盘上最多保留的预览图数量
+DEFAULT_PREVIEW_CACHE_ENTRIES = 256
+# 内存中缓存的预览图数量
+MEMORY_CACHE_ENTRIES = 16
+
+WINDOW_COLORS = [
+    (52, 152, 219),  # 蓝色
+    (46, 204, 113),  # 绿色
+    (155, 89, 182),  # 紫色
+    (230, 126, 34),  # 橙色
+    (231, 76, 60),   # 红色
+    (241, 196, 15)   # 黄色
+]
+
+
+def enum_monitors():
+    """返回所有显示器的 [{"left", "top", "width", "height"}]"""
+    monitors = []
+    for _, _, rect in win32api.EnumDisplayMonitors(None, None):
+        monitors.append({
+            'left': rect[0],
+            'top': rect[1],
+            'width': rect[2] - rect[0],
+            'height': rect[3] - rect[1]
+        })
+    return monitors
+
+
+class MonitorTopology:
+    """
+    缓存显示器布局。
+
+    start_listener() 在后台线程中创建一个隐藏的顶层窗口接收 WM_DISPLAYCHANGE 广播
+    （仅消息窗口收不到广播），显示器增减、分辨率或排列变化时清空缓存。
+    """
+
+    def __init__(self, enumerate_func=enum_monitors):
+        self._enumerate = enumerate_func
+        self._lock = threading.Lock()
+        self._monitors = None
+        self._digest = None
+        self._listener = None
+        # 无法监听显示器变化时不缓存，每次重新枚举
+        self._uncached = False
+
+    def invalidate(self):
+        with self._lock:
+            self._monitors = None
+            self._digest = None
+
+    def get(self):
+        """
+        返回:
+            (显示器列表, 布局哈希)
+        """
+        with self._lock:
+            if self._monitors is None or self._uncached:
+                self._monitors = self._enumerate()
+                payload = json.dumps(self._monitors, sort_keys=True).encode('utf-8')
+                self._digest = hashlib.sha1(payload).hexdigest()
+            return self._monitors, self._digest
+
+    def start_listener(self):
+        if self._listener is not None:
+            return
+        self._listener = threading.Thread(target=self._listen, name="display-change-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        def wndproc(hwnd, msg, wparam, lparam):
+            if msg == win32con.WM_DISPLAYCHANGE:
+                logger.debug("显示器布局已变化，清空显示器布局缓存")
+                self.invalidate()
+                return 0
+            return win32gui.DefWindowProc(hwnd, msg, wparam, lparam)
+
+        try:
+            window_class = win32gui.WNDCLASS()
+            window_class.lpfnWndProc = wndproc
+            window_class.lpszClassName = "WSMDisplayChangeListener"
+            window_class.hInstance = win32api.GetModuleHandle(None)
+            class_atom = win32gui.RegisterClass(window_class)
+            win32gui.CreateWindow(class_atom, "WSM display listener", 0, 0, 0, 0, 0,
+                                  0, 0, window_class.hInstance, None)
+            win32gui.PumpMessages()
+        except Exception as e:
+            # 无法监听时每次都重新枚举显示器，保证结果正确
+            logger.warning(f"无法监听显示器变化，预览将不缓存显示器布局: {e}")
+            self._uncached = True
+
+
+_monitor_topology = MonitorTopology()
+
+
+def get_monitor_topology():
+    """进程内共享的显示器布局缓存（首次调用时开始监听显示器变化）"""
+    _monitor_topology.start_listener()
+    return _monitor_topology
+
+
+def layout_windows(session_data):
+    """
+    返回会话中带位置的窗口 [(标题, rect)]。
+    兼容旧数据的 "windows" 键和应用条目中的 "rect"。
+    """
+    if not isinstance(session_data, dict):
+        return []
+    windows = []
+    for window in session_data.get("windows") or session_data.get("applications") or []:
+        if isinstance(window, dict) and isinstance(window.get("rect"), dict):
+            windows.append((window.get("title", ""), window["rect"]))
+    return windows
+
+
+def layout_digest(windows):
+    payload = json.dumps(windows, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+
+def render_preview(windows, monitors, preview_size=DEFAULT_PREVIEW_SIZE):
+    """
+    绘制窗口布局预览。
+
+    参数:
+        windows: [(标题, {"left", "top", "width", "height"})]
+        monitors: enum_monitors() 的结果
+
+    返回:
+        PIL.Image 对象，没有显示器信息时返回 None
+    """
+    if not monitors:
+        return None
+
+    # 计算所有显示器的总边界
+    min_x = min(m['left'] for m in monitors)
+    min_y = min(m['top'] for m in monitors)
+    max_x = max(m['left'] + m['width'] for m in monitors)
+    max_y = max(m['top'] + m['height'] for m in monitors)
+
+    total_width = max_x - min_x
+    total_height = max_y - min_y
+
+    # 创建预览图像
+    scale_factor = min(preview_size[0] / total_width, preview_size[1] / total_height)
+    preview_width = int(total_width * scale_factor)
+    preview_height = int(total_height * scale_factor)
+
+    preview = Image.new('RGB', (preview_width, preview_height), color=(240, 240, 240))
+    draw = ImageDraw.Draw(preview)
+
+    # 绘制显示器边框
+    for m in monitors:
+        x1 = int((m['left'] - min_x) * scale_factor)
+        y1 = int((m['top'] - min_y) * scale_factor)
+        x2 = int(x1 + m['width'] * scale_factor)
+        y2 = int(y1 + m['height'] * scale_factor)
+
+        # 绘制显示器外框
+        draw.rectangle([x1, y1, x2, y2], outline=(0, 0, 0), width=2)
+
+        # 绘制显示器内部
+        draw.rectangle([x1+2, y1+2, x2-2, y2-2], fill=(255, 255, 255))
+
+    # 绘制窗口
+    for i, (title, rect) in enumerate(windows):
+        # 计算窗口在预览中的位置
+        x1 = int((rect["left"] - min_x) * scale_factor)
+        y1 = int((rect["top"] - min_y) * scale_factor)
+        x2 = int(x1 + rect["width"] * scale_factor)
+        y2 = int(y1 + rect["height"] * scale_factor)
+
+        # 确保窗口在预览区域内
+        x1 = max(0, min(x1, preview_width-1))
+        y1 = max(0, min(y1, preview_height-1))
+        x2 = max(0, min(x2, preview_width-1))
+        y2 = max(0, min(y2, preview_height-1))
+
+        # 如果窗口太小，至少确保它是可见的
+        if x2 - x1 < 5:
+            x2 = x1 + 5
+        if y2 - y1 < 5:
+            y2 = y1 + 5
+
+        # 绘制窗口
+        color = WINDOW_COLORS[i % len(WINDOW_COLORS)]
+        draw.rectangle([x1, y1, x2, y2], fill=color, outline=(0, 0, 0), width=1)
+
+        # 如果窗口足够大，添加标题文本
+        if y2 - y1 > 20 and x2 - x1 > 50:
+            title = title or ""
+            if len(title) > 20:
+                title = title[:17] + "..."
+            draw.text((x1+5, y1+5), title, fill=(255, 255, 255))
+
+    return preview
+
+
+class PreviewCache:
+    """
+    预览图缓存。
+
+    缓存键为 (会话布局哈希, 显示器布局哈希, 尺寸)，预览图以 PNG 保存在 cache_dir 中，
+    最近使用的若干张同时保留在内存中。磁盘上超过 max_entries 张时删除最久未使用的。
+    """
+
+    def __init__(self, cache_dir, topology=None, max_entries=DEFAULT_PREVIEW_CACHE_ENTRIES):
+        self.cache_dir = cache_dir
+        self.topology = topology or get_monitor_topology()
+        self.max_entries = max(1, max_entries)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "rendered": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def get(self, session_data, preview_size=DEFAULT_PREVIEW_SIZE):
+        """
+        返回会话的预览图，优先使用缓存。
+
+        返回:
+            PIL.Image 对象，会话中没有窗口位置信息时返回 None
+        """
+        windows = layout_windows(session_data)
+        if not windows:
+            return None
+        monitors, topology_digest = self.topology.get()
+        key = f"{layout_digest(windows)[:20]}-{topology_digest[:12]}-{preview_size[0]}x{preview_size[1]}"
+
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return image
+
+        path = self._path(key)
+        image = None
+        if os.path.exists(path):
+            try:
+                with Image.open(path) as cached:
+                    image = cached.copy()
+                os.utime(path)
+                self.stats["disk_hits"] += 1
+            except Exception as e:
+                logger.warning(f"读取预览缓存失败 {path}: {e}")
+        if image is None:
+            image = render_preview(windows, monitors, preview_size)
+            if image is None:
+                return None
+            self.stats["rendered"] += 1
+            self._store(path, image)
+
+        with self._lock:
+            self._memory[key] = image
+            while len(self._memory) > MEMORY_CACHE_ENTRIES:
+                self._memory.popitem(last=False)
+        return image
+
+    def _store(self, path, image):
+        tmp_path = f"{path}.tmp"
+        try:
+            image.save(tmp_path, format="PNG")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"写入预览缓存失败 {path}: {e}")
+            return
+        self._prune()
+
+    def _prune(self):
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                       if name.endswith(".png")]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=os.path.getmtime)
+            for path in entries[:len(entries) - self.max_entries]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"清理预览缓存失败: {e}")
+
+
+_preview_caches = {}
+
+
+def get_preview_cache(config):
+    """按配置的缓存目录返回共享的 PreviewCache"""
+    cache_dir = os.path.join(config.get("cache_dir") or os.path.join(USER_DATA_DIR, "cache"), PREVIEW_DIR_NAME)
+    cache = _preview_caches.get(cache_dir)
+    if cache is None:
+        max_entries = config.get("ui", {}).get("preview_cache_entries", DEFAULT_PREVIEW_CACHE_ENTRIES)
+        cache = _preview_caches[cache_dir] = PreviewCache(cache_dir, max_entries=max_entries)
+    return cache
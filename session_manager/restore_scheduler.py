@@ -0,0 +1,289 @@
+"""
+restore_scheduler.py
+资源感知的恢复调度器：通过 psutil 采样 CPU、磁盘 I/O 和内存压力，
+仅在各项指标低于阈值时放行新的应用启动，并根据负载动态调整并发数。
+每个应用的启动耗时会被记录下来，供后续恢复时安排启动顺序。
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import psutil
+
+from session_manager.config import USER_DATA_DIR
+from session_manager.launcher import (
+    AppLauncher,
+    snapshot_running_apps,
+    dedupe_applications,
+    fill_duplicate_results,
+    STATUS_READY,
+    STATUS_TIMEOUT
+)
+from session_manager.utils import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# 启动耗时记录文件
+STARTUP_COST_FILE = os.path.join(USER_DATA_DIR, "startup_costs.json")
+
+# 调度器默认配置
+DEFAULT_SCHEDULER_CONFIG = {
+    "enabled": True,
+    "min_concurrency": 1,
+    "max_concurrency": 8,
+    "cpu_threshold": 85,
+    "memory_threshold": 90,
+    "disk_threshold": 80,
+    "sample_interval": 0.25,
+    "calm_samples": 4,
+    "heavy_app_ms": 3000
+}
+
+# 启动耗时的指数移动平均系数
+COST_EMA_ALPHA = 0.3
+
+
+class ResourceMonitor:
+    """采样系统 CPU、内存与磁盘繁忙度（百分比）"""
+
+    def __init__(self):
+        # cpu_percent 首次调用返回 0，先预热一次
+        psutil.cpu_percent(interval=None)
+        self._last_disk = self._disk_counters()
+        self._last_time = time.perf_counter()
+
+    @staticmethod
+    def _disk_counters():
+        try:
+            return psutil.disk_io_counters(perdisk=True)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _busy_ms(counters, previous):
+        # 优先使用 busy_time，Windows 上使用读写耗时之和估算（并发的 I/O 会重复计算，按磁盘截断到 100%）
+        if hasattr(counters, "busy_time") and hasattr(previous, "busy_time"):
+            return counters.busy_time - previous.busy_time
+        return (counters.read_time - previous.read_time) + (counters.write_time - previous.write_time)
+
+    def _disk_busy_percent(self, now):
+        """最繁忙的一块磁盘的繁忙度，多块磁盘的耗时不相加"""
+        counters = self._disk_counters()
+        previous, self._last_disk = self._last_disk, counters
+        elapsed_ms = (now - self._last_time) * 1000
+        if not counters or not previous or elapsed_ms <= 0:
+            return 0.0
+        busiest = 0.0
+        for disk, current in counters.items():
+            if disk in previous:
+                busy = self._busy_ms(current, previous[disk]) / elapsed_ms * 100
+                busiest = max(busiest, min(100.0, busy))
+        return busiest
+
+    def sample(self):
+        """返回 {"cpu", "memory", "disk"} 百分比"""
+        now = time.perf_counter()
+        sample = {
+            "cpu": psutil.cpu_percent(interval=None),
+            "memory": psutil.virtual_memory().percent,
+            "disk": self._disk_busy_percent(now)
+        }
+        self._last_time = now
+        return sample
+
+
+class StartupCostStore:
+    """按可执行文件记录应用启动耗时，保存在用户数据目录中"""
+
+    def __init__(self, filename=STARTUP_COST_FILE):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._costs = self._load()
+        self._dirty = False
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            logger.warning(f"读取启动耗时记录失败: {e}")
+            return {}
+
+    @staticmethod
+    def _key(process_path):
+        return os.path.normcase(process_path or "")
+
+    def get_cost(self, process_path, default=None):
+        """返回应用的平均启动耗时（毫秒），没有记录时返回 default"""
+        entry = self._costs.get(self._key(process_path))
+        avg_ms = entry.get("avg_ms") if entry else None
+        return default if avg_ms is None else avg_ms
+
+    def record(self, process_path, ready_ms, pressure=None):
+        """记录一次启动耗时及启动期间的资源压力"""
+        if not process_path:
+            return
+        key = self._key(process_path)
+        with self._lock:
+            entry = self._costs.get(key)
+            if entry is None:
+                entry = {"avg_ms": ready_ms, "samples": 0}
+            elif entry.get("avg_ms") is None:
+                entry["avg_ms"] = ready_ms
+            else:
+                entry["avg_ms"] = round(COST_EMA_ALPHA * ready_ms + (1 - COST_EMA_ALPHA) * entry["avg_ms"], 1)
+            entry["samples"] += 1
+            entry["last_ms"] = ready_ms
+            if pressure:
+                entry["last_pressure"] = pressure
+            entry["updated_at"] = time.time()
+            self._costs[key] = entry
+            self._dirty = True
+
+    def record_timeout(self, process_path):
+        """
+        记录一次窗口检测超时。超时只说明启动耗时不短于检测超时，
+        单独计数，不计入平均耗时。
+        """
+        if not process_path:
+            return
+        key = self._key(process_path)
+        with self._lock:
+            entry = self._costs.setdefault(key, {"samples": 0})
+            entry["timeouts"] = entry.get("timeouts", 0) + 1
+            entry["updated_at"] = time.time()
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                atomic_write_json(self.filename, self._costs)
+                self._dirty = False
+            except Exception as e:
+                logger.warning(f"保存启动耗时记录失败: {e}")
+
+
+class RestoreScheduler:
+    """
+    资源感知的应用启动调度器。
+
+    - 按历史启动耗时从高到低排序，先启动重量级应用
+    - 每个采样周期检查 CPU/内存/磁盘压力，超过阈值时不放行新的启动并减半并发数
+    - 连续 calm_samples 次采样资源空闲且并发已占满时才将并发数加一
+    - 重量级应用占用两个并发名额
+    """
+
+    def __init__(self, config, launcher=None, monitor=None, cost_store=None):
+        settings = dict(DEFAULT_SCHEDULER_CONFIG)
+        settings.update(config.get("restore_scheduler", {}))
+        self.settings = settings
+        self.launcher = launcher or AppLauncher(config)
+        self.monitor = monitor or ResourceMonitor()
+        self.cost_store = cost_store or StartupCostStore()
+
+        self.min_concurrency = max(1, int(settings["min_concurrency"]))
+        self.max_concurrency = max(self.min_concurrency, int(settings["max_concurrency"]))
+        self.concurrency = min(self.max_concurrency, max(self.min_concurrency, self.launcher.max_workers))
+        self.calm_samples = max(1, int(settings["calm_samples"]))
+        self._calm_streak = 0
+
+    def _under_pressure(self, sample):
+        return (sample["cpu"] >= self.settings["cpu_threshold"]
+                or sample["memory"] >= self.settings["memory_threshold"]
+                or sample["disk"] >= self.settings["disk_threshold"])
+
+    def _weight(self, app_data):
+        cost = self.cost_store.get_cost(app_data.get("process_path"), 0)
+        return 2 if cost >= self.settings["heavy_app_ms"] else 1
+
+    def _adjust_concurrency(self, pressure, saturated):
+        previous = self.concurrency
+        if pressure:
+            self._calm_streak = 0
+            self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        elif saturated:
+            # 连续多次空闲才增加，避免压力刚消失时立即加满再被减半
+            self._calm_streak += 1
+            if self._calm_streak >= self.calm_samples:
+                self._calm_streak = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        else:
+            self._calm_streak = 0
+        if self.concurrency != previous:
+            logger.debug("调整恢复并发数: %s -> %s", previous, self.concurrency)
+
+    def run(self, applications, cancel_event=None, progress=None):
+        """
+        调度启动所有应用。progress 为可选回调 progress(启动结果)，每个应用启动结束时调用。
+
+        返回:
+            (与 applications 顺序一致的启动结果列表, 调度统计字典)
+        """
+        snapshot = snapshot_running_apps()
+        queued_at = time.perf_counter()
+        unique, first_index = dedupe_applications(applications)
+
+        # 历史耗时高的应用先启动，没有记录的排在最后
+        unique.sort(key=lambda i: self.cost_store.get_cost(applications[i].get("process_path"), -1), reverse=True)
+        pending = deque(unique)
+        results = [None] * len(applications)
+        running = {}
+        stats = {"peak_concurrency": self.concurrency, "throttled_samples": 0, "samples": 0}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="restore-scheduler") as executor:
+            while pending or running:
+                sample = self.monitor.sample()
+                pressure = self._under_pressure(sample)
+                stats["samples"] += 1
+                if pressure:
+                    stats["throttled_samples"] += 1
+
+                load = sum(weight for _, weight, _ in running.values())
+                self._adjust_concurrency(pressure, saturated=load >= self.concurrency)
+                stats["peak_concurrency"] = max(stats["peak_concurrency"], self.concurrency)
+
+                # 放行新的启动；没有任何应用在运行时至少放行一个，避免压力持续时饿死
+                while pending and (not running or (not pressure and load < self.concurrency)):
+                    if cancel_event is not None and cancel_event.is_set():
+                        break
+                    index = pending.popleft()
+                    weight = self._weight(applications[index])
+                    future = executor.submit(self.launcher.launch_unless_cancelled,
+                                             applications[index], snapshot, queued_at, cancel_event)
+                    running[future] = (index, weight, sample)
+                    load += weight
+
+                if cancel_event is not None and cancel_event.is_set() and not running:
+                    break
+                if not running:
+                    continue
+
+                done, _ = wait(list(running), timeout=self.settings["sample_interval"], return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, _, admitted_sample = running.pop(future)
+                    result = future.result()
+                    results[index] = result
+                    if progress:
+                        progress(result)
+                    if result["status"] == STATUS_READY:
+                        self.cost_store.record(result["process_path"], result["ready_ms"], admitted_sample)
+                    elif result["status"] == STATUS_TIMEOUT:
+                        self.cost_store.record_timeout(result["process_path"])
+
+        # 取消时尚未放行的应用
+        for index in pending:
+            results[index] = self.launcher.launch_unless_cancelled(applications[index], snapshot, queued_at, cancel_event)
+
+        self.cost_store.save()
+        stats["final_concurrency"] = self.concurrency
+        return fill_duplicate_results(applications, results, first_index), stats
@@ -0,0 +1,403 @@
+"""
+service.py
+常驻后台服务：在一个无界面的进程中保持会话、进程路径和浏览器文件等缓存，
+命令行和热键通过本机命名管道（Windows）或 Unix 套接字把保存/恢复命令转发给它，
+不必每次重新启动解释器、导入模块和加载会话。
+
+连接使用 multiprocessing.connection，服务启动时生成随机认证密钥并写入用户数据目录，
+只有能读取该文件的本机用户才能发送命令。
+
+会话存储只由服务进程打开：服务运行时，界面和命令行通过 RemoteSessionManager（session 命令）
+读写服务中的会话，不再各自打开会话存储、各自运行自动保存。
+"""
+
+import os
+import sys
+import time
+import getpass
+import logging
+import threading
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+from session_manager.config import USER_DATA_DIR, DEFAULT_SESSION_NAME, load_config, update_config
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "WindowsSessionManager"
+AUTHKEY_FILE = os.path.join(USER_DATA_DIR, "service.key")
+# 等待服务回复的默认秒数（恢复会话可能需要较长时间）
+DEFAULT_REQUEST_TIMEOUT = 300
+# session 命令可以调用的会话管理器方法
+SESSION_METHODS = frozenset({
+    "get_session_names", "get_session_info", "get_session", "set_session", "delete_session",
+    "clear_session", "rename_session", "get_session_history", "get_session_snapshot",
+    "revert_session", "export_session", "import_session", "save_sessions",
+})
+
+
+class ServiceUnavailable(Exception):
+    """后台服务未运行或无法连接"""
+
+
+def service_address():
+    """当前用户的服务地址和地址族"""
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{SERVICE_NAME}-{getpass.getuser()}", "AF_PIPE"
+    return os.path.join(USER_DATA_DIR, "service.sock"), "AF_UNIX"
+
+
+def _read_authkey():
+    try:
+        with open(AUTHKEY_FILE, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_authkey():
+    authkey = os.urandom(32)
+    from session_manager.utils import atomic_write_bytes
+    atomic_write_bytes(AUTHKEY_FILE, authkey)
+    return authkey
+
+
+def send_command(command, timeout=DEFAULT_REQUEST_TIMEOUT, **args):
+    """
+    向后台服务发送命令。
+
+    返回:
+        服务的回复 {"ok": bool, "message": str, ...}
+
+    异常:
+        ServiceUnavailable: 服务未运行、认证失败或在 timeout 秒内没有回复
+    """
+    authkey = _read_authkey()
+    if not authkey:
+        raise ServiceUnavailable("后台服务未运行")
+    address, family = service_address()
+    try:
+        conn = Client(address, family=family, authkey=authkey)
+    except (OSError, EOFError, AuthenticationError) as e:
+        raise ServiceUnavailable(f"无法连接后台服务: {e}")
+    try:
+        conn.send({"command": command, "args": args})
+        if not conn.poll(timeout):
+            raise ServiceUnavailable(f"后台服务在 {timeout} 秒内没有回复")
+        return conn.recv()
+    except (OSError, EOFError) as e:
+        raise ServiceUnavailable(f"与后台服务的连接中断: {e}")
+    finally:
+        conn.close()
+
+
+def is_service_running():
+    try:
+        return send_command("ping", timeout=2).get("ok", False)
+    except ServiceUnavailable:
+        return False
+
+
+class RemoteSessionManager:
+    """
+    通过后台服务读写会话，接口与 core.SessionManager 相同（界面和命令行用到的部分）。
+
+    每次调用都是一次 session 命令；服务不可用时抛出 ServiceUnavailable，
+    服务端执行失败时抛出 RuntimeError。
+    """
+
+    remote = True
+
+    def __init__(self, timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.default_session_name = DEFAULT_SESSION_NAME
+
+    @classmethod
+    def connect(cls, timeout=DEFAULT_REQUEST_TIMEOUT):
+        """服务正在运行时返回实例，否则抛出 ServiceUnavailable"""
+        if not is_service_running():
+            raise ServiceUnavailable("后台服务未运行")
+        return cls(timeout)
+
+    def _call(self, method, *args, **kwargs):
+        reply = send_command("session", timeout=self.timeout, method=method, args=args, kwargs=kwargs)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("message") or f"会话操作 {method} 失败")
+        return reply.get("result")
+
+    def get_session_names(self):
+        return self._call("get_session_names")
+
+    def get_session_info(self, name):
+        return self._call("get_session_info", name)
+
+    def get_session(self, name):
+        return self._call("get_session", name)
+
+    def iter_sessions(self):
+        for name in self.get_session_names():
+            yield name, self.get_session(name)
+
+    def set_session(self, name, items):
+        return self._call("set_session", name, items)
+
+    def delete_session(self, name):
+        return self._call("delete_session", name)
+
+    def clear_session(self, name):
+        return self._call("clear_session", name)
+
+    def rename_session(self, old_name, new_name):
+        return self._call("rename_session", old_name, new_name)
+
+    def get_session_history(self, name):
+        return self._call("get_session_history", name)
+
+    def get_session_snapshot(self, name, snapshot_id=None, as_of=None):
+        return self._call("get_session_snapshot", name, snapshot_id, as_of)
+
+    def revert_session(self, name, snapshot_id):
+        return self._call("revert_session", name, snapshot_id)
+
+    def export_session(self, name, export_path):
+        # 服务的工作目录可能不同
+        return self._call("export_session", name, os.path.abspath(export_path))
+
+    def import_session(self, import_path, new_name):
+        return self._call("import_session", os.path.abspath(import_path), new_name)
+
+    def save_sessions(self):
+        return self._call("save_sessions")
+
+    def close(self):
+        """会话存储由服务关闭"""
+
+
+class SessionService:
+    """
+    常驻后台服务。
+
+    每个连接在单独的线程中处理；保存和恢复命令依次执行，ping/status 不需要等待。
+    启动时可注册 hotkeys 配置中的全局热键，并启动自动保存。
+    """
+
+    def __init__(self, config, session_manager):
+        self.config = config
+        self.session_manager = session_manager
+        self.started_at = time.time()
+        self.stats = {"requests": 0, "errors": 0}
+        self._command_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._listener = None
+        self._hotkeys = []
+        self.handlers = {
+            "ping": self.cmd_ping,
+            "status": self.cmd_status,
+            "list": self.cmd_list,
+            "save": self.cmd_save,
+            "restore": self.cmd_restore,
+            "restore_last": self.cmd_restore_last,
+            "session": self.cmd_session,
+            "shutdown": self.cmd_shutdown,
+        }
+
+    # --- 命令 ---
+
+    def cmd_ping(self):
+        return {"ok": True, "message": "pong"}
+
+    def cmd_status(self):
+        uptime = time.time() - self.started_at
+        return {
+            "ok": True,
+            "message": f"后台服务运行中（PID {os.getpid()}，已运行 {uptime:.0f} 秒，"
+                       f"处理 {self.stats['requests']} 个请求，{len(self.session_manager.get_session_names())} 个会话）",
+            "pid": os.getpid(),
+            "uptime": uptime,
+            "stats": dict(self.stats)
+        }
+
+    def cmd_list(self):
+        names = self.session_manager.get_session_names()
+        return {"ok": True, "message": "\n".join(names) if names else "没有会话", "sessions": names}
+
+    def cmd_save(self, name=None):
+        from session_manager.core import collect_session_data
+        name = name or self.config["startup"].get("last_session") or DEFAULT_SESSION_NAME
+        with self._command_lock:
+            session_data = collect_session_data(self.config)
+            self.session_manager.set_session(name, session_data)
+            self.session_manager.save_sessions()
+        return {"ok": True, "message": f"已保存会话: {name}", "session": name}
+
+    def cmd_restore(self, name=None, snapshot=None):
+        from session_manager.core import restore_session
+        from session_manager.launcher import format_restore_report
+        name = name or self.config["startup"].get("last_session")
+        if not name:
+            return {"ok": False, "message": "没有上次会话记录"}
+        if snapshot is not None:
+            session_data = self.session_manager.get_session_snapshot(name, snapshot)
+        else:
+            session_data = self.session_manager.get_session(name)
+        if not session_data:
+            return {"ok": False, "message": f"找不到会话: {name}"}
+        with self._command_lock:
+            result = restore_session(session_data, self.config)
+        update_config({"startup": {"last_session": name}})
+        return {"ok": True, "message": f"已恢复会话: {name}\n{format_restore_report(result)}", "result": result}
+
+    def cmd_restore_last(self):
+        return self.cmd_restore(None)
+
+    def cmd_session(self, method=None, args=(), kwargs=None):
+        # 会话管理器自身是线程安全的，不等待正在执行的保存/恢复命令
+        if method not in SESSION_METHODS:
+            return {"ok": False, "message": f"不支持的会话操作: {method}"}
+        result = getattr(self.session_manager, method)(*args, **(kwargs or {}))
+        return {"ok": True, "message": "", "result": result}
+
+    def cmd_shutdown(self):
+        # 回复发出后再停止监听（见 _serve_connection）
+        return {"ok": True, "message": "后台服务正在退出"}
+
+    def handle(self, request):
+        """执行一个请求，返回回复字典（不抛出异常）"""
+        self.stats["requests"] += 1
+        # 配置文件被修改（如在界面中恢复了其他会话）时更新共享配置，未修改时只检查一次文件状态
+        load_config()
+        command = request.get("command") if isinstance(request, dict) else None
+        handler = self.handlers.get(command)
+        if handler is None:
+            self.stats["errors"] += 1
+            return {"ok": False, "message": f"未知命令: {command}"}
+        try:
+            return handler(**(request.get("args") or {}))
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"执行后台命令 '{command}' 失败: {e}", exc_info=True)
+            return {"ok": False, "message": f"执行命令 '{command}' 失败: {e}"}
+
+    # --- 热键 ---
+
+    def register_hotkeys(self):
+        """注册 hotkeys 配置中的全局热键；keyboard 库不可用时跳过"""
+        hotkeys = self.config.get("hotkeys", {})
+        if not hotkeys:
+            return
+        try:
+            import keyboard
+        except Exception as e:
+            logger.warning(f"无法注册热键（keyboard 库不可用）: {e}")
+            return
+        actions = {
+            "save_session": ("save", {}),
+            "restore_session": ("restore", {}),
+            "quick_restore": ("restore_last", {}),
+        }
+        for key, combo in hotkeys.items():
+            if key not in actions or not combo:
+                continue
+            command, args = actions[key]
+            try:
+                # 热键回调在 keyboard 的监听线程中执行，命令放到单独的线程中运行
+                self._hotkeys.append(keyboard.add_hotkey(combo, self._run_hotkey, args=(command, args)))
+                logger.info(f"已注册热键 {combo}: {command}")
+            except Exception as e:
+                logger.warning(f"注册热键 {combo} 失败: {e}")
+
+    def _run_hotkey(self, command, args):
+        def run():
+            reply = self.handle({"command": command, "args": args})
+            logger.info(reply.get("message", ""))
+        threading.Thread(target=run, name=f"hotkey-{command}", daemon=True).start()
+
+    def unregister_hotkeys(self):
+        if not self._hotkeys:
+            return
+        import keyboard
+        for handle in self._hotkeys:
+            try:
+                keyboard.remove_hotkey(handle)
+            except Exception:
+                pass
+        self._hotkeys = []
+
+    # --- 监听 ---
+
+    def serve_forever(self):
+        """监听并处理请求，直到收到 shutdown 命令或调用 stop()"""
+        address, family = service_address()
+        if family == "AF_UNIX" and os.path.exists(address):
+            os.remove(address)
+        authkey = _write_authkey()
+        self._listener = Listener(address, family=family, authkey=authkey)
+        logger.info(f"后台服务已启动: {address}")
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    if self._stop_event.is_set():
+                        break
+                    logger.warning(f"拒绝后台服务连接: {e}")
+                    continue
+                if self._stop_event.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve_connection, args=(conn,),
+                                 name="service-connection", daemon=True).start()
+        finally:
+            self._listener.close()
+            self._listener = None
+            try:
+                os.remove(AUTHKEY_FILE)
+            except OSError:
+                pass
+            logger.info("后台服务已停止")
+
+    def _serve_connection(self, conn):
+        try:
+            request = conn.recv()
+            reply = self.handle(request)
+            conn.send(reply)
+            if reply.get("ok") and request.get("command") == "shutdown":
+                self.stop()
+        except (OSError, EOFError) as e:
+            logger.debug(f"后台服务连接中断: {e}")
+        finally:
+            conn.close()
+
+    def stop(self):
+        """停止监听。accept() 阻塞时连接一次自身使其返回"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        authkey = _read_authkey()
+        if authkey:
+            address, family = service_address()
+            try:
+                Client(address, family=family, authkey=authkey).close()
+            except Exception:
+                pass
+
+
+def run_service(config, session_manager):
+    """以常驻模式运行（阻塞），退出前停止热键和自动保存并写入会话检查点"""
+    if is_service_running():
+        logger.info("后台服务已在运行")
+        return False
+    from session_manager.auto_save import AutoSaveWorker
+    service = SessionService(config, session_manager)
+    if config.get("service", {}).get("hotkeys", True):
+        service.register_hotkeys()
+    auto_saver = AutoSaveWorker(config, session_manager)
+    auto_saver.start()
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，后台服务退出")
+    finally:
+        service.unregister_hotkeys()
+        auto_saver.stop()
+        session_manager.close()
+    return True
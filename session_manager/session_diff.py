@@ -0,0 +1,286 @@
+"""
+session_diff.py
+会话差异比较：比较两个会话，或比较已保存的会话与当前桌面。
+
+应用按 (可执行文件路径, 规范化标题) 哈希匹配，标签页按规范化 URL 哈希匹配，
+匹配结果中不在最长递增子序列里的条目视为“移动”。浏览器窗口先按首个标签页、标题和共有的标签页
+对应起来，标签页移动在每个窗口内单独计算，增删窗口不会使其他窗口的标签页被当作移动。
+整体复杂度为 O(n log n)，数千个标签页的比较在毫秒级完成。
+"""
+
+import os
+import re
+import time
+import bisect
+import logging
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from session_manager.core import collect_session_data
+
+logger = logging.getLogger(__name__)
+
+# 比较 URL 时忽略的跟踪参数前缀
+TRACKING_PARAM_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "spm"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_WHITESPACE = re.compile(r"\s+")
+# 编辑器在标题前后加的“未保存”标记
+_DIRTY_MARKERS = "*●•"
+
+
+def normalize_title(title):
+    """规范化窗口标题：忽略大小写、多余空白和未保存标记"""
+    title = _WHITESPACE.sub(" ", title or "").strip().strip(_DIRTY_MARKERS).strip()
+    return title.casefold()
+
+
+def app_key(app):
+    return (os.path.normcase(app.get("process_path") or app.get("path") or ""), normalize_title(app.get("title")))
+
+
+@lru_cache(maxsize=65536)
+def canonical_url(url):
+    """规范化 URL：协议和主机名小写，去掉默认端口、片段和跟踪参数，查询参数排序"""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    if not host:
+        return urlunsplit((scheme, parts.netloc, parts.path, parts.query, ""))
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    if parts.username:
+        netloc = f"{parts.username}@{netloc}"
+    path = parts.path or "/"
+    query = parts.query
+    if query:
+        query = urlencode(sorted(
+            (k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+            if k not in TRACKING_PARAMS and not k.startswith(TRACKING_PARAM_PREFIXES)
+        ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _stable_indices(pairs):
+    """
+    pairs 为按旧位置排序的 (旧位置, 新位置)，返回新位置构成最长递增子序列的那些下标集合。
+    不在其中的匹配项就是相对顺序发生变化（移动）的条目。
+    """
+    tails = []
+    tails_index = []
+    previous = [-1] * len(pairs)
+    for i, (_, new_pos) in enumerate(pairs):
+        j = bisect.bisect_left(tails, new_pos)
+        if j == len(tails):
+            tails.append(new_pos)
+            tails_index.append(i)
+        else:
+            tails[j] = new_pos
+            tails_index[j] = i
+        previous[i] = tails_index[j - 1] if j > 0 else -1
+    stable = set()
+    i = tails_index[-1] if tails_index else -1
+    while i >= 0:
+        stable.add(i)
+        i = previous[i]
+    return stable
+
+
+def diff_sequences(old_items, new_items, key_func, location=None, group=None):
+    """
+    比较两个有序列表。
+
+    参数:
+        key_func: 条目 -> 哈希键，键相同的条目视为同一条目（按出现顺序一一匹配）
+        location: (列表, 下标) -> 位置描述（如所在浏览器窗口），用于报告移动
+        group: 条目 -> 分组（如浏览器窗口），分组改变的条目总是视为移动，分组内的顺序变化按组分别计算
+
+    返回:
+        {"added": [条目], "removed": [条目], "moved": [{"item", "from", "to"}], "unchanged": 数量}
+    """
+    old_positions = {}
+    for i, item in enumerate(old_items):
+        old_positions.setdefault(key_func(item), []).append(i)
+
+    pairs = []
+    added = []
+    cursor = {}
+    for j, item in enumerate(new_items):
+        key = key_func(item)
+        positions = old_positions.get(key)
+        k = cursor.get(key, 0)
+        if positions is not None and k < len(positions):
+            cursor[key] = k + 1
+            pairs.append((positions[k], j))
+        else:
+            added.append(item)
+
+    matched_old = {old for old, _ in pairs}
+    removed = [item for i, item in enumerate(old_items) if i not in matched_old]
+
+    pairs.sort()
+    if group is None:
+        stable = _stable_indices(pairs)
+    else:
+        # 仍在同一组的条目按组计算最长递增子序列
+        buckets = {}
+        for index, (old, new) in enumerate(pairs):
+            old_group = group(old_items[old])
+            if old_group == group(new_items[new]):
+                buckets.setdefault(old_group, []).append(index)
+        stable = set()
+        for indices in buckets.values():
+            stable.update(indices[i] for i in _stable_indices([pairs[index] for index in indices]))
+    moved = []
+    for index, (old, new) in enumerate(pairs):
+        if index in stable:
+            continue
+        moved.append({
+            "item": new_items[new],
+            "from": location(old_items, old) if location else old,
+            "to": location(new_items, new) if location else new
+        })
+    return {"added": added, "removed": removed, "moved": moved, "unchanged": len(pairs) - len(moved)}
+
+
+def _browser_windows(session_data):
+    return [w for w in session_data.get("browser_windows") or [] if isinstance(w, dict)]
+
+
+def _window_urls(window):
+    return [canonical_url(tab.get("url")) for tab in window.get("tabs") or [] if isinstance(tab, dict)]
+
+
+def match_windows(old_windows, new_windows):
+    """
+    按身份对应两个会话的浏览器窗口：依次按首个标签页的 URL、规范化标题、共有标签页最多匹配，
+    每个窗口最多匹配一次。
+
+    返回:
+        {新窗口序号: 旧窗口序号}
+    """
+    old_urls = [_window_urls(w) for w in old_windows]
+    new_urls = [_window_urls(w) for w in new_windows]
+    matched = {}
+    used = set()
+
+    def match_by(key_func):
+        candidates = {}
+        for i, window in enumerate(old_windows):
+            key = key_func(window, old_urls[i]) if i not in used else None
+            if key:
+                candidates.setdefault(key, []).append(i)
+        for j, window in enumerate(new_windows):
+            if j in matched:
+                continue
+            key = key_func(window, new_urls[j])
+            free = [i for i in candidates.get(key, []) if i not in used] if key else []
+            if free:
+                matched[j] = free[0]
+                used.add(free[0])
+
+    match_by(lambda window, urls: urls[0] if urls else None)
+    match_by(lambda window, urls: normalize_title(window.get("title")))
+
+    # 剩余窗口按共有标签页数量匹配
+    remaining = [i for i in range(len(old_windows)) if i not in used]
+    old_sets = {i: set(old_urls[i]) for i in remaining}
+    for j in range(len(new_windows)):
+        if j in matched or not remaining:
+            continue
+        urls = set(new_urls[j])
+        best = max(remaining, key=lambda i: len(old_sets[i] & urls))
+        if old_sets[best] & urls:
+            matched[j] = best
+            used.add(best)
+            remaining.remove(best)
+    return matched
+
+
+def _flatten_tabs(windows, identities):
+    """将浏览器窗口的标签页展开为 [(窗口标题, 窗口序号, 标签页, 窗口身份)]"""
+    tabs = []
+    for w, window in enumerate(windows):
+        for tab in window.get("tabs") or []:
+            if isinstance(tab, dict):
+                tabs.append((window.get("title", ""), w, tab, identities[w]))
+    return tabs
+
+
+def _tab_location(items, index):
+    title, window_index, _, _ = items[index]
+    return {"window": window_index, "window_title": title}
+
+
+def diff_sessions(old_session, new_session):
+    """
+    比较两个会话。
+
+    返回:
+        {"apps": 应用差异, "tabs": 标签页差异, "elapsed_ms"}
+        标签页差异中的条目为 {"title", "url", "window"}；移动包括跨窗口移动和窗口内顺序变化
+    """
+    start = time.perf_counter()
+    old_apps = [a for a in old_session.get("applications", []) if isinstance(a, dict)]
+    new_apps = [a for a in new_session.get("applications", []) if isinstance(a, dict)]
+    apps = diff_sequences(old_apps, new_apps, app_key)
+
+    old_windows = _browser_windows(old_session)
+    new_windows = _browser_windows(new_session)
+    window_map = match_windows(old_windows, new_windows)
+    # 窗口身份：旧窗口用其序号，新窗口用对应的旧窗口序号，没有对应的用负数
+    old_tabs = _flatten_tabs(old_windows, list(range(len(old_windows))))
+    new_tabs = _flatten_tabs(new_windows, [window_map.get(j, -1 - j) for j in range(len(new_windows))])
+    tab_diff = diff_sequences(old_tabs, new_tabs, lambda entry: canonical_url(entry[2].get("url")),
+                              _tab_location, group=lambda entry: entry[3])
+
+    def tab_entry(entry):
+        window_title, window_index, tab, _ = entry
+        return {"title": tab.get("title", ""), "url": tab.get("url", ""),
+                "window": window_index, "window_title": window_title}
+
+    tabs = {
+        "added": [tab_entry(e) for e in tab_diff["added"]],
+        "removed": [tab_entry(e) for e in tab_diff["removed"]],
+        "moved": [dict(tab_entry(m["item"]), **{"from": m["from"], "to": m["to"]}) for m in tab_diff["moved"]],
+        "unchanged": tab_diff["unchanged"]
+    }
+    return {"apps": apps, "tabs": tabs, "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+def diff_with_live(session_data, config, progress=None, cancel_event=None):
+    """比较已保存的会话与当前桌面（执行一次完整采集，progress 和 cancel_event 传给 collect_session_data）"""
+    return diff_sessions(session_data, collect_session_data(config, progress=progress, cancel_event=cancel_event))
+
+
+def is_empty_diff(diff):
+    return not any(diff[part][kind] for part in ("apps", "tabs") for kind in ("added", "removed", "moved"))
+
+
+def format_diff_report(diff, old_label="旧", new_label="新"):
+    """格式化差异为多行文本"""
+    apps, tabs = diff["apps"], diff["tabs"]
+    lines = [
+        f"比较 {old_label} -> {new_label}（{diff['elapsed_ms']}ms）",
+        f"应用: 新增 {len(apps['added'])}，删除 {len(apps['removed'])}，移动 {len(apps['moved'])}，未变 {apps['unchanged']}",
+        f"标签页: 新增 {len(tabs['added'])}，删除 {len(tabs['removed'])}，移动 {len(tabs['moved'])}，未变 {tabs['unchanged']}"
+    ]
+    for app in apps["added"]:
+        lines.append(f"  + [应用] {app.get('title', '')} ({app.get('process_path', '')})")
+    for app in apps["removed"]:
+        lines.append(f"  - [应用] {app.get('title', '')} ({app.get('process_path', '')})")
+    for move in apps["moved"]:
+        lines.append(f"  ~ [应用] {move['item'].get('title', '')} (位置 {move['from'] + 1} -> {move['to'] + 1})")
+    for tab in tabs["added"]:
+        lines.append(f"  + [标签页] {tab['title']} {tab['url']}")
+    for tab in tabs["removed"]:
+        lines.append(f"  - [标签页] {tab['title']} {tab['url']}")
+    for tab in tabs["moved"]:
+        lines.append(f"  ~ [标签页] {tab['title']} (窗口 {tab['from']['window'] + 1} -> {tab['to']['window'] + 1})")
+    return "\n".join(lines)
@@ -0,0 +1,53 @@
+"""
+storage/__init__.py
+会话数据存储模块
+"""
+
+from session_manager.storage.file_store import (
+    SessionFileStore,
+    normalize_session_data,
+    sanitize_session_data,
+    session_counts,
+    export_session_file,
+    read_session_file,
+    serialize_session,
+    deserialize_session,
+    FORMAT_JSON,
+    FORMAT_COMPACT
+)
+from session_manager.storage.journal import (
+    SessionJournal,
+    DEFAULT_JOURNAL_COMPACT_BYTES,
+    DEFAULT_SYNC_INTERVAL
+)
+from session_manager.storage.sqlite_store import SQLiteSessionStore
+from session_manager.storage.history import SessionHistory, DEFAULT_MAX_SNAPSHOTS
+from session_manager.storage.archive import (
+    ArchiveError,
+    export_archive,
+    import_archive,
+    format_archive_report
+)
+
+__all__ = [
+    'SessionFileStore',
+    'normalize_session_data',
+    'sanitize_session_data',
+    'session_counts',
+    'export_session_file',
+    'read_session_file',
+    'serialize_session',
+    'deserialize_session',
+    'FORMAT_JSON',
+    'FORMAT_COMPACT',
+    'SessionJournal',
+    'DEFAULT_JOURNAL_COMPACT_BYTES',
+    'DEFAULT_SYNC_INTERVAL',
+    'SQLiteSessionStore',
+    'SessionHistory',
+    'DEFAULT_MAX_SNAPSHOTS',
+    'ArchiveError',
+    'export_archive',
+    'import_archive',
+    'format_archive_report'
+]
@@ -0,0 +1,206 @@
+"""
+storage/archive.py
+多个会话的流式归档导入导出。
+
+归档为 JSON Lines 文件（文件名以 .gz 结尾时使用 gzip 压缩），逐个会话读写，
+内存占用与会话总量无关:
+    {"format": "wsm-archive", "version": 1, "created_at": ...}    文件头
+    {"name": 会话名, "data": 会话数据}                               每个会话一行
+    {"end": true, "count": 会话数}                                  文件尾，用于检测截断
+"""
+
+import os
+import gzip
+import json
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from session_manager.storage.file_store import sanitize_session_data
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = "wsm-archive"
+ARCHIVE_VERSION = 1
+DEFAULT_IMPORT_WORKERS = 4
+# 导入时每写入这么多字节就写一次检查点，使未落盘的会话内容不会在内存中累积
+CHECKPOINT_BYTES = 32 * 1024 * 1024
+
+
+class ArchiveError(ValueError):
+    """归档文件格式无效"""
+
+
+def _open_archive(path, mode, compressed=None):
+    if compressed is None:
+        compressed = path.endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode + "b")
+    return open(path, mode + "b")
+
+
+def _iter_manager_sessions(manager, names):
+    if names is None and hasattr(manager, "iter_sessions"):
+        # 文件存储逐个读取会话，不占用 LRU 缓存
+        yield from manager.iter_sessions()
+        return
+    for name in names if names is not None else manager.get_session_names():
+        yield name, manager.get_session(name)
+
+
+def _throughput(stats, elapsed):
+    stats["elapsed_ms"] = round(elapsed * 1000, 1)
+    stats["mb_per_s"] = round(stats["bytes"] / 1024 / 1024 / elapsed, 2) if elapsed > 0 else 0.0
+    stats["sessions_per_s"] = round(stats["sessions"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def export_archive(manager, path, names=None, progress=None):
+    """
+    将会话逐个写入归档。
+
+    参数:
+        names: 要导出的会话名列表，None 表示全部
+        progress: 可选回调 progress(已导出会话数, 已写入字节数)
+
+    返回:
+        {"sessions", "bytes", "elapsed_ms", "mb_per_s", "sessions_per_s"}
+    """
+    start = time.perf_counter()
+    stats = {"sessions": 0, "bytes": 0}
+    tmp_path = f"{path}.tmp"
+    try:
+        with _open_archive(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+            header = {"format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION, "created_at": time.time()}
+            f.write(json.dumps(header).encode('utf-8') + b"\n")
+            for name, session_data in _iter_manager_sessions(manager, names):
+                line = json.dumps({"name": name, "data": session_data}, ensure_ascii=False,
+                                  separators=(',', ':')).encode('utf-8') + b"\n"
+                f.write(line)
+                stats["sessions"] += 1
+                stats["bytes"] += len(line)
+                if progress:
+                    progress(stats["sessions"], stats["bytes"])
+            f.write(json.dumps({"end": True, "count": stats["sessions"]}).encode('utf-8') + b"\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        # 写入失败或被取消（progress 回调抛出 TaskCancelled）时删除未完成的临时文件
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _throughput(stats, time.perf_counter() - start)
+    logger.info(f"已导出 {stats['sessions']} 个会话到 {path}（{stats['mb_per_s']} MB/s）")
+    return stats
+
+
+def _validate_line(line):
+    """在工作线程中解析并校验一行会话记录，返回 (会话名, 会话数据, 丢弃条目数, 错误)"""
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        return None, None, 0, f"JSON 解析失败: {e}"
+    if not isinstance(record, dict) or not isinstance(record.get("name"), str) or not record["name"]:
+        return None, None, 0, "缺少会话名"
+    session_data, skipped = sanitize_session_data(record.get("data"))
+    if session_data is None:
+        return record["name"], None, 0, "会话数据格式无效"
+    return record["name"], session_data, skipped, None
+
+
+def _read_header(f):
+    try:
+        header = json.loads(f.readline())
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != ARCHIVE_FORMAT:
+        raise ArchiveError("不是会话归档文件")
+    if header.get("version", 0) > ARCHIVE_VERSION:
+        raise ArchiveError(f"不支持的归档版本: {header.get('version')}")
+    return header
+
+
+def import_archive(manager, path, overwrite=False, workers=DEFAULT_IMPORT_WORKERS, progress=None):
+    """
+    从归档逐个导入会话。解析和校验在线程池中进行，写入按归档中的顺序执行，
+    同时处理中的会话数不超过 workers 的两倍。
+
+    参数:
+        overwrite: 是否覆盖同名会话；为 False 时跳过已存在的会话
+        progress: 可选回调 progress(已处理会话数, 已读取字节数)
+
+    返回:
+        {"sessions", "imported", "skipped", "invalid", "dropped_items", "bytes", "complete",
+         "elapsed_ms", "mb_per_s", "sessions_per_s"}
+    """
+    start = time.perf_counter()
+    stats = {"sessions": 0, "imported": 0, "skipped": 0, "invalid": 0, "dropped_items": 0,
+             "bytes": 0, "complete": False}
+    existing = set(manager.get_session_names())
+    checkpoint = getattr(manager, "checkpoint", None)
+    bytes_since_checkpoint = 0
+    max_in_flight = max(1, workers) * 2
+
+    def handle(future, size):
+        nonlocal bytes_since_checkpoint
+        name, session_data, dropped, error = future.result()
+        stats["sessions"] += 1
+        if error:
+            stats["invalid"] += 1
+            logger.warning(f"跳过无效的归档记录{f' {name!r}' if name else ''}: {error}")
+        elif name in existing and not overwrite:
+            stats["skipped"] += 1
+        elif manager.set_session(name, session_data):
+            existing.add(name)
+            stats["imported"] += 1
+            stats["dropped_items"] += dropped
+            bytes_since_checkpoint += size
+            if checkpoint is not None and bytes_since_checkpoint >= CHECKPOINT_BYTES:
+                checkpoint()
+                bytes_since_checkpoint = 0
+        else:
+            stats["invalid"] += 1
+        if progress:
+            progress(stats["sessions"], stats["bytes"])
+
+    with _open_archive(path, "r") as f, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="archive-import") as executor:
+        _read_header(f)
+        in_flight = deque()
+        for line in f:
+            stats["bytes"] += len(line)
+            if line.startswith(b'{"end":'):
+                stats["complete"] = True
+                break
+            if not line.strip():
+                continue
+            in_flight.append((executor.submit(_validate_line, line), len(line)))
+            if len(in_flight) >= max_in_flight:
+                handle(*in_flight.popleft())
+        while in_flight:
+            handle(*in_flight.popleft())
+
+    if checkpoint is not None and bytes_since_checkpoint:
+        checkpoint()
+    else:
+        manager.save_sessions()
+    if not stats["complete"]:
+        logger.warning(f"归档 {path} 缺少文件尾，可能不完整")
+    _throughput(stats, time.perf_counter() - start)
+    logger.info(f"已从 {path} 导入 {stats['imported']} 个会话（跳过 {stats['skipped']}，"
+                f"无效 {stats['invalid']}，{stats['mb_per_s']} MB/s）")
+    return stats
+
+
+def format_archive_report(stats):
+    """格式化导入导出统计"""
+    parts = [f"会话 {stats['sessions']} 个"]
+    if "imported" in stats:
+        parts.append(f"导入 {stats['imported']}，跳过 {stats['skipped']}，无效 {stats['invalid']}")
+        if not stats["complete"]:
+            parts.append("归档不完整")
+    parts.append(f"{stats['bytes'] / 1024 / 1024:.1f} MB，耗时 {stats['elapsed_ms'] / 1000:.1f}s，"
+                 f"{stats['mb_per_s']} MB/s，{stats['sessions_per_s']} 会话/s")
+    return "，".join(parts)
@@ -0,0 +1,278 @@
+"""
+storage/compact_format.py
+紧凑的二进制会话格式。
+
+重复出现的字符串（可执行文件路径、浏览器名、字段名、URL 前缀等）只在字符串表中保存一次，
+字典的键集合保存在结构表中，相同的标签页只保存一次并以索引数组引用，最后用 lz4 压缩。
+与现有的字典结构可以无损互相转换。
+
+文件布局:
+    MAGIC(4) | 版本(1) | 标志(1) | 正文（标志含 FLAG_LZ4 时为 lz4 block 压缩数据）
+
+正文:
+    字符串表 | 结构表 | 标签页表 | 根值
+"""
+
+import struct
+
+import lz4.block
+
+MAGIC = b"WSMC"
+FORMAT_VERSION = 1
+FLAG_LZ4 = 0x01
+
+# 值类型标签
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_LIST = 6
+TAG_DICT = 7
+TAG_SHAPED_DICT = 8
+TAG_URL = 9
+TAG_TAB_LIST = 10
+
+_DOUBLE = struct.Struct("<d")
+
+
+class CompactFormatError(ValueError):
+    """数据不是有效的紧凑会话格式"""
+
+
+def is_compact(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def _write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _split_url(url):
+    """将 URL 拆分为 (scheme://host/ 前缀, 其余部分)，无法拆分时返回 None"""
+    scheme_end = url.find("://")
+    if scheme_end <= 0:
+        return None
+    path_start = url.find("/", scheme_end + 3)
+    if path_start < 0:
+        return url, ""
+    return url[:path_start + 1], url[path_start + 1:]
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings = {}
+        self.shapes = {}
+        self.tabs = {}
+        self.tab_table = []
+
+    def string(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+
+    def shape(self, keys):
+        index = self.shapes.get(keys)
+        if index is None:
+            index = self.shapes[keys] = len(self.shapes)
+            for k in keys:
+                self.string(k)
+        return index
+
+    def tab(self, tab):
+        encoded = bytearray()
+        self.value(encoded, tab)
+        encoded = bytes(encoded)
+        index = self.tabs.get(encoded)
+        if index is None:
+            index = self.tabs[encoded] = len(self.tab_table)
+            self.tab_table.append(encoded)
+        return index
+
+    def value(self, out, value, key=None):
+        if value is None:
+            out.append(TAG_NONE)
+        elif value is True:
+            out.append(TAG_TRUE)
+        elif value is False:
+            out.append(TAG_FALSE)
+        elif isinstance(value, int):
+            out.append(TAG_INT)
+            _write_varint(out, _zigzag(value))
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT)
+            out += _DOUBLE.pack(value)
+        elif isinstance(value, str):
+            parts = _split_url(value) if key == "url" else None
+            if parts:
+                out.append(TAG_URL)
+                _write_varint(out, self.string(parts[0]))
+                _write_varint(out, self.string(parts[1]))
+            else:
+                out.append(TAG_STR)
+                _write_varint(out, self.string(value))
+        elif isinstance(value, (list, tuple)):
+            if key == "tabs" and value and all(isinstance(item, dict) for item in value):
+                out.append(TAG_TAB_LIST)
+                _write_varint(out, len(value))
+                for item in value:
+                    _write_varint(out, self.tab(item))
+            else:
+                out.append(TAG_LIST)
+                _write_varint(out, len(value))
+                for item in value:
+                    self.value(out, item)
+        elif isinstance(value, dict):
+            if all(isinstance(k, str) for k in value):
+                out.append(TAG_SHAPED_DICT)
+                _write_varint(out, self.shape(tuple(value)))
+                for k, v in value.items():
+                    self.value(out, v, k)
+            else:
+                out.append(TAG_DICT)
+                _write_varint(out, len(value))
+                for k, v in value.items():
+                    self.value(out, k)
+                    self.value(out, v, k)
+        else:
+            raise TypeError(f"不支持的会话数据类型: {type(value).__name__}")
+
+    def tables(self):
+        out = bytearray()
+        _write_varint(out, len(self.strings))
+        for text in self.strings:
+            data = text.encode('utf-8')
+            _write_varint(out, len(data))
+            out += data
+        _write_varint(out, len(self.shapes))
+        for keys in self.shapes:
+            _write_varint(out, len(keys))
+            for k in keys:
+                _write_varint(out, self.string(k))
+        _write_varint(out, len(self.tab_table))
+        for encoded in self.tab_table:
+            out += encoded
+        return out
+
+
+class _Decoder:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+        self.strings = []
+        self.shapes = []
+        self.tab_table = []
+
+    def varint(self):
+        result = 0
+        shift = 0
+        data = self.data
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+    def tables(self):
+        for _ in range(self.varint()):
+            length = self.varint()
+            self.strings.append(bytes(self.data[self.pos:self.pos + length]).decode('utf-8'))
+            self.pos += length
+        for _ in range(self.varint()):
+            self.shapes.append(tuple(self.strings[self.varint()] for _ in range(self.varint())))
+        for _ in range(self.varint()):
+            self.tab_table.append(self.value())
+
+    def value(self):
+        tag = self.data[self.pos]
+        self.pos += 1
+        if tag == TAG_SHAPED_DICT:
+            keys = self.shapes[self.varint()]
+            return {k: self.value() for k in keys}
+        if tag == TAG_STR:
+            return self.strings[self.varint()]
+        if tag == TAG_URL:
+            prefix = self.strings[self.varint()]
+            return prefix + self.strings[self.varint()]
+        if tag == TAG_INT:
+            return _unzigzag(self.varint())
+        if tag == TAG_TAB_LIST:
+            return [_copy(self.tab_table[self.varint()]) for _ in range(self.varint())]
+        if tag == TAG_LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == TAG_NONE:
+            return None
+        if tag == TAG_TRUE:
+            return True
+        if tag == TAG_FALSE:
+            return False
+        if tag == TAG_FLOAT:
+            value = _DOUBLE.unpack_from(self.data, self.pos)[0]
+            self.pos += _DOUBLE.size
+            return value
+        if tag == TAG_DICT:
+            result = {}
+            for _ in range(self.varint()):
+                k = self.value()
+                result[k] = self.value()
+            return result
+        raise CompactFormatError(f"未知的值类型标签: {tag}")
+
+
+def _copy(value):
+    """复制标签页表中的值，避免多个窗口共享同一个字典"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def dumps(session_data, compress=True):
+    """将会话数据编码为紧凑二进制格式"""
+    encoder = _Encoder()
+    root = bytearray()
+    encoder.value(root, session_data)
+    body = bytes(encoder.tables() + root)
+    flags = 0
+    if compress:
+        body = lz4.block.compress(body, store_size=True)
+        flags |= FLAG_LZ4
+    return MAGIC + bytes((FORMAT_VERSION, flags)) + body
+
+
+def loads(data):
+    """解码紧凑二进制格式的会话数据"""
+    if not is_compact(data) or len(data) < len(MAGIC) + 2:
+        raise CompactFormatError("缺少紧凑会话格式文件头")
+    version, flags = data[len(MAGIC)], data[len(MAGIC) + 1]
+    if version > FORMAT_VERSION:
+        raise CompactFormatError(f"不支持的紧凑会话格式版本: {version}")
+    body = data[len(MAGIC) + 2:]
+    if flags & FLAG_LZ4:
+        body = lz4.block.decompress(body)
+    decoder = _Decoder(memoryview(body))
+    try:
+        decoder.tables()
+        return decoder.value()
+    except (IndexError, UnicodeDecodeError) as e:
+        raise CompactFormatError(f"紧凑会话数据已损坏: {e}") from e
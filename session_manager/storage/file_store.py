@@ -0,0 +1,349 @@
+"""
+storage/file_store.py
+按会话分文件存储：每个会话保存为 sessions_dir 下的一个文件，另有一个记录
+会话名称、文件名和校验和的小型清单文件。只重写内容发生变化的会话，
+所有写入均通过临时文件 + 重命名原子完成。
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+
+from session_manager.utils import atomic_write_bytes, atomic_write_json
+from session_manager.storage import compact_format
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+SESSION_FILE_SUFFIX = ".json"
+COMPACT_FILE_SUFFIX = ".wsmc"
+
+# 会话文件格式
+FORMAT_JSON = "json"
+FORMAT_COMPACT = "compact"
+
+
+def normalize_session_data(session_value):
+    """将会话数据统一为 {"applications": [...], ...} 格式，格式无效时返回 None"""
+    if isinstance(session_value, list):
+        # 旧格式：直接是应用列表
+        return {"applications": session_value}
+    if isinstance(session_value, dict) and "applications" in session_value:
+        return session_value
+    return None
+
+
+def sanitize_session_data(value):
+    """
+    校验导入的会话数据：接受应用列表（旧格式）或 export_session 写出的会话字典，
+    丢弃不是字典的应用条目和浏览器窗口。
+
+    返回:
+        (会话数据, 丢弃的条目数)，格式无效时会话数据为 None
+    """
+    session_data = normalize_session_data(value)
+    if session_data is None or not isinstance(session_data.get("applications"), list):
+        return None, 0
+    session_data = dict(session_data)
+    applications = session_data["applications"]
+    session_data["applications"] = [app for app in applications if isinstance(app, dict)]
+    skipped = len(applications) - len(session_data["applications"])
+    windows = session_data.get("browser_windows")
+    if windows is not None:
+        if not isinstance(windows, list):
+            return None, 0
+        session_data["browser_windows"] = [w for w in windows if isinstance(w, dict)]
+        skipped += len(windows) - len(session_data["browser_windows"])
+    return session_data, skipped
+
+
+def export_session_file(session_data, export_path):
+    """将单个会话导出为带缩进的 JSON 文件，返回是否成功"""
+    try:
+        with open(export_path, 'w', encoding='utf-8') as f:
+            json.dump(session_data, f, ensure_ascii=False, indent=4)
+        return True
+    except Exception as e:
+        logger.error(f"导出会话失败: {e}")
+        return False
+
+
+def read_session_file(import_path, new_name):
+    """
+    读取 export_session_file 导出的会话（或旧格式的应用列表），非法条目自动跳过。
+
+    返回:
+        会话数据，读取失败或格式无效时返回 None
+    """
+    try:
+        with open(import_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+    except Exception as e:
+        logger.error(f"导入会话失败: {e}")
+        return None
+    session_data, skipped = sanitize_session_data(items)
+    if session_data is None:
+        logger.error("导入会话失败：文件内容既不是应用列表也不是会话数据。")
+        return None
+    if skipped:
+        logger.warning(f"导入会话 '{new_name}' 时发现非法项，已自动跳过。")
+    return session_data
+
+
+def session_counts(session_data):
+    """返回会话的 (应用数, 标签页数)"""
+    tabs = 0
+    for window in session_data.get("browser_windows") or []:
+        if isinstance(window, dict) and isinstance(window.get("tabs"), list):
+            tabs += len(window["tabs"])
+    return len(session_data.get("applications", [])), tabs
+
+
+def serialize_session(session_data, session_format=FORMAT_JSON):
+    """序列化会话数据为紧凑 JSON 字节，或 session_format="compact" 时为紧凑二进制格式"""
+    if session_format == FORMAT_COMPACT:
+        return compact_format.dumps(session_data)
+    return json.dumps(session_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def deserialize_session(payload):
+    """根据文件头自动识别格式并解析会话数据"""
+    if compact_format.is_compact(payload):
+        return compact_format.loads(payload)
+    return json.loads(payload.decode('utf-8'))
+
+
+def session_checksum(payload):
+    return hashlib.sha1(payload).hexdigest()
+
+
+class SessionFileStore:
+    """
+    每个会话一个文件的存储。
+
+    清单格式:
+        {"version": 1, "sessions": {会话名: {"file", "checksum", "size", "saved_at", "apps", "tabs"}}}
+
+    清单中的会话顺序即会话列表顺序。重命名只修改清单，不移动会话文件。
+    每次写入清单后再写一份副本 manifest.json.bak，清单损坏时用于恢复会话名。
+    """
+
+    def __init__(self, sessions_dir, backup=False, session_format=FORMAT_JSON):
+        self.sessions_dir = sessions_dir
+        self.backup = backup
+        self.session_format = session_format
+        self.manifest_path = os.path.join(sessions_dir, MANIFEST_FILE_NAME)
+        os.makedirs(sessions_dir, exist_ok=True)
+        self.entries = {}
+        self.manifest_extra = {}
+
+    # --- 清单 ---
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    @staticmethod
+    def _read_manifest(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("sessions", {}), dict):
+            raise ValueError("清单格式无效")
+        return manifest
+
+    def load_manifest(self):
+        """读取清单，返回是否成功"""
+        if not self.exists():
+            return False
+        try:
+            manifest = self._read_manifest(self.manifest_path)
+            self.entries = dict(manifest.get("sessions", {}))
+            self.manifest_extra = {k: v for k, v in manifest.items() if k not in ("version", "sessions")}
+            return True
+        except Exception as e:
+            logger.error(f"读取会话清单失败 {self.manifest_path}: {e}")
+            return False
+
+    def write_manifest(self, **extra):
+        self.manifest_extra.update(extra)
+        manifest = {"version": MANIFEST_VERSION}
+        manifest.update(self.manifest_extra)
+        manifest["sessions"] = self.entries
+        atomic_write_json(self.manifest_path, manifest)
+        try:
+            atomic_write_json(f"{self.manifest_path}.bak", manifest)
+        except Exception as e:
+            logger.warning(f"备份会话清单失败: {e}")
+
+    def session_files(self):
+        """会话目录中的会话文件名（不含清单、备份和临时文件）"""
+        try:
+            names = os.listdir(self.sessions_dir)
+        except OSError:
+            return []
+        return sorted(name for name in names
+                      if name.endswith((SESSION_FILE_SUFFIX, COMPACT_FILE_SUFFIX)) and name != MANIFEST_FILE_NAME)
+
+    def recover_entries(self):
+        """
+        清单缺失或损坏时根据会话文件重建清单条目（不写清单）。
+
+        会话名和顺序优先取自 manifest.json.bak，其中没有的文件按文件名命名为"已恢复的会话 <文件名>"。
+        损坏的清单改名为 manifest.json.corrupt 保留。
+
+        返回:
+            恢复的会话数量
+        """
+        known = {}
+        try:
+            backup = self._read_manifest(f"{self.manifest_path}.bak")
+            known = {entry.get("file"): name for name, entry in backup.get("sessions", {}).items()
+                     if isinstance(entry, dict)}
+        except Exception:
+            pass
+        if self.exists():
+            try:
+                os.replace(self.manifest_path, f"{self.manifest_path}.corrupt")
+            except OSError as e:
+                logger.warning(f"保留损坏的会话清单失败: {e}")
+
+        recovered = {}
+        for file_name in self.session_files():
+            path = os.path.join(self.sessions_dir, file_name)
+            try:
+                with open(path, 'rb') as f:
+                    payload = f.read()
+                data = normalize_session_data(deserialize_session(payload))
+            except Exception as e:
+                logger.warning(f"无法恢复会话文件 {path}: {e}")
+                continue
+            if data is None:
+                continue
+            name = known.get(file_name) or f"已恢复的会话 {os.path.splitext(file_name)[0]}"
+            apps, tabs = session_counts(data)
+            recovered[name] = {"file": file_name, "checksum": session_checksum(payload), "size": len(payload),
+                               "saved_at": os.path.getmtime(path), "apps": apps, "tabs": tabs}
+        # 备份清单中的会话保持原有顺序
+        order = {name: index for index, name in enumerate(known.values())}
+        self.entries = dict(sorted(recovered.items(), key=lambda item: order.get(item[0], len(order))))
+        self.manifest_extra = {}
+        return len(self.entries)
+
+    def names(self):
+        return list(self.entries.keys())
+
+    # --- 会话文件 ---
+    def _path(self, entry):
+        return os.path.join(self.sessions_dir, entry["file"])
+
+    def read_session(self, name):
+        """读取单个会话文件，失败时返回 None"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        path = self._path(entry)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            return deserialize_session(payload)
+        except Exception as e:
+            logger.error(f"读取会话文件失败 {path}: {e}")
+            backup_path = f"{path}.bak"
+            if os.path.exists(backup_path):
+                logger.warning(f"尝试从备份文件 {backup_path} 加载会话 '{name}'...")
+                try:
+                    with open(backup_path, 'rb') as f:
+                        return deserialize_session(f.read())
+                except Exception as backup_e:
+                    logger.error(f"从备份文件加载会话失败: {backup_e}")
+            return None
+
+    def load_all(self):
+        """读取清单中的所有会话，返回 {会话名: 会话数据}"""
+        sessions = {}
+        for name in self.names():
+            data = self.read_session(name)
+            if data is not None:
+                sessions[name] = data
+        return sessions
+
+    def write_session(self, name, session_data, payload=None):
+        """
+        写入单个会话文件（不写清单）。内容校验和未变化时跳过写入。
+
+        返回:
+            是否实际写入了文件
+        """
+        if payload is None:
+            payload = serialize_session(session_data, self.session_format)
+        checksum = session_checksum(payload)
+        entry = self.entries.get(name)
+        if entry is not None and entry.get("checksum") == checksum and os.path.exists(self._path(entry)):
+            return False
+
+        if entry is None:
+            suffix = COMPACT_FILE_SUFFIX if self.session_format == FORMAT_COMPACT else SESSION_FILE_SUFFIX
+            entry = {"file": uuid.uuid4().hex[:16] + suffix}
+        path = self._path(entry)
+        if self.backup and os.path.exists(path):
+            try:
+                shutil.copyfile(path, f"{path}.bak")
+            except Exception as e:
+                logger.warning(f"创建会话备份失败 {path}: {e}")
+
+        atomic_write_bytes(path, payload)
+        apps, tabs = session_counts(session_data)
+        entry.update({"checksum": checksum, "size": len(payload), "saved_at": time.time(),
+                      "apps": apps, "tabs": tabs})
+        self.entries[name] = entry
+        return True
+
+    def remove_session(self, name):
+        """从清单移除会话并删除其文件（不写清单）"""
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return False
+        path = self._path(entry)
+        for file_path in (path, f"{path}.bak"):
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except Exception as e:
+                logger.warning(f"删除会话文件失败 {file_path}: {e}")
+        return True
+
+    def rename_session(self, old_name, new_name):
+        """仅修改清单中的会话名，保持原有顺序（不写清单）"""
+        if old_name not in self.entries or new_name in self.entries:
+            return False
+        self.entries = {
+            (new_name if name == old_name else name): entry
+            for name, entry in self.entries.items()
+        }
+        return True
+
+    def reorder(self, names):
+        """按给定顺序排列清单条目，未列出的条目保留在末尾"""
+        ordered = {name: self.entries[name] for name in names if name in self.entries}
+        ordered.update((name, entry) for name, entry in self.entries.items() if name not in ordered)
+        self.entries = ordered
+
+    def save_all(self, all_sessions):
+        """
+        以整体字典形式保存所有会话：只写入内容变化的会话，删除多余的会话文件。
+
+        返回:
+            实际写入的会话数量
+        """
+        written = 0
+        for name in [n for n in self.entries if n not in all_sessions]:
+            self.remove_session(name)
+        for name, data in all_sessions.items():
+            if self.write_session(name, data):
+                written += 1
+        self.reorder(list(all_sessions.keys()))
+        self.write_manifest()
+        return written
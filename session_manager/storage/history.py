@@ -0,0 +1,287 @@
+"""
+storage/history.py
+会话快照历史：每次保存会话时记录一个快照。快照中的每个应用条目和每个浏览器窗口
+分别作为按内容寻址的数据块保存，未变化的窗口在快照之间共享，新快照只需写入发生变化的部分。
+
+保存会话时用 record_later 把快照交给后台线程写入，保存本身不等待计算摘要和写文件；
+读取、重命名、删除和清理前先等待已提交的快照写完（flush）。
+"""
+
+import os
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from session_manager.utils import atomic_write_bytes, atomic_write_json
+from session_manager.storage.file_store import session_counts
+
+logger = logging.getLogger(__name__)
+
+CHUNKS_DIR_NAME = "chunks"
+INDEX_DIR_NAME = "index"
+DEFAULT_MAX_SNAPSHOTS = 10
+# 内存中缓存的数据块数量
+CHUNK_CACHE_SIZE = 1024
+
+
+def _encode_chunk(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class SessionHistory:
+    """
+    按会话保存快照历史。
+
+    目录结构:
+        chunks/<摘要前两位>/<摘要>   单个应用条目、浏览器窗口或会话其他字段的 JSON
+        index/<会话名摘要>.json       {"name", "next_id", "snapshots": [快照]}
+
+    快照格式:
+        {"id", "saved_at", "apps": [摘要], "windows": [摘要] 或 None, "extra": 摘要或 None,
+         "app_count", "tab_count"}
+    """
+
+    def __init__(self, history_dir, max_snapshots=DEFAULT_MAX_SNAPSHOTS):
+        self.history_dir = history_dir
+        self.max_snapshots = max(1, max_snapshots)
+        self.chunks_dir = os.path.join(history_dir, CHUNKS_DIR_NAME)
+        self.index_dir = os.path.join(history_dir, INDEX_DIR_NAME)
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._chunk_cache = OrderedDict()
+        # 自上次清理以来是否有快照被删除（需要回收数据块）
+        self.needs_gc = False
+        # 等待后台写入的快照 (会话名, 会话数据, 保存时间)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    # --- 数据块 ---
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _put_chunk(self, value):
+        payload = _encode_chunk(value)
+        digest = hashlib.sha1(payload).hexdigest()
+        path = self._chunk_path(digest)
+        if digest not in self._chunk_cache and not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write_bytes(path, payload, fsync=False)
+        self._cache_chunk(digest, payload)
+        return digest
+
+    def _cache_chunk(self, digest, payload):
+        self._chunk_cache[digest] = payload
+        self._chunk_cache.move_to_end(digest)
+        while len(self._chunk_cache) > CHUNK_CACHE_SIZE:
+            self._chunk_cache.popitem(last=False)
+
+    def _get_chunk(self, digest):
+        payload = self._chunk_cache.get(digest)
+        if payload is None:
+            with open(self._chunk_path(digest), 'rb') as f:
+                payload = f.read()
+            self._cache_chunk(digest, payload)
+        else:
+            self._chunk_cache.move_to_end(digest)
+        return json.loads(payload.decode('utf-8'))
+
+    # --- 快照索引 ---
+    def _index_path(self, name):
+        return os.path.join(self.index_dir, hashlib.sha1(name.encode('utf-8')).hexdigest()[:16] + ".json")
+
+    def _load_index(self, name):
+        path = self._index_path(name)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get("name") == name:
+                    return index
+            except Exception as e:
+                logger.warning(f"读取会话历史索引失败 {path}: {e}")
+        return {"name": name, "next_id": 1, "snapshots": []}
+
+    def _save_index(self, index):
+        atomic_write_json(self._index_path(index["name"]), index, fsync=False)
+
+    # --- 后台写入 ---
+    def record_later(self, name, session_data):
+        """提交一个快照，由后台线程调用 record 写入。session_data 提交后不应再被修改"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="session-history", daemon=True)
+                self._writer.start()
+        self._queue.put((name, session_data, time.time()))
+
+    def _write_loop(self):
+        while True:
+            name, session_data, saved_at = self._queue.get()
+            try:
+                self.record(name, session_data, saved_at=saved_at)
+            except Exception as e:
+                logger.error(f"记录会话 '{name}' 的快照失败: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """等待已提交的快照全部写完（调用方不能持有 self._lock）"""
+        self._queue.join()
+
+    # --- 快照 ---
+    def record(self, name, session_data, saved_at=None):
+        """
+        记录一个快照。内容与最近一次快照相同时不记录。
+
+        参数:
+            saved_at: 保存时间，默认为当前时间
+
+        返回:
+            新快照的 id，未记录时返回 None
+        """
+        with self._lock:
+            try:
+                apps = [self._put_chunk(app) for app in session_data.get("applications", [])]
+                windows = session_data.get("browser_windows")
+                if windows is not None:
+                    windows = [self._put_chunk(window) for window in windows]
+                extra = {k: v for k, v in session_data.items() if k not in ("applications", "browser_windows")}
+                extra = self._put_chunk(extra) if extra else None
+            except Exception as e:
+                logger.error(f"写入会话 '{name}' 的历史数据块失败: {e}")
+                return None
+
+            index = self._load_index(name)
+            snapshots = index["snapshots"]
+            if snapshots:
+                last = snapshots[-1]
+                if last["apps"] == apps and last["windows"] == windows and last["extra"] == extra:
+                    return None
+
+            app_count, tab_count = session_counts(session_data)
+            snapshot_id = index["next_id"]
+            snapshots.append({
+                "id": snapshot_id,
+                "saved_at": saved_at if saved_at is not None else time.time(),
+                "apps": apps,
+                "windows": windows,
+                "extra": extra,
+                "app_count": app_count,
+                "tab_count": tab_count
+            })
+            index["next_id"] = snapshot_id + 1
+            if len(snapshots) > self.max_snapshots:
+                del snapshots[:len(snapshots) - self.max_snapshots]
+                self.needs_gc = True
+            self._save_index(index)
+            return snapshot_id
+
+    def list_snapshots(self, name):
+        """返回会话的快照列表 [{"id", "saved_at", "apps", "tabs"}]，按时间从旧到新"""
+        self.flush()
+        with self._lock:
+            return [
+                {"id": s["id"], "saved_at": s["saved_at"], "apps": s["app_count"], "tabs": s["tab_count"]}
+                for s in self._load_index(name)["snapshots"]
+            ]
+
+    def get_snapshot(self, name, snapshot_id=None, as_of=None):
+        """
+        还原快照中的会话数据。
+
+        参数:
+            snapshot_id: 快照 id，None 表示最新快照
+            as_of: 时间戳，返回在此时间之前保存的最后一个快照（与 snapshot_id 二选一）
+
+        返回:
+            会话数据，找不到快照时返回 None
+        """
+        self.flush()
+        with self._lock:
+            snapshots = self._load_index(name)["snapshots"]
+            if as_of is not None:
+                snapshots = [s for s in snapshots if s["saved_at"] <= as_of]
+            elif snapshot_id is not None:
+                snapshots = [s for s in snapshots if s["id"] == snapshot_id]
+            if not snapshots:
+                return None
+            snapshot = snapshots[-1]
+            try:
+                session_data = {"applications": [self._get_chunk(d) for d in snapshot["apps"]]}
+                if snapshot["windows"] is not None:
+                    session_data["browser_windows"] = [self._get_chunk(d) for d in snapshot["windows"]]
+                if snapshot["extra"]:
+                    session_data.update(self._get_chunk(snapshot["extra"]))
+            except Exception as e:
+                logger.error(f"读取会话 '{name}' 的快照 {snapshot['id']} 失败: {e}")
+                return None
+            return session_data
+
+    def rename(self, old_name, new_name):
+        """历史随会话一起重命名"""
+        self.flush()
+        with self._lock:
+            index = self._load_index(old_name)
+            if not index["snapshots"]:
+                return
+            index["name"] = new_name
+            self._save_index(index)
+            self.remove(old_name)
+
+    def remove(self, name):
+        """删除会话的全部快照，数据块在下次 prune 时回收"""
+        self.flush()
+        with self._lock:
+            path = self._index_path(name)
+            if os.path.exists(path):
+                os.remove(path)
+                self.needs_gc = True
+
+    def prune(self):
+        """
+        按保留数量裁剪所有会话的快照，并删除不再被任何快照引用的数据块。
+
+        返回:
+            删除的数据块数量
+        """
+        self.flush()
+        with self._lock:
+            referenced = set()
+            for file_name in os.listdir(self.index_dir):
+                path = os.path.join(self.index_dir, file_name)
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        index = json.load(f)
+                except Exception as e:
+                    logger.warning(f"读取会话历史索引失败 {path}: {e}")
+                    continue
+                snapshots = index.get("snapshots", [])
+                if len(snapshots) > self.max_snapshots:
+                    index["snapshots"] = snapshots = snapshots[-self.max_snapshots:]
+                    self._save_index(index)
+                for snapshot in snapshots:
+                    referenced.update(snapshot["apps"])
+                    referenced.update(snapshot["windows"] or ())
+                    if snapshot["extra"]:
+                        referenced.add(snapshot["extra"])
+
+            removed = 0
+            for prefix in os.listdir(self.chunks_dir):
+                prefix_dir = os.path.join(self.chunks_dir, prefix)
+                for digest in os.listdir(prefix_dir):
+                    if digest not in referenced:
+                        try:
+                            os.remove(os.path.join(prefix_dir, digest))
+                            self._chunk_cache.pop(digest, None)
+                            removed += 1
+                        except OSError as e:
+                            logger.warning(f"删除历史数据块失败 {digest}: {e}")
+            self.needs_gc = False
+            if removed:
+                logger.info(f"已回收 {removed} 个会话历史数据块")
+            return removed
@@ -0,0 +1,211 @@
+"""
+storage/journal.py
+会话变更日志：每次修改（设置、删除、重命名、清空）作为一条记录追加到日志文件，
+由后台线程分组 fsync。加载时在最近一次检查点之上重放日志，写入中途崩溃
+只会留下不完整的末尾记录，重放时会被截断丢弃。
+"""
+
+import os
+import json
+import time
+import zlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_PREFIX = "journal."
+JOURNAL_SUFFIX = ".log"
+
+# 默认分组 fsync 间隔（秒）
+DEFAULT_SYNC_INTERVAL = 0.2
+# 日志超过此大小（字节）时触发后台压缩
+DEFAULT_JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+
+def encode_record(record):
+    """编码为一行: <crc32 十六进制>\\t<JSON>\\n"""
+    payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return b"%08x\t" % zlib.crc32(payload) + payload + b"\n"
+
+
+def decode_record(line):
+    """解码一行记录，记录不完整或校验失败时返回 None"""
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        checksum, payload = line[:-1].split(b"\t", 1)
+        if int(checksum, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload.decode('utf-8'))
+    except Exception:
+        return None
+
+
+class SessionJournal:
+    """
+    追加写入的变更日志。
+
+    日志按代（generation）分文件: journal.<代号>.log。每次打开或压缩时开始新的一代，
+    检查点写完后即可删除旧代文件。每条记录带有递增的序号 seq。
+    """
+
+    def __init__(self, directory, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self.seq = 0
+        self._cond = threading.Condition()
+        self._file = None
+        self._path = None
+        self._size = 0
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._closed = False
+        self._syncer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def generations(self):
+        """返回按代号排序的 [(代号, 路径)]"""
+        result = []
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith(JOURNAL_PREFIX) and file_name.endswith(JOURNAL_SUFFIX):
+                try:
+                    generation = int(file_name[len(JOURNAL_PREFIX):-len(JOURNAL_SUFFIX)])
+                except ValueError:
+                    continue
+                result.append((generation, os.path.join(self.directory, file_name)))
+        result.sort()
+        return result
+
+    def replay(self, after_seq=0):
+        """
+        按顺序产出 seq 大于 after_seq 的记录。遇到不完整或损坏的记录时停止读取该文件，
+        并将其截断到最后一条有效记录之后。
+        """
+        self.seq = max(self.seq, after_seq)
+        for _, path in self.generations():
+            valid_end = 0
+            torn = False
+            with open(path, 'rb') as f:
+                for line in f:
+                    record = decode_record(line)
+                    if record is None:
+                        torn = True
+                        break
+                    valid_end += len(line)
+                    seq = record.get("seq", 0)
+                    self.seq = max(self.seq, seq)
+                    if seq > after_seq:
+                        yield record
+            if torn:
+                logger.warning(f"变更日志 {path} 末尾存在不完整记录，已截断到 {valid_end} 字节")
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+
+    def open(self):
+        """开始新的一代日志文件（最新一代为空时直接复用）并启动分组 fsync 线程"""
+        with self._cond:
+            generations = self.generations()
+            if generations and os.path.getsize(generations[-1][1]) == 0:
+                self._path = generations[-1][1]
+                self._file = open(self._path, 'ab')
+                self._size = 0
+            else:
+                self._open_generation()
+            self._closed = False
+        if self._syncer is None or not self._syncer.is_alive():
+            self._syncer = threading.Thread(target=self._sync_loop, name="session-journal-sync", daemon=True)
+            self._syncer.start()
+
+    def _open_generation(self):
+        generations = self.generations()
+        generation = generations[-1][0] + 1 if generations else 1
+        self._path = os.path.join(self.directory, f"{JOURNAL_PREFIX}{generation:08d}{JOURNAL_SUFFIX}")
+        self._file = open(self._path, 'ab')
+        self._size = 0
+
+    def append(self, record, durable=False):
+        """
+        追加一条记录。记录立即写入操作系统缓冲区，由后台线程分组 fsync；
+        durable=True 时等待本条记录落盘后再返回。
+
+        返回:
+            记录序号
+        """
+        with self._cond:
+            self.seq += 1
+            seq = self.seq
+            line = encode_record(dict(record, seq=seq))
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+            self._written_seq = seq
+            self._cond.notify_all()
+            if durable:
+                while self._synced_seq < seq and not self._closed:
+                    self._cond.wait()
+        return seq
+
+    def _fsync_locked(self):
+        if self._file is not None and self._synced_seq < self._written_seq:
+            os.fsync(self._file.fileno())
+        self._synced_seq = self._written_seq
+        self._cond.notify_all()
+
+    def _sync_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._synced_seq >= self._written_seq:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            # 等待一小段时间，让这段时间内的记录共用一次 fsync
+            time.sleep(self.sync_interval)
+            with self._cond:
+                try:
+                    self._fsync_locked()
+                except Exception as e:
+                    logger.error(f"变更日志 fsync 失败: {e}")
+
+    def sync(self):
+        """立即将已写入的记录落盘"""
+        with self._cond:
+            self._fsync_locked()
+
+    def size(self):
+        """当前这一代日志的字节数"""
+        return self._size
+
+    def rotate(self):
+        """
+        落盘并切换到新的一代日志文件。
+
+        返回:
+            (切换时的最大序号, 旧代日志文件路径列表)
+        """
+        with self._cond:
+            self._fsync_locked()
+            old_paths = [path for _, path in self.generations()]
+            self._file.close()
+            self._open_generation()
+            return self.seq, old_paths
+
+    @staticmethod
+    def discard(paths):
+        """删除已被检查点覆盖的旧代日志文件"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"删除旧变更日志失败 {path}: {e}")
+
+    def close(self):
+        with self._cond:
+            if self._file is not None:
+                self._fsync_locked()
+                self._file.close()
+                self._file = None
+            self._closed = True
+            self._cond.notify_all()
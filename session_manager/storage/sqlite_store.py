@@ -0,0 +1,503 @@
+"""
+storage/sqlite_store.py
+SQLite 会话存储：会话、应用、浏览器窗口和标签页分别存放在规范化的表中，
+按可执行文件路径、域名和 URL 建立索引，并用 FTS5 对窗口和标签页标题做全文索引。
+提供与 SessionManager 相同的接口，GUI 无需修改即可使用。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from session_manager.storage.file_store import normalize_session_data, export_session_file, read_session_file
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    position INTEGER NOT NULL,
+    saved_at REAL,
+    has_browser_windows INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS apps (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT,
+    process_path TEXT,
+    exe_path TEXT,
+    exe_name TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_apps_session ON apps(session_id, position);
+CREATE INDEX IF NOT EXISTS idx_apps_exe_path ON apps(exe_path);
+CREATE INDEX IF NOT EXISTS idx_apps_exe_name ON apps(exe_name);
+CREATE TABLE IF NOT EXISTS browser_windows (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT,
+    browser TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_browser_windows_session ON browser_windows(session_id, position);
+CREATE TABLE IF NOT EXISTS tabs (
+    id INTEGER PRIMARY KEY,
+    window_id INTEGER NOT NULL REFERENCES browser_windows(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT,
+    url TEXT,
+    domain TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tabs_window ON tabs(window_id, position);
+CREATE INDEX IF NOT EXISTS idx_tabs_url ON tabs(url);
+CREATE INDEX IF NOT EXISTS idx_tabs_domain ON tabs(domain);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5(
+    title,
+    kind UNINDEXED,
+    session_id UNINDEXED,
+    ref_id UNINDEXED
+);
+CREATE TABLE IF NOT EXISTS title_rowids (
+    session_id INTEGER NOT NULL,
+    fts_rowid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_title_rowids_session ON title_rowids(session_id);
+"""
+# titles_fts 的 UNINDEXED 列不能高效过滤，按会话删除标题时通过 title_rowids 找到 FTS 行的 rowid
+
+# 以独立列存储的字段；其余字段以 JSON 保存在 extra 列中，保证读写无损
+APP_COLUMNS = ("title", "process_path")
+WINDOW_COLUMNS = ("title", "browser")
+TAB_COLUMNS = ("title", "url")
+# 保存时没有 tabs 键的浏览器窗口在 extra 中带此标记，读取时不补 tabs
+NO_TABS_KEY = "__no_tabs__"
+
+
+def url_domain(url):
+    """返回 URL 的小写主机名，无法解析时返回 None"""
+    try:
+        hostname = urlsplit(url).hostname
+    except (ValueError, AttributeError):
+        return None
+    return hostname.lower() if hostname else None
+
+
+def _split_item(item, columns):
+    """将字典拆分为 (列值列表, extra JSON)。只有字符串值存入列，其余原样保存在 extra 中"""
+    values = []
+    extra = {}
+    for key in columns:
+        value = item.get(key)
+        values.append(value if isinstance(value, str) else None)
+    for key, value in item.items():
+        if key in columns and isinstance(value, str):
+            continue
+        extra[key] = value
+    return values, (json.dumps(extra, ensure_ascii=False) if extra else None)
+
+
+def _join_item(columns, values, extra):
+    item = {key: value for key, value in zip(columns, values) if value is not None}
+    if extra:
+        item.update(json.loads(extra))
+    return item
+
+
+class SQLiteSessionStore:
+    """
+    基于 SQLite 的会话管理器。
+
+    提供与 SessionManager 相同的 get_session_names / get_session / set_session 等接口，
+    另外支持按应用、域名、URL 和标题查询。每次修改在一个事务中完成，不需要单独保存。
+    """
+
+    def __init__(self, db_file, default_session_name="默认会话", history=None):
+        self.db_file = db_file
+        self.default_session_name = default_session_name
+        self.history = history
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta(key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+            )
+        try:
+            with self._conn:
+                self._conn.executescript(FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite 不支持 FTS5，标题搜索将使用 LIKE 查询: {e}")
+            self.fts_enabled = False
+        self._migrate()
+
+    def _migrate(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        version = int(row[0]) if row else SCHEMA_VERSION
+        if version >= SCHEMA_VERSION:
+            return
+        with self._conn:
+            if self.fts_enabled and version < 2:
+                # 版本 1 没有 title_rowids，为已有的标题补齐（只扫描一次）
+                self._conn.execute("DELETE FROM title_rowids")
+                self._conn.execute("INSERT INTO title_rowids(session_id, fts_rowid) "
+                                   "SELECT session_id, rowid FROM titles_fts")
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'schema_version'", (str(SCHEMA_VERSION),))
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None
+
+    def ensure_default_session(self):
+        """没有任何会话时创建默认会话"""
+        if self.is_empty():
+            logger.info(f"没有找到有效会话，创建默认会话: {self.default_session_name}")
+            self.set_session(self.default_session_name, {"applications": []})
+
+    # --- 写入 ---
+    def _session_id(self, name):
+        row = self._conn.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _clear_children(self, session_id):
+        self._conn.execute("DELETE FROM apps WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM browser_windows WHERE session_id = ?", (session_id,))
+        if self.fts_enabled:
+            self._conn.execute(
+                "DELETE FROM titles_fts WHERE rowid IN (SELECT fts_rowid FROM title_rowids WHERE session_id = ?)",
+                (session_id,)
+            )
+            self._conn.execute("DELETE FROM title_rowids WHERE session_id = ?", (session_id,))
+
+    def _index_title(self, title, kind, session_id, ref_id):
+        if self.fts_enabled and title:
+            rowid = self._conn.execute(
+                "INSERT INTO titles_fts(title, kind, session_id, ref_id) VALUES (?, ?, ?, ?)",
+                (title, kind, session_id, ref_id)
+            ).lastrowid
+            self._conn.execute("INSERT INTO title_rowids(session_id, fts_rowid) VALUES (?, ?)", (session_id, rowid))
+
+    def _write_session(self, name, session_data):
+        extra = {k: v for k, v in session_data.items() if k not in ("applications", "browser_windows")}
+        has_windows = 1 if "browser_windows" in session_data else 0
+        extra_json = json.dumps(extra, ensure_ascii=False) if extra else None
+
+        session_id = self._session_id(name)
+        if session_id is None:
+            position = self._conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM sessions").fetchone()[0]
+            session_id = self._conn.execute(
+                "INSERT INTO sessions(name, position, saved_at, has_browser_windows, extra) VALUES (?, ?, ?, ?, ?)",
+                (name, position, time.time(), has_windows, extra_json)
+            ).lastrowid
+        else:
+            self._conn.execute(
+                "UPDATE sessions SET saved_at = ?, has_browser_windows = ?, extra = ? WHERE id = ?",
+                (time.time(), has_windows, extra_json, session_id)
+            )
+            self._clear_children(session_id)
+
+        for position, app in enumerate(session_data.get("applications", [])):
+            (title, process_path), app_extra = _split_item(app, APP_COLUMNS)
+            exe_path = os.path.normcase(process_path) if process_path else None
+            exe_name = os.path.basename(exe_path) if exe_path else None
+            app_id = self._conn.execute(
+                "INSERT INTO apps(session_id, position, title, process_path, exe_path, exe_name, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, position, title, process_path, exe_path, exe_name, app_extra)
+            ).lastrowid
+            self._index_title(title, "app", session_id, app_id)
+
+        for position, window in enumerate(session_data.get("browser_windows") or []):
+            tabs = window.get("tabs")
+            if isinstance(tabs, list):
+                window = {k: v for k, v in window.items() if k != "tabs"}
+            elif "tabs" not in window:
+                window = {**window, NO_TABS_KEY: True}
+                tabs = []
+            else:
+                # 非列表的 tabs 值原样保存在 extra 中
+                tabs = []
+            (title, browser), window_extra = _split_item(window, WINDOW_COLUMNS)
+            window_id = self._conn.execute(
+                "INSERT INTO browser_windows(session_id, position, title, browser, extra) VALUES (?, ?, ?, ?, ?)",
+                (session_id, position, title, browser, window_extra)
+            ).lastrowid
+            self._index_title(title, "window", session_id, window_id)
+            for tab_position, tab in enumerate(tabs):
+                (tab_title, url), tab_extra = _split_item(tab, TAB_COLUMNS)
+                tab_id = self._conn.execute(
+                    "INSERT INTO tabs(window_id, position, title, url, domain, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                    (window_id, tab_position, tab_title, url, url_domain(url) if url else None, tab_extra)
+                ).lastrowid
+                self._index_title(tab_title, "tab", session_id, tab_id)
+        return session_id
+
+    def set_session(self, name, items):
+        """设置会话数据，确保格式正确"""
+        fixed = normalize_session_data(items)
+        if fixed is None:
+            logger.warning(f"尝试设置无效格式的会话数据: {name}")
+            fixed = {"applications": []}
+        try:
+            with self._lock, self._conn:
+                self._write_session(name, fixed)
+        except Exception as e:
+            logger.error(f"保存会话 '{name}' 到数据库失败: {e}", exc_info=True)
+            return False
+        if self.history is not None:
+            self.history.record_later(name, fixed)
+        return True
+
+    def delete_session(self, name):
+        with self._lock, self._conn:
+            session_id = self._session_id(name)
+            if session_id is None:
+                return False
+            self._clear_children(session_id)
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        if self.history is not None:
+            self.history.remove(name)
+        return True
+
+    def clear_session(self, name):
+        with self._lock, self._conn:
+            session_id = self._session_id(name)
+            if session_id is None:
+                return False
+            self._clear_children(session_id)
+            self._conn.execute(
+                "UPDATE sessions SET saved_at = ?, has_browser_windows = 0, extra = NULL WHERE id = ?",
+                (time.time(), session_id)
+            )
+        return True
+
+    def rename_session(self, old_name, new_name):
+        with self._lock, self._conn:
+            if self._session_id(new_name) is not None:
+                return False
+            cursor = self._conn.execute("UPDATE sessions SET name = ? WHERE name = ?", (new_name, old_name))
+        if cursor.rowcount == 0:
+            return False
+        if self.history is not None:
+            self.history.rename(old_name, new_name)
+        return True
+
+    def save_sessions(self):
+        """每次修改都已提交，这里只做一次 WAL 检查点"""
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            return True
+        except Exception as e:
+            logger.error(f"保存会话数据失败: {e}")
+            return False
+
+    def close(self):
+        if self.history is not None:
+            self.history.flush()
+            if self.history.needs_gc:
+                self.history.prune()
+        with self._lock:
+            self._conn.close()
+
+    # --- 快照历史 ---
+    def get_session_history(self, name):
+        """返回会话的快照列表 [{"id", "saved_at", "apps", "tabs"}]，未启用历史时返回空列表"""
+        if self.history is None:
+            return []
+        return self.history.list_snapshots(name)
+
+    def get_session_snapshot(self, name, snapshot_id=None, as_of=None):
+        """返回会话在指定快照（或指定时间点）时的数据，找不到时返回 None"""
+        if self.history is None:
+            return None
+        return self.history.get_snapshot(name, snapshot_id=snapshot_id, as_of=as_of)
+
+    def revert_session(self, name, snapshot_id):
+        """将会话内容恢复为指定快照"""
+        session_data = self.get_session_snapshot(name, snapshot_id)
+        if session_data is None:
+            return False
+        return self.set_session(name, session_data)
+
+    # --- 读取 ---
+    def get_session_names(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT name FROM sessions ORDER BY position")]
+
+    def get_session(self, name):
+        """读取会话数据，会话不存在时返回空会话"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, has_browser_windows, extra FROM sessions WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                return {"applications": []}
+            session_id, has_windows, extra = row
+            session_data = {"applications": [
+                _join_item(APP_COLUMNS, (title, process_path), app_extra)
+                for title, process_path, app_extra in self._conn.execute(
+                    "SELECT title, process_path, extra FROM apps WHERE session_id = ? ORDER BY position",
+                    (session_id,)
+                )
+            ]}
+            if has_windows:
+                windows = []
+                window_rows = self._conn.execute(
+                    "SELECT id, title, browser, extra FROM browser_windows WHERE session_id = ? ORDER BY position",
+                    (session_id,)
+                ).fetchall()
+                tabs_by_window = {}
+                for window_id, tab_title, url, tab_extra in self._conn.execute(
+                    "SELECT t.window_id, t.title, t.url, t.extra FROM tabs t "
+                    "JOIN browser_windows w ON w.id = t.window_id "
+                    "WHERE w.session_id = ? ORDER BY t.window_id, t.position",
+                    (session_id,)
+                ):
+                    tabs_by_window.setdefault(window_id, []).append(
+                        _join_item(TAB_COLUMNS, (tab_title, url), tab_extra)
+                    )
+                for window_id, title, browser, window_extra in window_rows:
+                    window = _join_item(WINDOW_COLUMNS, (title, browser), window_extra)
+                    stored_without_tabs = window.pop(NO_TABS_KEY, False)
+                    if not stored_without_tabs and "tabs" not in window:
+                        window["tabs"] = tabs_by_window.get(window_id, [])
+                    windows.append(window)
+                session_data["browser_windows"] = windows
+            if extra:
+                session_data.update(json.loads(extra))
+            return session_data
+
+    def get_session_info(self, name):
+        """返回会话的 {"apps", "tabs", "saved_at"}，会话不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT s.saved_at, "
+                "(SELECT COUNT(*) FROM apps WHERE session_id = s.id), "
+                "(SELECT COUNT(*) FROM tabs t JOIN browser_windows w ON w.id = t.window_id WHERE w.session_id = s.id) "
+                "FROM sessions s WHERE s.name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"saved_at": row[0], "apps": row[1], "tabs": row[2]}
+
+    # --- 查询 ---
+    def find_sessions_with_app(self, exe):
+        """返回包含指定可执行文件的会话名列表。exe 可以是完整路径或文件名"""
+        exe = os.path.normcase(exe)
+        column = "exe_path" if os.path.dirname(exe) else "exe_name"
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT s.name FROM apps a JOIN sessions s ON s.id = a.session_id "
+                f"WHERE a.{column} = ? ORDER BY s.position", (exe,)
+            )]
+
+    def find_tabs(self, domain=None, url=None):
+        """按域名或 URL 查找标签页，返回 [{"session", "window", "title", "url"}]"""
+        if url is not None:
+            condition, value = "t.url = ?", url
+        elif domain is not None:
+            condition, value = "t.domain = ?", domain.lower()
+        else:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.name, w.title, t.title, t.url FROM tabs t "
+                "JOIN browser_windows w ON w.id = t.window_id "
+                "JOIN sessions s ON s.id = w.session_id "
+                f"WHERE {condition} ORDER BY s.position, w.position, t.position", (value,)
+            ).fetchall()
+        return [{"session": s, "window": w, "title": t, "url": u} for s, w, t, u in rows]
+
+    def search_titles(self, text, limit=50):
+        """
+        在应用、浏览器窗口和标签页标题中搜索。
+
+        返回:
+            [{"session", "kind"(app/window/tab), "title"}]，按相关度排序
+        """
+        if not text or not text.strip():
+            return []
+        with self._lock:
+            if self.fts_enabled:
+                # 每个词作为短语前缀匹配，避免用户输入被解释为 FTS 语法
+                query = " ".join('"' + word.replace('"', '""') + '"*' for word in text.split())
+                try:
+                    rows = self._conn.execute(
+                        "SELECT s.name, f.kind, f.title FROM titles_fts f "
+                        "JOIN sessions s ON s.id = f.session_id "
+                        "WHERE titles_fts MATCH ? ORDER BY bm25(titles_fts) LIMIT ?", (query, limit)
+                    ).fetchall()
+                    return [{"session": s, "kind": k, "title": t} for s, k, t in rows]
+                except sqlite3.OperationalError as e:
+                    logger.debug(f"全文搜索失败，改用 LIKE 查询: {e}")
+            pattern = f"%{text.strip()}%"
+            rows = self._conn.execute(
+                "SELECT s.name, 'app', a.title FROM apps a JOIN sessions s ON s.id = a.session_id "
+                "WHERE a.title LIKE ? "
+                "UNION ALL SELECT s.name, 'window', w.title FROM browser_windows w "
+                "JOIN sessions s ON s.id = w.session_id WHERE w.title LIKE ? "
+                "UNION ALL SELECT s.name, 'tab', t.title FROM tabs t "
+                "JOIN browser_windows w ON w.id = t.window_id JOIN sessions s ON s.id = w.session_id "
+                "WHERE t.title LIKE ? LIMIT ?", (pattern, pattern, pattern, limit)
+            ).fetchall()
+        return [{"session": s, "kind": k, "title": t} for s, k, t in rows]
+
+    # --- 导入导出 ---
+    def import_sessions(self, all_sessions):
+        """在一个事务中导入 {会话名: 会话数据}，返回导入的会话数"""
+        imported = 0
+        with self._lock, self._conn:
+            for name, session_value in all_sessions.items():
+                fixed = normalize_session_data(session_value)
+                if fixed is None:
+                    logger.warning(f"会话 '{name}' 的数据格式无效，已跳过")
+                    continue
+                self._write_session(name, fixed)
+                imported += 1
+        logger.info(f"已导入 {imported} 个会话到 {self.db_file}")
+        return imported
+
+    def import_sessions_json(self, json_file):
+        """导入旧版 sessions.json 文件中的所有会话"""
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"读取会话文件失败 {json_file}: {e}")
+            return 0
+        if not isinstance(data, dict):
+            logger.error(f"会话文件格式无效: {json_file}")
+            return 0
+        return self.import_sessions(data)
+
+    def export_session(self, name, export_path):
+        if name not in self.get_session_names():
+            return False
+        return export_session_file(self.get_session(name), export_path)
+
+    def import_session(self, import_path, new_name):
+        session_data = read_session_file(import_path, new_name)
+        return session_data is not None and self.set_session(new_name, session_data)
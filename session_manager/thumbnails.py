@@ -0,0 +1,264 @@
+"""
+thumbnails.py
+窗口缩略图：批量截取与磁盘存储。
+
+每个窗口用 PrintWindow（PW_RENDERFULLCONTENT）单独截取窗口自身的内容，被其他窗口
+（例如保存会话时位于前台的本程序窗口）遮挡的窗口也能得到正确的缩略图；最小化或无法截取的窗口跳过。
+缩略图用带预缩小的双线性滤波生成，以 JPEG 保存，按会话和窗口分目录存放，界面需要时才读取。
+"""
+
+import os
+import queue
+import ctypes
+import shutil
+import hashlib
+import logging
+import threading
+
+from PIL import Image
+
+from session_manager.config import USER_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR_NAME = "thumbnails"
+THUMBNAIL_SUFFIX = ".jpg"
+DEFAULT_THUMBNAIL_SIZE = (200, 150)
+JPEG_QUALITY = 80
+# PrintWindow 标志：截取 DirectComposition 渲染的内容（Chromium、UWP 等）
+PW_RENDERFULLCONTENT = 0x2
+
+
+def thumbnail_key(process_path, title):
+    """窗口在缩略图存储中的键（可执行文件路径 + 标题）"""
+    text = f"{os.path.normcase(process_path or '')}\n{title or ''}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def make_thumbnail(image, size=DEFAULT_THUMBNAIL_SIZE):
+    """
+    按比例缩小到 size 以内。先用 reduce 做整数倍缩小，再做双线性插值，
+    比对全分辨率图像直接做 LANCZOS 快得多，缩略图尺寸下看不出差别。
+    """
+    image = image.copy()
+    image.thumbnail(size, Image.BILINEAR, reducing_gap=2.0)
+    return image
+
+
+def capture_window_image(hwnd):
+    """
+    用 PrintWindow 截取窗口自身的内容（不受遮挡影响）。
+
+    返回:
+        PIL.Image，窗口已最小化、尺寸为零或截取失败时返回 None
+    """
+    import win32gui
+    import win32ui
+
+    if win32gui.IsIconic(hwnd):
+        return None
+    left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+    width, height = right - left, bottom - top
+    if width <= 0 or height <= 0:
+        return None
+    window_dc = win32gui.GetWindowDC(hwnd)
+    source_dc = win32ui.CreateDCFromHandle(window_dc)
+    memory_dc = source_dc.CreateCompatibleDC()
+    bitmap = win32ui.CreateBitmap()
+    try:
+        bitmap.CreateCompatibleBitmap(source_dc, width, height)
+        memory_dc.SelectObject(bitmap)
+        if not ctypes.windll.user32.PrintWindow(hwnd, memory_dc.GetSafeHdc(), PW_RENDERFULLCONTENT):
+            return None
+        info = bitmap.GetInfo()
+        return Image.frombuffer("RGB", (info["bmWidth"], info["bmHeight"]),
+                                bitmap.GetBitmapBits(True), "raw", "BGRX", 0, 1)
+    finally:
+        win32gui.DeleteObject(bitmap.GetHandle())
+        memory_dc.DeleteDC()
+        source_dc.DeleteDC()
+        win32gui.ReleaseDC(hwnd, window_dc)
+
+
+def capture_window_thumbnails(windows, size=DEFAULT_THUMBNAIL_SIZE):
+    """
+    批量截取窗口缩略图。
+
+    参数:
+        windows: [(键, 窗口句柄)]
+
+    返回:
+        {键: PIL.Image}；最小化或截取失败的窗口不出现在结果中
+    """
+    thumbnails = {}
+    for key, hwnd in windows:
+        try:
+            image = capture_window_image(hwnd)
+        except Exception as e:
+            logger.debug("截取窗口 %s 失败: %s", hwnd, e)
+            continue
+        if image is not None:
+            thumbnails[key] = make_thumbnail(image, size)
+    return thumbnails
+
+
+def live_window_handles():
+    """
+    当前可见的顶层窗口。
+
+    返回:
+        {缩略图键: 窗口句柄}，同一个键只保留 Z 序中最靠前的窗口
+    """
+    import win32gui
+    from session_manager.utils import get_process_path_from_hwnd
+
+    handles = {}
+
+    def callback(hwnd, _):
+        if win32gui.IsWindowVisible(hwnd):
+            title = win32gui.GetWindowText(hwnd)
+            if title:
+                handles.setdefault(thumbnail_key(get_process_path_from_hwnd(hwnd), title), hwnd)
+        return True
+
+    win32gui.EnumWindows(callback, None)
+    return handles
+
+
+def session_window_handles(session_data):
+    """
+    会话中仍然打开的应用窗口（按可执行文件路径和标题对应到当前窗口）。
+
+    返回:
+        [(缩略图键, 窗口句柄)]，同一个键只保留一个窗口
+    """
+    live = live_window_handles()
+    windows = []
+    seen = set()
+    for app in (session_data or {}).get("applications", []):
+        if not isinstance(app, dict):
+            continue
+        key = thumbnail_key(app.get("path") or app.get("process_path"), app.get("title"))
+        if key in seen or key not in live:
+            continue
+        seen.add(key)
+        windows.append((key, live[key]))
+    return windows
+
+
+class ThumbnailStore:
+    """
+    缩略图存储。
+
+    目录结构: <store_dir>/<会话名摘要>/<窗口键>.jpg
+    capture_session() 把截取任务交给一个后台线程；同一会话排队中的旧任务会被新任务取代。
+    """
+
+    def __init__(self, store_dir, size=DEFAULT_THUMBNAIL_SIZE):
+        self.store_dir = store_dir
+        self.size = tuple(size)
+        os.makedirs(store_dir, exist_ok=True)
+        self._queue = queue.Queue()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _session_dir(self, session_name):
+        return os.path.join(self.store_dir, hashlib.sha1(session_name.encode('utf-8')).hexdigest()[:16])
+
+    def path(self, session_name, key):
+        return os.path.join(self._session_dir(session_name), key + THUMBNAIL_SUFFIX)
+
+    def load(self, session_name, key):
+        """读取缩略图，不存在时返回 None"""
+        path = self.path(session_name, key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with Image.open(path) as image:
+                image.load()
+                return image.copy()
+        except Exception as e:
+            logger.warning(f"读取缩略图失败 {path}: {e}")
+            return None
+
+    def save_all(self, session_name, thumbnails):
+        """写入会话的全部缩略图，并删除不再属于该会话的旧缩略图"""
+        session_dir = self._session_dir(session_name)
+        os.makedirs(session_dir, exist_ok=True)
+        for key, image in thumbnails.items():
+            path = os.path.join(session_dir, key + THUMBNAIL_SUFFIX)
+            tmp_path = f"{path}.tmp"
+            try:
+                image.convert("RGB").save(tmp_path, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.warning(f"写入缩略图失败 {path}: {e}")
+        keep = {key + THUMBNAIL_SUFFIX for key in thumbnails}
+        for name in os.listdir(session_dir):
+            if name not in keep:
+                try:
+                    os.remove(os.path.join(session_dir, name))
+                except OSError:
+                    pass
+
+    def remove_session(self, session_name):
+        shutil.rmtree(self._session_dir(session_name), ignore_errors=True)
+
+    def rename_session(self, old_name, new_name):
+        old_dir = self._session_dir(old_name)
+        if not os.path.isdir(old_dir):
+            return
+        self.remove_session(new_name)
+        try:
+            os.replace(old_dir, self._session_dir(new_name))
+        except OSError as e:
+            logger.warning(f"重命名缩略图目录失败: {e}")
+
+    def capture_session_now(self, session_name, session_data):
+        """立即截取并保存会话中各窗口的缩略图，返回生成的数量"""
+        thumbnails = capture_window_thumbnails(session_window_handles(session_data), self.size)
+        self.save_all(session_name, thumbnails)
+        logger.info(f"已为会话 '{session_name}' 生成 {len(thumbnails)} 个窗口缩略图")
+        return len(thumbnails)
+
+    def capture_session(self, session_name, session_data):
+        """在后台线程中截取会话的缩略图（应在采集会话后尽快调用，窗口位置才准确）"""
+        with self._lock:
+            self._latest[session_name] = session_data
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="thumbnail-capture", daemon=True)
+                self._thread.start()
+            self._queue.put(session_name)
+
+    def _run(self):
+        while True:
+            try:
+                session_name = self._queue.get(timeout=5)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            with self._lock:
+                session_data = self._latest.pop(session_name, None)
+            if session_data is None:
+                # 已被同一会话更新的任务处理过
+                continue
+            try:
+                self.capture_session_now(session_name, session_data)
+            except Exception as e:
+                logger.error(f"生成会话 '{session_name}' 的缩略图失败: {e}", exc_info=True)
+
+
+_thumbnail_stores = {}
+
+
+def get_thumbnail_store(config):
+    """按配置的缓存目录返回共享的 ThumbnailStore"""
+    store_dir = os.path.join(config.get("cache_dir") or os.path.join(USER_DATA_DIR, "cache"), THUMBNAIL_DIR_NAME)
+    store = _thumbnail_stores.get(store_dir)
+    if store is None:
+        store = _thumbnail_stores[store_dir] = ThumbnailStore(store_dir)
+    return store
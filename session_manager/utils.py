@@ -5,8 +5,10 @@ utils.py
 
 import os
 import sys
+import json
 import ctypes
 import logging
+import tempfile
 from typing import Optional
 
 logger = logging.getLogger(__name__)
@@ -26,14 +28,14 @@ def get_process_path_from_hwnd(hwnd):
     try:
         GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
     except Exception as e:
-        logger.debug(f"Error calling GetWindowThreadProcessId for HWND {hwnd}: {e}", exc_info=True)
+        logger.debug("Error calling GetWindowThreadProcessId for HWND %s: %s", hwnd, e, exc_info=True)
         return None
     if pid.value == 0:
         return None
     try:
         process_handle = OpenProcess(PROCESS_QUERY_INFORMATION | PROCESS_VM_READ, False, pid.value)
     except Exception as e:
-        logger.debug(f"Error calling OpenProcess for PID {pid.value}: {e}", exc_info=True)
+        logger.debug("Error calling OpenProcess for PID %s: %s", pid.value, e, exc_info=True)
         return None
     if not process_handle:
         return None
@@ -44,16 +46,36 @@ def get_process_path_from_hwnd(hwnd):
     try:
         success = QueryFullProcessImageNameW(process_handle, 0, image_name_buffer, ctypes.byref(buffer_chars))
     except Exception as e:
-        logger.debug(f"Error calling QueryFullProcessImageNameW for process handle {process_handle}: {e}", exc_info=True)
+        logger.debug("Error calling QueryFullProcessImageNameW for process handle %s: %s", process_handle, e, exc_info=True)
     try:
         CloseHandle(process_handle)
     except Exception as e:
-        logger.debug(f"Error closing process handle {process_handle}: {e}", exc_info=True)
+        logger.debug("Error closing process handle %s: %s", process_handle, e, exc_info=True)
     if success:
         return image_name_buffer.value[:buffer_chars.value]
     else:
         return None
 
+# 进程路径缓存: (进程ID, 创建时间) -> 可执行文件路径
+_process_exe_cache = {}
+PROCESS_EXE_CACHE_SIZE = 4096
+
+def get_process_exe(pid):
+    """
+    获取进程的可执行文件路径（psutil 的异常原样抛出）。
+    按 (进程ID, 创建时间) 缓存，进程ID被复用时会重新查询；常驻进程中同一进程只查询一次路径。
+    """
+    import psutil
+    proc = psutil.Process(pid)
+    key = (pid, proc.create_time())
+    exe = _process_exe_cache.get(key)
+    if exe is None:
+        exe = proc.exe()
+        if len(_process_exe_cache) >= PROCESS_EXE_CACHE_SIZE:
+            _process_exe_cache.clear()
+        _process_exe_cache[key] = exe
+    return exe
+
 # --- 判断是否为浏览器进程 ---
 def is_browser_process(process_path, config):
     """判断进程路径是否为已知浏览器。"""
@@ -134,7 +156,56 @@ def get_valid_data_path(browser_exe: str, browser_profiles: dict) -> Optional[st
     info = browser_profiles[browser_exe]
     for path in info.get("data_paths", []):
         if os.path.exists(path):
-            logger.info(f"找到{browser_exe}数据路径: {path}")
+            logger.info("找到%s数据路径: %s", browser_exe, path)
             return path
     logger.warning(f"未找到{browser_exe}的有效数据路径")
-    return None 
\ No newline at end of file
+    return None
+
+# --- 原子写入文件 ---
+def atomic_write_bytes(path, data, fsync=True):
+    """先写入同目录下的临时文件，再用 os.replace 替换目标文件，避免写入中途崩溃损坏原文件"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+def atomic_write_json(path, data, indent=None, fsync=True):
+    """以原子方式将数据写入 JSON 文件"""
+    separators = None if indent is not None else (',', ':')
+    payload = json.dumps(data, ensure_ascii=False, indent=indent, separators=separators)
+    atomic_write_bytes(path, payload.encode('utf-8'), fsync=fsync)
+
+# --- 进程间文件锁 ---
+def lock_file(path):
+    """
+    以非阻塞方式获取文件的独占锁（进程退出时由系统释放）。
+
+    返回:
+        打开的文件对象，关闭即释放锁；锁已被其他进程持有时返回 None
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    f = open(path, 'a+b')
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
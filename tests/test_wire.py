@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""WebSocket 二进制消息解码的上限检查"""
+
+import time
+import unittest
+
+from session_manager.hybrid_tabs import wire
+from session_manager.storage import compact_format
+from session_manager.storage.compact_format import CompactFormatError, _write_varint
+
+
+def _frame(body, flags=0):
+    return compact_format.MAGIC + bytes((compact_format.FORMAT_VERSION, flags)) + bytes(body)
+
+
+def _nested_reference_frame(levels):
+    """标签页表项 k 引用表项 k-1 两次，展开后有 2^levels 个元素"""
+    body = bytearray()
+    _write_varint(body, 0)   # 字符串表
+    _write_varint(body, 0)   # 结构表
+    _write_varint(body, levels)
+    body.append(compact_format.TAG_NONE)
+    for index in range(1, levels):
+        body.append(compact_format.TAG_TAB_LIST)
+        _write_varint(body, 2)
+        _write_varint(body, index - 1)
+        _write_varint(body, index - 1)
+    body.append(compact_format.TAG_TAB_LIST)
+    _write_varint(body, 2)
+    _write_varint(body, levels - 1)
+    _write_varint(body, levels - 1)
+    return _frame(body)
+
+
+class DecodeMessageTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        message = {"type": "tabs", "browser_id": "chrome", "window_id": 1, "seq": 3,
+                   "tabs": [{"id": i, "url": f"https://example.com/{i}", "title": f"T{i}", "active": i == 0}
+                            for i in range(50)]}
+        frame = wire.encode_message(message, wire.ENCODING_COMPACT)
+        self.assertEqual(wire.decode_message(frame), (message, wire.ENCODING_COMPACT))
+
+    def test_nested_references_are_rejected(self):
+        for levels in (30, 200):
+            frame = _nested_reference_frame(levels)
+            started = time.perf_counter()
+            with self.assertRaises(CompactFormatError):
+                wire.decode_message(frame, max_bytes=65536)
+            self.assertLess(time.perf_counter() - started, 1.0)
+
+    def test_lz4_flag_is_rejected(self):
+        body = bytearray()
+        _write_varint(body, 0)
+        with self.assertRaises(CompactFormatError):
+            wire.decode_message(_frame(body, compact_format.FLAG_LZ4))
+
+    def test_malformed_frames_raise_compact_format_error(self):
+        frames = [
+            _frame(b""),                                            # 截断
+            _frame(b"\x00\x00\x00" + bytes((compact_format.TAG_FLOAT, 1))),   # 浮点数不完整
+            # 以列表为键的字典
+            _frame(b"\x00\x00\x00" + bytes((compact_format.TAG_DICT, 1, compact_format.TAG_LIST, 0,
+                                            compact_format.TAG_NONE))),
+            # 深度嵌套的列表
+            _frame(b"\x00\x00\x00" + bytes((compact_format.TAG_LIST, 1)) * 5000),
+        ]
+        for frame in frames:
+            with self.assertRaises(CompactFormatError):
+                wire.decode_message(frame)
+
+
+if __name__ == "__main__":
+    unittest.main()